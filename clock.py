@@ -0,0 +1,46 @@
+# clock.py
+
+"""
+時計。モーター・DIO まわりの部品（バス、テレメトリ、完了待ち、原点復帰、DI 走査、溶着タイマー）は
+time を直接呼ばずに、生成時に渡された時計の monotonic / perf_counter / sleep / wait を使う。
+実機では SYSTEM_CLOCK（time そのもの）、仮想マシン (HARDWARE_BACKEND = 'sim') では仮想マシンの時計
+（sim_hardware.SimClock。SIM_TIME_SCALE 倍で進む）を渡す。
+time モジュールを置き換えないので、時計を受け取っていない部分（画面・Tk のタイマー等）は常に実時間で動く。
+"""
+
+import time
+
+import config
+
+
+class SystemClock:
+    """実時間の時計"""
+    scale = 1.0
+
+    @staticmethod
+    def monotonic():
+        return time.monotonic()
+
+    @staticmethod
+    def perf_counter():
+        return time.perf_counter()
+
+    @staticmethod
+    def sleep(seconds):
+        time.sleep(max(seconds, 0.0))
+
+    @staticmethod
+    def wait(waitable, timeout=None):
+        """Event / Condition の wait(timeout)。Condition はロックを取った状態で呼ぶこと"""
+        return waitable.wait(timeout)
+
+
+SYSTEM_CLOCK = SystemClock()
+
+
+def default_clock():
+    """config.HARDWARE_BACKEND に合った時計（'sim' では仮想マシンの時計）"""
+    if getattr(config, 'HARDWARE_BACKEND', 'real') == 'sim':
+        from sim_hardware import get_machine
+        return get_machine().clock
+    return SYSTEM_CLOCK
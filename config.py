@@ -48,6 +48,19 @@ PROFILE_ACCELERATION_Z = 0
 # ACCELERATION = 100
 #0だとmaxの値になる
 
+# 移動完了待ちの判定条件 (motion_wait.DEFAULT_CRITERIA を移動の種類ごとに上書き)
+# 例: MOTION_WAIT_CRITERIA = {'xy_precise': {'stable_samples': 3}, 'z': {'position_tolerance': 5}}
+MOTION_WAIT_CRITERIA = {}
+
+# モーター状態のテレメトリ (telemetry.TelemetryService)
+TELEMETRY_RATE_HZ = 15  # 全軸の位置・電流・速度・Moving を同期読み取りする周期の上限 [Hz]
+TELEMETRY_BUS_SHARE = 0.25  # 常時の監視に使うバスの割合（ボーレートと軸数から周期を決める。57600bps・3軸で約13Hz）
+TELEMETRY_FOCUS_RATE_HZ = 200  # focus 中（押し付け中など）に一部の軸だけ読む周期の上限 [Hz]
+TELEMETRY_FOCUS_BUS_SHARE = 0.8  # focus 中に監視が使うバスの割合（残りは指令・緊急停止用）
+TELEMETRY_LINK_LATENCY_SEC = 0.002  # 読み取り1回あたりの USB・応答遅延の見積もり [s]
+TELEMETRY_ERROR_EVERY = 25  # Hardware Error Status は何周期に1回読むか
+TELEMETRY_HISTORY_SEC = 5.0  # リングバッファに保持する時間 [s]
+
 # 安全な高さ (パルス位置)
 SAFE_Z_PULSE = 2000
 # 全ての工程が完了した後の、最終的なZ軸の退避高さ
@@ -56,6 +69,81 @@ FINAL_RETRACT_PULSE = 1500
 Z_LIMIT_MAX_PULSE = 2524 #Ｚ軸が一番下の時のパルス値
 Z_LIMIT_MIN_PULSE = 804 #Ｚ軸が一番上の時のパルス値
 
+# Z軸を電流制限付き位置制御 (Dynamixel の動作モード 5) で動かす
+# True にすると、接触・加圧・退避を「目標位置 + 目標電流」の書き込みだけで行い、
+# 溶着ごとの動作モード切り替え（トルクOFF→モード書込→トルクON）をしない。
+# 押し付けの電流はプリセットの gentle_current / weld_current をそのまま電流上限として使う。
+Z_CURRENT_BASED_POSITION = False
+Z_MOVE_CURRENT_MA = 1000  # mode 5 で位置移動するときの電流上限 [mA]
+
+# 接触検知: 押し付け中の Z の速度・電流を短い間隔で読み、止まった時点で接触とみなす
+# （判定条件は MOTION_WAIT_CRITERIA['contact'] で上書きできる）。False なら従来の固定時間の押し付け
+CONTACT_DETECTION = True
+CONTACT_CURRENT_RATIO = 0.8  # mode 5 では、電流が押し付け電流のこの割合以上に上がったことも条件にする
+
+# 接触高さの予測による高速アプローチ (contact_predictor)
+# 予測できた点は、予測面の少し上まで位置制御で下ろし、残りだけ優しい電流で接触させる
+PREDICTIVE_Z_APPROACH = True
+CONTACT_PREDICT_RADIUS_MM = 15.0  # この距離以内の接触実績から予測する [mm]
+CONTACT_PREDICT_MAX_SPREAD_PULSE = 40  # 近くの実績のばらつきがこれを超えたら予測しない [pulse]
+CONTACT_APPROACH_MARGIN_PULSE = 30  # 実績からの予測面の何パルス上まで位置制御で下ろすか（近くの実績がそろっている場合）
+CONTACT_APPROACH_MARGIN_TILT_PULSE = 80  # 傾斜平面だけからの予測・近くの実績が少ないかばらついている場合の余裕 [pulse]
+CONTACT_APPROACH_TIGHT_SPREAD_PULSE = 10  # 近くの実績（2点以上）のばらつきがこれ以下なら CONTACT_APPROACH_MARGIN_PULSE を使う
+CONTACT_APPROACH_VELOCITY_Z = 100  # 予測面の上まで下ろすときのプロファイル速度（PROFILE_VELOCITY_Z = 0 の上限なしでは速すぎる）
+CONTACT_APPROACH_ACCELERATION_Z = 50  # 同 プロファイル加速度
+CONTACT_APPROACH_CURRENT_MA = 300  # 同 電流上限 [mA]（mode 5 のときのみ。予測が外れて当たっても強く押さない）
+CONTACT_PREDICT_MAX_ERROR_PULSE = 40  # 予測と実測の差がこれを超えたら予測外れとして通常の接触をやり直す
+CONTACT_FINAL_PUSH_SEC = 0.1  # 予測面の近くからの優しい押し付け時間 [s]（通常は 0.3）
+CONTACT_FINAL_RELEASE_SEC = 0.1  # 押し付け解除後の待ち時間 [s]（通常は 0.2）
+
+# XY の直線補間: 短いほうの軸の速度・加速度を移動量の比で縮め、X と Y が同時に到着するようにする
+# (False なら両軸とも preset の velocity_xy / acceleration_xy で動く＝斜め移動が「く」の字になる)
+COORDINATED_XY = True
+
+# 経路トレース（詳細プレビュー）の目標位置ストリーミング (trace_streamer)
+TRACE_PREVIEW_SPEED_MM_S = 100.0  # 経路に沿った速度 [mm/s]
+TRACE_PREVIEW_ACCEL_MM_S2 = 500.0  # 経路に沿った加速度 [mm/s^2]
+TRACE_RESAMPLE_MM = 0.5  # 経路を再サンプリングする間隔 [mm]
+TRACE_STREAM_RATE_HZ = 50.0  # 目標位置を書き込む周期 [Hz]
+TRACE_LOOKAHEAD_SEC = 0.1  # 先読み窓: 計画位置より (速度 × この時間) 先の点を目標にする [s]
+TRACE_CORNER_DEG = 30.0  # これ以上向きが変わる頂点は角とみなして減速する [度]
+TRACE_MONITOR_SEC = 0.2  # 安全確認のために現在位置を読む間隔 [s]
+TRACE_MAX_LAG_MM = 10.0  # 現在位置が計画の区間からこれ以上離れたら止める [mm]
+TRACE_PROFILE_MARGIN = 1.5  # サーボのプロファイル速度・加速度を計画値の何倍にするか
+
+# 溶着ジョブ計画 (job_plan): 移動距離による移動モード・退避量の切り替え
+PRECISE_MOVE_MM = 5.0  # 前の点からこれ以上離れていれば厳密停止モードで移動する [mm]
+LONG_RETRACT_MM = 20.0  # 次の点までこれ以上離れていれば長い退避をする [mm]
+RETRACT_PULSE = 200  # 通常の退避量 [pulse]
+LONG_RETRACT_PULSE = 500  # 長い退避の退避量 [pulse]
+FIRST_POINT_GENTLE_CURRENT = -1  # 1点目だけ使う接触検知電流 [mA]
+
+# 退避量の計画 (retract_planner): 次の点までの経路上の表面高さ（接触実績・傾斜平面から予測）から退避量を決める
+# 予測できない移動では上の RETRACT_PULSE / LONG_RETRACT_PULSE を使う
+ADAPTIVE_RETRACT = True
+RETRACT_SHEET_LIFT_PULSE = 60  # シートの浮き上がりに対する余裕 [pulse]（プリセットの 'sheet_lift' があればそちらを使う）
+RETRACT_PER_MM_PULSE = 5.0  # 移動距離 1mm あたりに足す余裕 [pulse]
+RETRACT_SAMPLE_MM = 5.0  # 経路上の表面高さを調べる間隔 [mm]
+RETRACT_MIN_PULSE = 200  # 最小の退避量 [pulse]（従来の通常退避量。100 ではシートを巻き上げてしまう。Z_XY_CLEARANCE_PULSE 未満にはならない）
+
+# パイプライン溶着: 退避中に Z が接触位置からこのパルス数だけ上昇したら、次の点への XY 移動を開始する
+# (これより下にいる間は XY を動かさない。退避量より大きい場合は退避量まで待つ)
+PIPELINED_WELDING = False
+Z_XY_CLEARANCE_PULSE = 120
+
+# 熱を考慮した溶着順序 (weld_scheduler)。有効時は点の順序を並べ替え、領域ごとの冷却待ちを行う
+# （溶着順が変わるので既定は無効。点数ごとの自動停止は有効時も指定どおりに行う）
+THERMAL_SCHEDULING = False
+THERMAL_MIN_SEPARATION_MM = 10.0  # 連続する2点の最小間隔 [mm]
+THERMAL_REGION_MM = 10.0  # 熱量を管理する領域（正方セル）の一辺 [mm]
+THERMAL_MIN_REVISIT_SEC = 5.0  # 同じ領域を再び溶着するまでの最小間隔 [s]
+THERMAL_MAX_HEAT = 2.0  # 領域の熱量の上限（1回の溶着で自領域 +1.0、周囲 +THERMAL_NEIGHBOR_HEAT）
+THERMAL_NEIGHBOR_HEAT = 0.5
+THERMAL_TIME_CONSTANT_SEC = 20.0  # 熱量の減衰の時定数 [s]
+THERMAL_CYCLE_OVERHEAD_SEC = 1.5  # 見積もり用: 1点あたりの接触・加圧・退避にかかる時間 [s]
+THERMAL_TRAVEL_SPEED_MM_S = 50.0  # 見積もり用: XY の平均移動速度 [mm/s]
+THERMAL_HEAT_WEIGHT = 1.0  # 順序選択で、熱量を空走距離に換算する重み
+
 # ==========================================================================
 # 原点復帰パラメータ
 # ==========================================================================
@@ -80,11 +168,18 @@ HOMING_SPEED_SLOW = 30
 # 低速接近（原点確定）時の加速度
 HOMING_SLOW_ACCELERATION = 50
 
+# X と Y の原点復帰を同時に行う（False なら X が終わってから Y）
+PARALLEL_HOMING = True
+# 同時原点復帰でセンサー・モーター状態を読む間隔 [s]
+HOMING_POLL_INTERVAL = 0.005
+
 # ==========================================================================
 # 経路計算パラメータ (プリセットに移行しないもの)
 # ==========================================================================
 # DXF内の円や円弧を、いくつの短い直線で近似するかを指定
 CURVE_SEGMENTS = 20
+# DXF読み込み時に、パスの順序・向き・閉じたパスの開始頂点を空走距離が短くなるよう並べ替える
+OPTIMIZE_PATH_ORDER = True
 
 
 # ==========================================================================
@@ -95,4 +190,55 @@ LIMIT_SWITCH_X_PIN = 1
 LIMIT_SWITCH_Y_PIN = 2
 
 # 物理的な緊急停止ボタンを接続するデジタル入力(DI)ピン
-EMERGENCY_STOP_PIN = 3
\ No newline at end of file
+EMERGENCY_STOP_PIN = 3
+# フットペダルを接続するデジタル入力(DI)ピン
+FOOT_PEDAL_PIN = 0
+
+# DI 走査スレッド (input_scanner): 全入力をこの周期で読み、変化に時刻を付ける [Hz]
+DIO_SCAN_RATE_HZ = 1000
+# エッジ時刻の位置のラッチで、エッジ後の位置の公開をどこまで待つか [s]
+DIO_LATCH_TIMEOUT_SEC = 0.1
+# 非常停止ボタンの入力の変化から、溶着機OFF・全軸トルクOFF までの許容時間 [s]（超えたら警告をログに出す）
+ESTOP_MAX_LATENCY_SEC = 0.05
+
+# 溶着時間の計時 (weld_timer): 専用スレッドで締め切り時刻まで待つ（False なら従来の sleep）
+WELD_TIMER_THREAD = True
+# 締め切りの何秒前から空回りで待つか [s]（OS の sleep の分解能より長くする。Windows は約 15.6ms）
+WELD_TIMER_SPIN_SEC = 0.02
+# パルス中の GIL の切り替え間隔 [s]（Python の既定は 0.005）
+WELD_TIMER_SWITCH_INTERVAL = 0.0005
+# Linux で計時スレッドを SCHED_FIFO にする優先度 (1〜99、0 なら変更しない。root 権限または CAP_SYS_NICE が必要)
+WELD_TIMER_RT_PRIORITY = 0
+
+# ==========================================================================
+# 仮想マシン（実機なしでの動作確認・ベンチマーク, sim_hardware）
+# ==========================================================================
+# 'real' = 実機 (dynamixel_sdk / myADconvert)、'sim' = 仮想マシン
+HARDWARE_BACKEND = 'real'
+# 仮想マシンの時計の倍率（1.0 = 実時間。ベンチマークでは 10 などにすると速く終わる。画面の待ちは実時間のまま）
+SIM_TIME_SCALE = 1.0
+# サーボのモデルを進める刻み [s]
+SIM_STEP_SEC = 0.001
+# USB シリアル変換の遅延（1回の送受信ごと）[s]。FTDI の Latency Timer を 1ms にした場合
+SIM_USB_LATENCY_SEC = 0.001
+# サーボの応答遅延 (Return Delay Time の既定 250 = 0.5ms) [s]
+SIM_RETURN_DELAY_SEC = 0.0005
+# 応答がない ID への送受信のタイムアウト [s]
+SIM_RX_TIMEOUT_SEC = 0.02
+# プロファイル速度・加速度が 0（上限なし）のときの速度 [pulse/s]・加速度 [pulse/s^2]
+SIM_MAX_VELOCITY_PULSE = 20000
+SIM_MAX_ACCELERATION_PULSE = 200000
+# 電流上限 (Current Limit の生値、2.69mA 単位)
+SIM_CURRENT_LIMIT_RAW = 1193
+# 電流制御モードでの速度の係数 [pulse/s / mA] と、動き出しに必要な電流（摩擦）[mA]
+SIM_CURRENT_VELOCITY_GAIN = 100.0
+SIM_FRICTION_MA = 1.0
+# 接触面のばね定数 [mA / pulse]（めり込み 1 パルスあたりの電流）
+SIM_CONTACT_STIFFNESS_MA_PER_PULSE = 0.5
+# 接触面: 原点（リミットスイッチ）での Z 位置 [pulse] と、1mm あたりの傾き [pulse]
+SIM_SURFACE = {'z_pulse': 2300, 'tilt_x': 0.2, 'tilt_y': -0.1}
+# リミットスイッチの位置（生パルス）と、その先の機械的な可動端までの距離 [pulse]
+SIM_LIMIT_PULSE = {'x': 40000, 'y': 20000}
+SIM_LIMIT_OVERTRAVEL_PULSE = 300
+# 起動時の X/Y 位置（原点からの距離 [mm]）。Z は SAFE_Z_PULSE
+SIM_START_MM = {'x': 50.0, 'y': 50.0}
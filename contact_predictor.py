@@ -0,0 +1,79 @@
+# contact_predictor.py
+
+"""
+接触高さの予測。
+溶着ごとに検知した接触位置 (x, y, contact_pulse) を覚えておき、次の点の接触高さを
+近くの点の実績（傾斜平面があれば平面からのずれ）から予測する。
+予測できれば、Z軸は位置制御で予測面の少し上まで速く下ろし、残りだけを優しい電流で接触させる。
+近くに実績がない・実績のばらつきが大きい場合は予測しない（従来どおりの接触動作にする）。
+"""
+
+import numpy as np
+
+import config
+
+
+class ContactPredictor:
+    def __init__(self, radius_mm=None, max_spread=None, capacity=256):
+        self.radius_mm = radius_mm if radius_mm is not None else getattr(config, 'CONTACT_PREDICT_RADIUS_MM', 15.0)
+        self.max_spread = max_spread if max_spread is not None else getattr(
+            config, 'CONTACT_PREDICT_MAX_SPREAD_PULSE', 40)
+        self._xy = np.empty((capacity, 2), dtype=np.float64)
+        self._residual = np.empty(capacity, dtype=np.float64)
+        self._count = 0
+
+    def reset(self):
+        """ワークが変わったとき（ジョブ開始時）に実績を捨てる"""
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def add(self, x_mm, y_mm, contact_pulse, hint_pulse=-1):
+        """
+        接触実績を追加する。
+        hint_pulse: その点の傾斜平面からの予想高さ（なければ -1）。平面からのずれとして覚える
+        """
+        if self._count == len(self._residual):
+            self._xy = np.concatenate((self._xy, np.empty_like(self._xy)))
+            self._residual = np.concatenate((self._residual, np.empty_like(self._residual)))
+        self._xy[self._count] = (x_mm, y_mm)
+        self._residual[self._count] = contact_pulse - (hint_pulse if hint_pulse != -1 else 0)
+        self._count += 1
+
+    def neighbor_spread(self, x_mm, y_mm):
+        """(x, y) の近くの実績のばらつき（平面からのずれの最大 - 最小）[pulse]。近くの実績が2点未満なら None"""
+        n = self._count
+        if n < 2:
+            return None
+        xy = self._xy[:n]
+        near = np.hypot(xy[:, 0] - x_mm, xy[:, 1] - y_mm) <= self.radius_mm
+        if near.sum() < 2:
+            return None
+        residual = self._residual[:n][near]
+        return float(residual.max() - residual.min())
+
+    def predict(self, x_mm, y_mm, hint_pulse=-1):
+        """
+        (x, y) の接触位置 [pulse] を予測する。
+        戻り値: (予測パルス, 根拠 'neighbors' | 'tilt') または None（予測しない）
+          hint_pulse を渡す場合は、add でも同じ傾斜平面の hint_pulse を渡していること。
+        """
+        n = self._count
+        if n:
+            xy = self._xy[:n]
+            d = np.hypot(xy[:, 0] - x_mm, xy[:, 1] - y_mm)
+            near = d <= self.radius_mm
+            if near.any():
+                residual = self._residual[:n][near]
+                if residual.max() - residual.min() > self.max_spread:
+                    return None  # 近くの実績がばらついている（段差・しわ等）
+                # 近い点ほど重く（距離 0 でも発散しないよう 1mm を足す）
+                weight = 1.0 / (d[near] + 1.0)
+                predicted = float(np.dot(weight, residual) / weight.sum())
+                if hint_pulse != -1:
+                    predicted += hint_pulse
+                return int(round(predicted)), 'neighbors'
+        if hint_pulse != -1:
+            return int(hint_pulse), 'tilt'
+        return None
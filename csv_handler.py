@@ -3,6 +3,8 @@
 import csv
 import os
 import datetime
+import numpy as np
+from weld_path import WeldPath
 
 
 def save_path_to_csv(filepath, path_data, timestamp_obj):
@@ -33,13 +35,13 @@ def save_path_to_csv(filepath, path_data, timestamp_obj):
 
 def load_path_from_csv(filepath):
     """
-    x, y のみのシンプルなCSVファイルを読み込む
+    x, y のみのシンプルなCSVファイルを読み込み、WeldPath として返す
     """
     if not os.path.exists(filepath):
         print(f"エラー: ファイル '{filepath}' が見つかりません。")
         return []
 
-    points = []
+    rows = []
     try:
         with open(filepath, 'r', encoding='utf-8') as f:
             # コメント行(#)を読み飛ばす
@@ -56,10 +58,8 @@ def load_path_from_csv(filepath):
             reader = csv.DictReader(content_after_comments)
             for row in reader:
                 # 角度(angle)の読み込みを削除
-                points.append({
-                    'x': float(row['x']),
-                    'y': float(row['y']),
-                })
+                rows.append((float(row['x']), float(row['y'])))
+        points = WeldPath(np.array(rows, dtype=np.float64).reshape(-1, 2))
         print(f"'{filepath}' から {len(points)} 点のデータを読み込みました。")
         return points
     except Exception as e:
@@ -1,6 +1,7 @@
 # dxf_parser.py
 import ezdxf
 import math
+from collections import deque
 import numpy as np
 
 
@@ -8,12 +9,40 @@ def _are_points_close(p1, p2, tol=1e-4):
     return math.isclose(p1[0], p2[0], abs_tol=tol) and math.isclose(p1[1], p2[1], abs_tol=tol)
 
 
+class _EndpointGrid:
+    """
+    許容誤差で量子化した座標をキーにする空間ハッシュ（グリッドバケット）。
+    登録した点の近傍だけを調べるため、全件比較(O(n²))を避けられる。
+    判定自体は _are_points_close と同じ（各軸 abs_tol）なので、結果は総当たりと一致する。
+    """
+
+    def __init__(self, tol):
+        # セル幅を 2*tol にしておくと、tol 以内の点は必ず隣接セル(3x3)に収まる
+        self.cell = max(tol, 1e-12) * 2.0
+        self.buckets = {}
+
+    def _key(self, p):
+        return (math.floor(p[0] / self.cell), math.floor(p[1] / self.cell))
+
+    def add(self, p, item):
+        self.buckets.setdefault(self._key(p), []).append(item)
+
+    def query(self, p):
+        """p の周囲 3x3 セルに登録されている item を返す"""
+        kx, ky = self._key(p)
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                bucket = self.buckets.get((kx + dx, ky + dy))
+                if bucket:
+                    yield from bucket
+
+
 def _remove_duplicate_segments(segments, tol=1e-4):
     """
     重複した線分を削除する。
     """
     unique_segments = []
-    seen = []
+    grid = _EndpointGrid(tol)
 
     for seg in segments:
         p1, p2 = seg[0], seg[1]
@@ -25,57 +54,81 @@ def _remove_duplicate_segments(segments, tol=1e-4):
         # 座標を正規化して比較（始点と終点をソート）
         sorted_seg = sorted([p1, p2], key=lambda p: (p[0], p[1]))
 
-        # 既存リストに似たものがあるかチェック
+        # 既存リストに似たものがあるかチェック（ソート後の始点の近傍だけを見る）
         is_duplicate = False
-        for s_seen in seen:
+        for s_seen in grid.query(sorted_seg[0]):
             if _are_points_close(sorted_seg[0], s_seen[0], tol) and \
                     _are_points_close(sorted_seg[1], s_seen[1], tol):
                 is_duplicate = True
                 break
 
         if not is_duplicate:
-            seen.append(sorted_seg)
+            grid.add(sorted_seg[0], sorted_seg)
             unique_segments.append(seg)
 
     print(f"重複削除: {len(segments)} -> {len(unique_segments)} 本")
     return unique_segments
 
 
+def _find_connectable(grid, alive, segments, pt, prefer_end, tolerance):
+    """
+    pt に端点が一致する未使用線分のうち、元のリスト順で最も若いものを探す。
+    戻り値: (線分index, prefer_end 側で一致したか) / 見つからなければ None
+    prefer_end: 0 なら始点(p1)一致を優先、1 なら終点(p2)一致を優先
+    """
+    best = None
+    for idx in grid.query(pt):
+        if not alive[idx] or (best is not None and idx >= best):
+            continue
+        seg = segments[idx]
+        if _are_points_close(pt, seg[0], tolerance) or _are_points_close(pt, seg[1], tolerance):
+            best = idx
+
+    if best is None:
+        return None
+    return best, _are_points_close(pt, segments[best][prefer_end], tolerance)
+
+
 def find_all_connected_paths(segments, tolerance=1e-3):
     """
     バラバラの線分リストから、接続された複数のパス（頂点リストのリスト）を生成する。
+    端点を空間ハッシュに登録し、接続先の探索をほぼ線形時間で行う。
     """
     # 1. 重複削除
     clean_segments = _remove_duplicate_segments(segments, tolerance)
 
+    # 未処理の線分プール（alive フラグで管理）と端点インデックス
+    alive = [True] * len(clean_segments)
+    grid = _EndpointGrid(tolerance)
+    for idx, seg in enumerate(clean_segments):
+        grid.add(seg[0], idx)
+        grid.add(seg[1], idx)
+
     paths = []
-    pool = clean_segments.copy()  # 未処理の線分プール
+    next_start = 0
 
-    while pool:
-        # 新しいパスを開始
-        current_path_segments = [pool.pop(0)]
+    while True:
+        # 新しいパスを開始（プール先頭 = 未使用で最も若い線分）
+        while next_start < len(clean_segments) and not alive[next_start]:
+            next_start += 1
+        if next_start >= len(clean_segments):
+            break
+        alive[next_start] = False
+        current_path_segments = deque([clean_segments[next_start]])
 
         # --- 前方への探索 ---
         while True:
             last_pt = current_path_segments[-1][1]
-            found_next = None
-
-            for i, seg in enumerate(pool):
-                p1, p2 = seg[0], seg[1]
-                if _are_points_close(last_pt, p1, tolerance):
-                    found_next = (i, p2, False)  # そのまま接続
-                    break
-                elif _are_points_close(last_pt, p2, tolerance):
-                    found_next = (i, p1, True)  # 反転して接続
-                    break
+            found_next = _find_connectable(grid, alive, clean_segments, last_pt, 0, tolerance)
 
             if found_next:
-                idx, next_pt, flip = found_next
-                seg = pool.pop(idx)
-                if flip:
-                    current_path_segments.append((seg[1], seg[0]))  # 反転
+                idx, straight = found_next
+                alive[idx] = False
+                seg = clean_segments[idx]
+                if straight:
+                    current_path_segments.append(seg)  # そのまま接続
                 else:
-                    current_path_segments.append(seg)
+                    current_path_segments.append((seg[1], seg[0]))  # 反転して接続
             else:
                 break  # 行き止まり、または閉じた
 
@@ -86,24 +139,16 @@ def find_all_connected_paths(segments, tolerance=1e-3):
         if not _are_points_close(first_pt, end_pt, tolerance):
             while True:
                 first_pt = current_path_segments[0][0]
-                found_prev = None
-
-                for i, seg in enumerate(pool):
-                    p1, p2 = seg[0], seg[1]
-                    if _are_points_close(first_pt, p2, tolerance):
-                        found_prev = (i, p1, False)  # そのまま接続 (p1->p2) -> p2が今の始点
-                        break
-                    elif _are_points_close(first_pt, p1, tolerance):
-                        found_prev = (i, p2, True)  # 反転して接続 (p2->p1) -> p1が今の始点
-                        break
+                found_prev = _find_connectable(grid, alive, clean_segments, first_pt, 1, tolerance)
 
                 if found_prev:
-                    idx, prev_start, flip = found_prev
-                    seg = pool.pop(idx)
-                    if flip:
-                        current_path_segments.insert(0, (seg[1], seg[0]))
+                    idx, straight = found_prev
+                    alive[idx] = False
+                    seg = clean_segments[idx]
+                    if straight:
+                        current_path_segments.appendleft(seg)  # そのまま接続 (p1->p2) -> p2が今の始点
                     else:
-                        current_path_segments.insert(0, seg)
+                        current_path_segments.appendleft((seg[1], seg[0]))  # 反転して接続 (p2->p1)
                 else:
                     break
 
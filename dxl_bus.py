@@ -0,0 +1,148 @@
+# dxl_bus.py
+
+"""
+Dynamixel バス（1つの PortHandler）の所有スレッド。
+UI の更新ループ、溶着スレッド、ジョグ処理などが同時に DynamixelController を呼んでも、
+実際の送受信はこのスレッドだけが優先度付きキューの順に1件ずつ行う。
+  優先度: 緊急停止 > 動作指令 > テレメトリ(表示用の読み取り)
+呼び出し側には Future を返し、読み取った値は最新状態のスナップショットとして公開するので、
+表示だけが目的の読み手はバスに触れずに済む。
+"""
+
+import functools
+import itertools
+import queue
+import threading
+from concurrent.futures import Future
+
+from clock import SYSTEM_CLOCK
+
+PRIORITY_EMERGENCY = 0
+PRIORITY_MOTION = 1
+PRIORITY_TELEMETRY = 2
+
+
+class BusHaltedError(RuntimeError):
+    """緊急停止中に書き込み系のトランザクションが要求された"""
+
+
+class BusOwner:
+    def __init__(self, name="dxl-bus", clock=None):
+        self.name = name
+        self.clock = clock or SYSTEM_CLOCK  # 公開する値の時刻に使う
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()  # 同じ優先度内では投入順を守る
+        self._thread = None
+        self._running = False
+        self._halted = threading.Event()
+        self._state = {}
+        self._state_lock = threading.Lock()
+
+    # --- スレッド管理 ---
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=1.0):
+        if not self._running:
+            return
+        self._running = False
+        self._queue.put((PRIORITY_EMERGENCY, next(self._seq), None))  # 起床用
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._running
+
+    def in_bus_thread(self):
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def _run(self):
+        while self._running:
+            _, _, item = self._queue.get()
+            if item is None:
+                continue
+            future, fn, args, kwargs, is_write, priority = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                if is_write and priority != PRIORITY_EMERGENCY and self._halted.is_set():
+                    raise BusHaltedError("緊急停止中のため、モーターへの書き込みを拒否しました。")
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+
+        # 停止時に残っている要求は取り消す
+        while True:
+            try:
+                _, _, item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                item[0].cancel()
+
+    # --- 要求の投入 ---
+    def submit(self, fn, *args, priority=PRIORITY_MOTION, is_write=False, **kwargs):
+        """トランザクションをキューに積み、Future を返す"""
+        future = Future()
+        if not self._running:
+            # バススレッドが無い（接続前など）ときはその場で実行する
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+            return future
+        self._queue.put((priority, next(self._seq), (future, fn, args, kwargs, is_write, priority)))
+        return future
+
+    def call(self, fn, *args, priority=PRIORITY_MOTION, is_write=False, **kwargs):
+        """トランザクションを実行して結果を返す（バススレッド内からの呼び出しはそのまま実行）"""
+        if self.in_bus_thread():
+            if is_write and priority != PRIORITY_EMERGENCY and self._halted.is_set():
+                raise BusHaltedError("緊急停止中のため、モーターへの書き込みを拒否しました。")
+            return fn(*args, **kwargs)
+        return self.submit(fn, *args, priority=priority, is_write=is_write, **kwargs).result()
+
+    # --- 緊急停止ラッチ ---
+    def halt(self):
+        """以後、緊急停止以外の書き込みを拒否する（キュー済みのものも含む）"""
+        self._halted.set()
+
+    def resume(self):
+        self._halted.clear()
+
+    @property
+    def halted(self):
+        return self._halted.is_set()
+
+    # --- 最新状態のスナップショット ---
+    def publish(self, key, value, t=None):
+        """t: 値を読んだ時刻（読み取りの要求を出した時刻）。省略時は今"""
+        with self._state_lock:
+            self._state[key] = (value, self.clock.monotonic() if t is None else t)
+
+    def latest(self, key, default=None):
+        """(値, 取得時刻 monotonic) を返す。未取得なら default"""
+        with self._state_lock:
+            return self._state.get(key, default)
+
+    def snapshot(self):
+        with self._state_lock:
+            return dict(self._state)
+
+
+def bus_transaction(priority=PRIORITY_MOTION, is_write=False):
+    """
+    DynamixelController のメソッドを、self.bus の所有スレッド経由で実行させるデコレータ。
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            return self.bus.call(method, self, *args, priority=priority, is_write=is_write, **kwargs)
+        return wrapper
+    return decorator
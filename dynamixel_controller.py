@@ -3,7 +3,15 @@
 import os
 import time
 import config
-from dynamixel_sdk import *
+
+if getattr(config, 'HARDWARE_BACKEND', 'real') == 'sim':
+    # 実機なし: 仮想マシン (sim_hardware) の SDK 互換クラスを使う
+    from sim_hardware import (PortHandler, PacketHandler, GroupSyncWrite, GroupSyncRead, COMM_SUCCESS,
+                              DXL_LOBYTE, DXL_HIBYTE, DXL_LOWORD, DXL_HIWORD)
+else:
+    from dynamixel_sdk import *
+from dxl_bus import BusOwner, bus_transaction, PRIORITY_EMERGENCY
+from clock import default_clock
 
 # コントロールテーブルのアドレス
 ADDR_TORQUE_ENABLE = 64
@@ -16,17 +24,30 @@ ADDR_PRESENT_CURRENT = 126
 ADDR_PROFILE_VELOCITY = 112
 ADDR_PROFILE_ACCELERATION = 108
 ADDR_MOVING = 122
+ADDR_PRESENT_VELOCITY = 128
+ADDR_HARDWARE_ERROR_STATUS = 70
 ADDR_ACCELERATION_LIMIT = 40
 ADDR_POSITION_P_GAIN = 800
 
 class DynamixelController:
-    def __init__(self, log_callback=print):
+    def __init__(self, log_callback=print, clock=None):
         self.log = log_callback
+        self.clock = clock or default_clock()
         self.portHandler = PortHandler(config.DEVICENAME)
         self.packetHandler = PacketHandler(config.DXL_PROTOCOL_VERSION)
+        # 同期読み取り用の GroupSyncRead を (アドレス, 長さ, ID列) ごとに使い回す
+        self._sync_readers = {}
+        # 書き込んだレジスタ値の写し (dxl_id, アドレス) -> 値。
+        # 同じ値の再書き込み（毎点の set_profile 等）を省略するために使う
+        self._register_cache = {}
+        # 最後の同期読み取りの要求を出した時刻（公開する値の時刻に使う）
+        self.last_read_time = 0.0
+        # バス所有スレッド。connect() で起動し、以後の送受信はすべてこのスレッドが行う
+        self.bus = BusOwner(clock=self.clock)
         self.log("  [HW] Dynamixelコントローラを初期化しました。")
 
     def connect(self, devicename):
+        self.invalidate_register_cache()
         if self.portHandler.openPort():
             self.log(f"  [HW] Dynamixelポート '{devicename}' のオープンに成功。")
         else:
@@ -37,9 +58,13 @@ class DynamixelController:
         else:
             self.log(f"  [HW] エラー: ボーレートの設定に失敗。");
             return False
+        self.bus.resume()
+        self.bus.start()
         return True
 
     def disconnect(self):
+        self.bus.stop()
+        self.invalidate_register_cache()
         self.portHandler.closePort()
         self.log("  [HW] Dynamixelポートの接続を解除しました。")
 
@@ -52,64 +77,113 @@ class DynamixelController:
             return False
         return True
 
+    # ------------------------------------------------------------------
+    # レジスタ書き込みキャッシュ（ライトスルー）
+    # ------------------------------------------------------------------
+    def invalidate_register_cache(self, dxl_id=None):
+        """キャッシュを破棄する。dxl_id 指定時はそのモーター分のみ"""
+        if dxl_id is None:
+            self._register_cache.clear()
+        else:
+            for key in [k for k in self._register_cache if k[0] == dxl_id]:
+                self._register_cache.pop(key, None)
+
+    def _write_cached(self, dxl_id, address, length, value, operation):
+        """
+        前回書き込んだ値と同じなら通信を省略する。
+        戻り値: (書き込み成否, 実際に書き込んだか)
+        """
+        key = (dxl_id, address)
+        if self._register_cache.get(key) == value:
+            return True, False
+
+        if length == 4:
+            dxl_comm_result, dxl_error = self.packetHandler.write4ByteTxRx(self.portHandler, dxl_id, address, value)
+        elif length == 2:
+            dxl_comm_result, dxl_error = self.packetHandler.write2ByteTxRx(self.portHandler, dxl_id, address, value)
+        else:
+            dxl_comm_result, dxl_error = self.packetHandler.write1ByteTxRx(self.portHandler, dxl_id, address, value)
+
+        if self._check_error(dxl_comm_result, dxl_error, dxl_id, operation):
+            self._register_cache[key] = value
+            return True, True
+        # 失敗時は実機の値が不明なのでキャッシュを捨てる
+        self._register_cache.pop(key, None)
+        return False, True
+
+    @bus_transaction()
     def ping(self, dxl_id):
         _, dxl_comm_result, dxl_error = self.packetHandler.ping(self.portHandler, dxl_id)
         return self._check_error(dxl_comm_result, dxl_error, dxl_id, "Ping")
 
+    @bus_transaction(is_write=True)
     def enable_torque(self, dxl_id):
         dxl_comm_result, dxl_error = self.packetHandler.write1ByteTxRx(self.portHandler, dxl_id, ADDR_TORQUE_ENABLE, 1)
         if self._check_error(dxl_comm_result, dxl_error, dxl_id, "Torque ON"):
             self.log(f"  [HW] モーターID {dxl_id} のトルクをONにしました。")
 
+    @bus_transaction()
     def disable_torque(self, dxl_id):
+        # トルクOFF後は手で動かされたり設定し直されたりするので、写しは信用しない
+        self.invalidate_register_cache(dxl_id)
         dxl_comm_result, dxl_error = self.packetHandler.write1ByteTxRx(self.portHandler, dxl_id, ADDR_TORQUE_ENABLE, 0)
         if self._check_error(dxl_comm_result, dxl_error, dxl_id, "Torque OFF"):
             self.log(f"  [HW] モーターID {dxl_id} のトルクをOFFにしました。")
 
+    @bus_transaction(is_write=True)
     def set_operating_mode(self, dxl_id, mode):
+        # 既に同じモードならトルクOFF/ONの往復ごと省略する
+        if self._register_cache.get((dxl_id, ADDR_OPERATING_MODE)) == mode:
+            return
         self.disable_torque(dxl_id)
-        dxl_comm_result, dxl_error = self.packetHandler.write1ByteTxRx(self.portHandler, dxl_id, ADDR_OPERATING_MODE,
-                                                                       mode)
-        if self._check_error(dxl_comm_result, dxl_error, dxl_id, "Set Mode"):
+        ok, _ = self._write_cached(dxl_id, ADDR_OPERATING_MODE, 1, mode, "Set Mode")
+        if ok:
             self.log(f"  [HW] モーターID {dxl_id} の動作モードを {mode} に設定。")
         self.enable_torque(dxl_id)
 
+    @bus_transaction(is_write=True)
     def set_profile(self, dxl_id, velocity, acceleration):
-        self.packetHandler.write4ByteTxRx(self.portHandler, dxl_id, ADDR_PROFILE_VELOCITY, velocity)
-        self.packetHandler.write4ByteTxRx(self.portHandler, dxl_id, ADDR_PROFILE_ACCELERATION, acceleration)
-        self.log(f"  [HW] モーターID {dxl_id} のプロファイルを設定: V={velocity}, A={acceleration}")
+        _, wrote_v = self._write_cached(dxl_id, ADDR_PROFILE_VELOCITY, 4, velocity, "Set Profile Velocity")
+        _, wrote_a = self._write_cached(dxl_id, ADDR_PROFILE_ACCELERATION, 4, acceleration,
+                                        "Set Profile Acceleration")
+        if wrote_v or wrote_a:
+            self.log(f"  [HW] モーターID {dxl_id} のプロファイルを設定: V={velocity}, A={acceleration}")
 
+    @bus_transaction(is_write=True)
     def set_current_limit(self, dxl_id, current_ma):
         current_pulse = int(current_ma / 2.69)
-        dxl_comm_result, dxl_error = self.packetHandler.write2ByteTxRx(self.portHandler, dxl_id, ADDR_GOAL_CURRENT,
-                                                                       current_pulse)
-        if self._check_error(dxl_comm_result, dxl_error, dxl_id, "Set Current Limit"):
+        ok, wrote = self._write_cached(dxl_id, ADDR_GOAL_CURRENT, 2, current_pulse, "Set Current Limit")
+        if ok and wrote:
             self.log(f"  [HW] ID {dxl_id} の電流制限値を {current_ma}mA (pulse:{current_pulse}) に設定。")
 
+    @bus_transaction(is_write=True)
     def set_goal_current(self, dxl_id, current_ma):
         current_pulse = int(current_ma / 2.69)
-        dxl_comm_result, dxl_error = self.packetHandler.write2ByteTxRx(self.portHandler, dxl_id, ADDR_GOAL_CURRENT,
-                                                                       current_pulse)
-        self._check_error(dxl_comm_result, dxl_error, dxl_id,
-                          f"Set Goal Current: {current_ma}mA (pulse:{current_pulse})")
+        self._write_cached(dxl_id, ADDR_GOAL_CURRENT, 2, current_pulse,
+                           f"Set Goal Current: {current_ma}mA (pulse:{current_pulse})")
 
+    @bus_transaction(is_write=True)
     def set_goal_velocity(self, dxl_id, velocity_pulse):
         dxl_comm_result, dxl_error = self.packetHandler.write4ByteTxRx(self.portHandler, dxl_id, ADDR_GOAL_VELOCITY,
                                                                        velocity_pulse)
         self._check_error(dxl_comm_result, dxl_error, dxl_id, f"Set Goal Velocity: {velocity_pulse}")
 
+    @bus_transaction(is_write=True)
     def set_goal_position(self, dxl_id, position_pulse):
         dxl_comm_result, dxl_error = self.packetHandler.write4ByteTxRx(self.portHandler, dxl_id, ADDR_GOAL_POSITION,
                                                                        position_pulse)
         self._check_error(dxl_comm_result, dxl_error, dxl_id, f"Set Goal Pos: {position_pulse}")
 
+    @bus_transaction()
     def read_present_position(self, dxl_id):
         try:
             # tryブロックで囲むことで、SDK内部のエラーをキャッチします
+            t = self.clock.monotonic()
             dxl_present_position, dxl_comm_result, dxl_error = self.packetHandler.read4ByteTxRx(self.portHandler,
                                                                                                 dxl_id,
                                                                                                 ADDR_PRESENT_POSITION)
             if self._check_error(dxl_comm_result, dxl_error, dxl_id, "Read Position"):
+                self.bus.publish((dxl_id, 'position'), dxl_present_position, t)
                 return dxl_present_position
         except Exception as e:
             # エラーが発生した場合はログを出して -1 (失敗) を返す
@@ -118,32 +192,213 @@ class DynamixelController:
 
         return -1
 
+    @bus_transaction()
     def read_present_current(self, dxl_id):
+        t = self.clock.monotonic()
         dxl_present_current, dxl_comm_result, dxl_error = self.packetHandler.read2ByteTxRx(self.portHandler, dxl_id,
                                                                                            ADDR_PRESENT_CURRENT)
         if self._check_error(dxl_comm_result, dxl_error, dxl_id, "Read Current"):
             if dxl_present_current > 32767:
                 dxl_present_current -= 65536
-            return int(dxl_present_current * 2.69)
+            current_ma = int(round(dxl_present_current * 2.69))
+            self.bus.publish((dxl_id, 'current'), current_ma, t)
+            return current_ma
         return -1
 
+    @bus_transaction()
     def is_moving(self, dxl_id):
+        t = self.clock.monotonic()
         is_moving_val, dxl_comm_result, dxl_error = self.packetHandler.read1ByteTxRx(self.portHandler, dxl_id,
                                                                                      ADDR_MOVING)
         if self._check_error(dxl_comm_result, dxl_error, dxl_id, "Read IsMoving"):
+            self.bus.publish((dxl_id, 'moving'), is_moving_val == 1, t)
             return is_moving_val == 1
         return False
 
+    @bus_transaction(is_write=True)
     def set_acceleration_limit(self, dxl_id, acceleration_limit):
         dxl_comm_result, dxl_error = self.packetHandler.write4ByteTxRx(self.portHandler, dxl_id,
                                                                        ADDR_ACCELERATION_LIMIT, acceleration_limit)
         if self._check_error(dxl_comm_result, dxl_error, dxl_id, f"Set Accel Limit: {acceleration_limit}"):
             self.log(f"  [HW] モーターID {dxl_id} の加速度制限値を設定: {acceleration_limit}")
 
+    @bus_transaction(is_write=True)
     def set_position_p_gain(self, dxl_id, p_gain):
         # Pゲインは 2バイトデータなので write2ByteTxRx を使用
-        dxl_comm_result, dxl_error = self.packetHandler.write2ByteTxRx(
-            self.portHandler, dxl_id, ADDR_POSITION_P_GAIN, p_gain
-        )
-        if self._check_error(dxl_comm_result, dxl_error, dxl_id, f"Set P-Gain: {p_gain}"):
-            self.log(f"  [HW] モーターID {dxl_id} の Position P Gain を {p_gain} に設定しました。")
\ No newline at end of file
+        ok, wrote = self._write_cached(dxl_id, ADDR_POSITION_P_GAIN, 2, p_gain, f"Set P-Gain: {p_gain}")
+        if ok and wrote:
+            self.log(f"  [HW] モーターID {dxl_id} の Position P Gain を {p_gain} に設定しました。")
+
+    # ------------------------------------------------------------------
+    # 同期書き込み / 同期読み取り (GroupSyncWrite / GroupSyncRead)
+    # 複数軸への指令・読み取りを1パケットにまとめ、バス往復の回数を減らす
+    # ------------------------------------------------------------------
+    def _sync_write(self, address, length, values, operation):
+        """values: {dxl_id: int}。1パケットで全IDへ書き込む"""
+        if not values:
+            return True
+        group = GroupSyncWrite(self.portHandler, self.packetHandler, address, length)
+        for dxl_id, value in values.items():
+            value = int(value)
+            if length == 4:
+                param = [DXL_LOBYTE(DXL_LOWORD(value)), DXL_HIBYTE(DXL_LOWORD(value)),
+                         DXL_LOBYTE(DXL_HIWORD(value)), DXL_HIBYTE(DXL_HIWORD(value))]
+            elif length == 2:
+                param = [DXL_LOBYTE(value), DXL_HIBYTE(value)]
+            elif length == 1:
+                param = [value & 0xFF]
+            else:
+                # 連続した複数レジスタ（下位アドレスから順にリトルエンディアン）
+                param = [(value >> (8 * k)) & 0xFF for k in range(length)]
+            if not group.addParam(dxl_id, param):
+                self.log(f"  [HW] エラー (ID:{dxl_id}, {operation}): addParam に失敗")
+                return False
+        dxl_comm_result = group.txPacket()
+        group.clearParam()
+        if dxl_comm_result != COMM_SUCCESS:
+            self.log(f"  [HW] エラー ({operation}): {self.packetHandler.getTxRxResult(dxl_comm_result)}")
+            return False
+        return True
+
+    def _sync_read_group(self, address, length, dxl_ids, operation):
+        """GroupSyncRead で1パケット読み取りを行い、成功したら group を返す（失敗時 None）"""
+        key = (address, length, dxl_ids)
+        group = self._sync_readers.get(key)
+        if group is None:
+            group = GroupSyncRead(self.portHandler, self.packetHandler, address, length)
+            for dxl_id in dxl_ids:
+                group.addParam(dxl_id)
+            self._sync_readers[key] = group
+
+        try:
+            dxl_comm_result = group.txRxPacket()
+        except Exception as e:
+            self.log(f"  [HW] 警告: 同期読み取りで例外が発生しました ({operation}) - {e}")
+            return None
+        if dxl_comm_result != COMM_SUCCESS:
+            self.log(f"  [HW] エラー ({operation}): {self.packetHandler.getTxRxResult(dxl_comm_result)}")
+            return None
+        return group
+
+    def _sync_read(self, address, length, dxl_ids, operation):
+        """dxl_ids の同じアドレスを1パケットで読む。戻り値 {dxl_id: 値 or -1}（読んだ時刻は self.last_read_time）"""
+        dxl_ids = tuple(dxl_ids)
+        result = {dxl_id: -1 for dxl_id in dxl_ids}
+        self.last_read_time = self.clock.monotonic()
+        group = self._sync_read_group(address, length, dxl_ids, operation)
+        if group is None:
+            return result
+
+        for dxl_id in dxl_ids:
+            if group.isAvailable(dxl_id, address, length):
+                result[dxl_id] = group.getData(dxl_id, address, length)
+        return result
+
+    @bus_transaction(is_write=True)
+    def sync_write_goal_positions(self, goals):
+        """goals: {dxl_id: position_pulse}。全軸の目標位置を同時に書き込む"""
+        return self._sync_write(ADDR_GOAL_POSITION, 4, goals, f"Sync Goal Pos: {goals}")
+
+    @bus_transaction(is_write=True)
+    def sync_write_profiles(self, profiles):
+        """
+        profiles: {dxl_id: (velocity, acceleration)}。
+        Profile Acceleration(108) と Profile Velocity(112) は連続しているので、8バイトを1パケットで書き込む。
+        前回書き込んだ値と同じ軸は省く。
+        """
+        changed = {}
+        for dxl_id, (velocity, acceleration) in profiles.items():
+            velocity, acceleration = int(velocity), int(acceleration)
+            if (self._register_cache.get((dxl_id, ADDR_PROFILE_VELOCITY)) != velocity
+                    or self._register_cache.get((dxl_id, ADDR_PROFILE_ACCELERATION)) != acceleration):
+                changed[dxl_id] = (velocity, acceleration)
+        if not changed:
+            return True
+
+        values = {dxl_id: (acceleration & 0xFFFFFFFF) | ((velocity & 0xFFFFFFFF) << 32)
+                  for dxl_id, (velocity, acceleration) in changed.items()}
+        ok = self._sync_write(ADDR_PROFILE_ACCELERATION, 8, values, f"Sync Profile: {changed}")
+        for dxl_id, (velocity, acceleration) in changed.items():
+            if ok:
+                self._register_cache[(dxl_id, ADDR_PROFILE_VELOCITY)] = velocity
+                self._register_cache[(dxl_id, ADDR_PROFILE_ACCELERATION)] = acceleration
+            else:
+                self._register_cache.pop((dxl_id, ADDR_PROFILE_VELOCITY), None)
+                self._register_cache.pop((dxl_id, ADDR_PROFILE_ACCELERATION), None)
+        return ok
+
+    @bus_transaction()
+    def sync_read_present_positions(self, dxl_ids):
+        """現在位置をまとめて読む。失敗したIDは -1"""
+        values = self._sync_read(ADDR_PRESENT_POSITION, 4, dxl_ids, "Sync Read Position")
+        for dxl_id, value in values.items():
+            if value != -1:
+                self.bus.publish((dxl_id, 'position'), value, self.last_read_time)
+        return values
+
+    @bus_transaction()
+    def sync_read_moving(self, dxl_ids):
+        """Moving フラグをまとめて読む。戻り値 {dxl_id: True/False}（失敗時 False）"""
+        values = self._sync_read(ADDR_MOVING, 1, dxl_ids, "Sync Read IsMoving")
+        for dxl_id, value in values.items():
+            if value != -1:
+                self.bus.publish((dxl_id, 'moving'), value == 1, self.last_read_time)
+        return {dxl_id: value == 1 for dxl_id, value in values.items()}
+
+    def emergency_disable_torque(self, dxl_ids):
+        """
+        緊急停止。以後の通常書き込みを拒否する状態にしてから、
+        キューの先頭（最優先）で全モーターのトルクをOFFにする。解除は bus.resume()。
+        """
+        self.bus.halt()
+
+        def _disable_all():
+            for dxl_id in dxl_ids:
+                self.disable_torque(dxl_id)
+
+        return self.bus.call(_disable_all, priority=PRIORITY_EMERGENCY)
+
+    @bus_transaction()
+    def sync_read_state(self, dxl_ids):
+        """
+        Moving(122) 〜 Present Position(132) の連続領域を1パケットで読み、軸ごとの状態を返す。
+        戻り値 {dxl_id: {'moving', 'current', 'velocity', 'position', 't'} or None(読み取り失敗)}
+        current は mA、velocity は符号付きの生値、t は読み取りの要求を出した時刻 (monotonic)。
+        """
+        dxl_ids = tuple(dxl_ids)
+        length = ADDR_PRESENT_POSITION + 4 - ADDR_MOVING
+        t = self.clock.monotonic()
+        group = self._sync_read_group(ADDR_MOVING, length, dxl_ids, "Sync Read State")
+        result = {dxl_id: None for dxl_id in dxl_ids}
+        if group is None:
+            return result
+
+        for dxl_id in dxl_ids:
+            if not group.isAvailable(dxl_id, ADDR_MOVING, length):
+                continue
+            current = group.getData(dxl_id, ADDR_PRESENT_CURRENT, 2)
+            if current > 32767:
+                current -= 65536
+            velocity = group.getData(dxl_id, ADDR_PRESENT_VELOCITY, 4)
+            if velocity > 0x7FFFFFFF:
+                velocity -= 0x100000000
+            state = {
+                'moving': group.getData(dxl_id, ADDR_MOVING, 1) == 1,
+                'current': int(round(current * 2.69)),
+                'velocity': velocity,
+                'position': group.getData(dxl_id, ADDR_PRESENT_POSITION, 4),
+            }
+            for name, value in state.items():
+                self.bus.publish((dxl_id, name), value, t)
+            state['t'] = t
+            result[dxl_id] = state
+        return result
+
+    @bus_transaction()
+    def sync_read_hardware_error(self, dxl_ids):
+        """Hardware Error Status をまとめて読む。戻り値 {dxl_id: ビット値 or -1}"""
+        values = self._sync_read(ADDR_HARDWARE_ERROR_STATUS, 1, dxl_ids, "Sync Read HW Error")
+        for dxl_id, value in values.items():
+            if value != -1:
+                self.bus.publish((dxl_id, 'hardware_error'), value, self.last_read_time)
+        return values
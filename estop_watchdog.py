@@ -0,0 +1,177 @@
+# estop_watchdog.py
+
+"""
+非常停止ボタン (config.EMERGENCY_STOP_PIN) の監視。
+従来は非常停止ボタンの入力を誰も読んでおらず、停止手段は画面の緊急停止ボタン（stop_event）だけで、
+それも溶着点の合間にしか確認されなかった。
+ここでは DI 走査スレッド (InputScanner) のコールバックとして、入力の変化を走査周期（約1ms）で受け取り、
+走査スレッド上でそのまま
+  1. 溶着機を OFF（DIO への書き込み。バスを経由しない）
+  2. バスを停止状態にし、キューの先頭（緊急停止の優先度）で全軸のトルクを OFF
+を行う。入力の変化（エッジ推定時刻）からそれぞれが終わるまでの時間を計測し、記録・公開する。
+入力が読めない間は非常停止ボタンも見えないので、安全側に倒して
+  - 走査 (dio.read) が例外を出したとき
+  - 最後の走査から ESTOP_MAX_LATENCY_SEC 以上たっても次の走査が完了しないとき（別スレッドで監視）
+も同じ停止を行う。
+"""
+
+import threading
+
+import config
+
+# 作動の理由
+REASON_BUTTON = 'button'
+REASON_SCAN_ERROR = 'scan_error'
+REASON_SCAN_STALE = 'scan_stale'
+REASON_TEXT = {
+    REASON_BUTTON: "非常停止ボタン作動",
+    REASON_SCAN_ERROR: "DI 走査エラーのため非常停止",
+    REASON_SCAN_STALE: "DI 走査が止まったため非常停止",
+}
+
+
+class EmergencyStopWatchdog:
+    def __init__(self, scanner, motion, welder, input_name='emergency', on_trip=None, log_callback=print):
+        """
+        scanner : InputScanner（input_name の入力が登録されていること）
+        motion  : MotionSystem（None 可）
+        welder  : WelderController（None 可）
+        on_trip : 停止後に呼ぶ関数 on_trip(latency)。走査スレッド・監視スレッドから呼ばれるので、UI 操作は after 等で渡すこと
+                  latency['reason'] が作動の理由（REASON_*）
+        """
+        self.scanner = scanner
+        self.clock = scanner.clock
+        self.motion = motion
+        self.welder = welder
+        self.input_name = input_name
+        self.on_trip = on_trip
+        self.log = log_callback
+        self.max_latency = getattr(config, 'ESTOP_MAX_LATENCY_SEC', 0.05)
+
+        self._lock = threading.Lock()
+        self._tripped = False
+        self._monitor_thread = None
+        self._monitoring = False
+        self.last_latency = None  # 最後の作動の計測値 dict
+        self.latency_history = []  # 作動ごとの計測値 dict のリスト
+
+    def start(self):
+        self.scanner.add_callback(self.input_name, self._on_edge)
+        self.scanner.add_fault_callback(self._on_scan_fault)
+        self._monitoring = True
+        self._monitor_thread = threading.Thread(target=self._monitor, name="estop-monitor", daemon=True)
+        self._monitor_thread.start()
+        # 起動時点で押されていれば、すぐ作動させる
+        if self.scanner.state(self.input_name):
+            self.trip(self.clock.monotonic())
+
+    def stop(self):
+        self._monitoring = False
+        self.scanner.remove_callback(self.input_name, self._on_edge)
+        self.scanner.remove_fault_callback(self._on_scan_fault)
+        if self._monitor_thread is not None:
+            self._monitor_thread.join(1.0)
+            self._monitor_thread = None
+
+    @property
+    def tripped(self):
+        return self._tripped
+
+    def _on_edge(self, edge):
+        if edge.state:
+            self.trip(edge.t)
+
+    def _on_scan_fault(self, error):
+        # 最後に入力を確認できた時刻を起点にする
+        self.trip(self.scanner.last_scan_time, reason=REASON_SCAN_ERROR)
+
+    def _scan_age(self):
+        return self.clock.monotonic() - self.scanner.last_scan_time
+
+    def _monitor(self):
+        """走査スレッドが止まっていない（dio.read で固まっていない）かを見張る"""
+        interval = self.max_latency / 2.0
+        while self._monitoring:
+            self.clock.sleep(interval)
+            if not self._tripped and self._scan_age() > self.max_latency:
+                self.trip(self.scanner.last_scan_time, reason=REASON_SCAN_STALE)
+
+    def trip(self, edge_time, reason=REASON_BUTTON):
+        """
+        非常停止を作動させる。edge_time: 入力が変化した（推定）時刻 (clock.monotonic)
+          走査の異常による作動では、最後に入力を確認できた時刻
+        戻り値: 計測値 dict（すでに作動中なら None）
+          'reason'     : 作動の理由 (REASON_*)
+          'detect'     : エッジから検知まで [s]
+          'welder_off' : エッジから溶着機 OFF まで [s]
+          'torque_off' : エッジから全軸トルク OFF の完了まで [s]
+        """
+        with self._lock:
+            if self._tripped:
+                return None
+            self._tripped = True
+
+        detected = self.clock.monotonic()
+        welder_off = torque_off = None
+
+        if self.welder is not None:
+            try:
+                self.welder.turn_off()
+                welder_off = self.clock.monotonic()
+            except Exception as e:
+                self.log(f"!!! 非常停止: 溶着機の OFF に失敗しました: {e}")
+
+        if self.motion is not None:
+            try:
+                self.motion.dxl.emergency_disable_torque(list(config.DXL_IDS.values()))
+                torque_off = self.clock.monotonic()
+            except Exception as e:
+                self.log(f"!!! 非常停止: トルク OFF に失敗しました: {e}")
+
+        latency = {
+            'reason': reason,
+            'detect': detected - edge_time,
+            'welder_off': None if welder_off is None else welder_off - edge_time,
+            'torque_off': None if torque_off is None else torque_off - edge_time,
+        }
+        self.last_latency = latency
+        self.latency_history.append(latency)
+
+        self.log(f"!!! {REASON_TEXT[reason]}: {self.format_latency(latency)} !!!")
+        worst = max(latency[k] for k in ('detect', 'welder_off', 'torque_off') if latency[k] is not None)
+        if worst > self.max_latency:
+            self.log(f"!!! 警告: 非常停止の応答が上限 {self.max_latency * 1000:.0f}ms を超えました "
+                     f"({worst * 1000:.1f}ms) !!!")
+
+        if self.on_trip is not None:
+            try:
+                self.on_trip(latency)
+            except Exception as e:
+                self.log(f"非常停止の通知でエラー: {e}")
+        return latency
+
+    def reset(self):
+        """復帰前に呼ぶ。ボタンが押されたまま、または入力が読めていなければ False（作動状態のまま）"""
+        if self.scanner.last_error is not None or self._scan_age() > self.max_latency:
+            return False
+        if self.scanner.state(self.input_name):
+            return False
+        with self._lock:
+            self._tripped = False
+        return True
+
+    def latency_stats(self):
+        """これまでの作動の最大値 {'count', 'detect', 'welder_off', 'torque_off'}（未計測の項目は None）"""
+        stats = {'count': len(self.latency_history)}
+        for key in ('detect', 'welder_off', 'torque_off'):
+            values = [h[key] for h in self.latency_history if h[key] is not None]
+            stats[key] = max(values) if values else None
+        return stats
+
+    @staticmethod
+    def format_latency(latency):
+        parts = []
+        for key, label in (('detect', "検知"), ('welder_off', "溶着機OFF"), ('torque_off', "トルクOFF")):
+            value = latency.get(key)
+            parts.append(f"{label} {value * 1000:.1f}ms" if value is not None else f"{label} 失敗")
+        return ", ".join(parts)
@@ -0,0 +1,217 @@
+# homing.py
+
+"""
+X/Y 同時ホーミング。
+従来は X を最後まで（事前離脱 → 高速接近 → バックオフ → 低速再接近）終えてから Y を始めていた。
+ここでは軸ごとの状態機械を1つのループで同時に進める。
+  - リミットスイッチは両軸分を1回の走査でまとめて読む
+  - 位置・Moving フラグは両軸分を1回の同期読み取り (sync_read_state) で読む
+  - 各軸はそれぞれのセンサーのエッジで独立に止める
+  - センサーが DI 走査スレッド (InputScanner) に接続されていれば、原点はセンサーのエッジ時刻の位置
+    （走査スレッドのラッチ）にする。停止後に位置を読み直すことによる揺らぎがなくなる
+各軸の工程ごとの所要時間を記録して報告する。
+手順・速度・加速度は MotionSystem._home_single_axis と同じ。
+"""
+
+import config
+from io_controller import scan_sensors
+from motion_wait import predict_move_time, predict_stop_time
+
+# 工程
+PRE_BACKOFF = 'pre_backoff'  # 事前離脱（位置制御で逆方向へ 10mm）
+FAST = 'fast'  # 高速接近（センサー検知まで）
+FAST_STOP = 'fast_stop'  # 高速接近後の減速待ち
+BACKOFF = 'backoff'  # センサーから離れる
+BACKOFF_STOP = 'backoff_stop'  # バックオフ後の減速待ち
+SLOW = 'slow'  # 低速再接近（原点確定）
+SLOW_STOP = 'slow_stop'  # 原点確定後の減速待ち
+DONE = 'done'
+
+PHASE_NAMES = {PRE_BACKOFF: "事前離脱", FAST: "高速接近", FAST_STOP: "検知後の停止",
+               BACKOFF: "バックオフ", BACKOFF_STOP: "バックオフ後の停止", SLOW: "低速接近", SLOW_STOP: "原点確定後の停止"}
+
+PRE_BACKOFF_MM = 10.0
+
+
+class _AxisHoming:
+    """1軸分の状態"""
+
+    def __init__(self, axis, dxl_id, sensor, pulses_per_mm):
+        self.axis = axis
+        self.dxl_id = dxl_id
+        self.sensor = sensor
+        self.pulses_per_mm = pulses_per_mm
+        self.sign = config.HOMING_VELOCITY_SIGN.get(axis, -1)
+        self.phase = None
+        self.phase_start = 0.0
+        self.ready_at = 0.0  # この時刻までは停止判定をしない（プロファイル上の所要時間）
+        self.stable = 0  # 停止が連続で確認できた回数
+        self.deadline = None  # バックオフのタイムアウト時刻
+        self.start_pos = -1
+        self.target_pulses = 0
+        self.backoff_velocity = 0
+        self.final_pos = -1
+        self.latch = None  # 低速接近のエッジで位置をラッチする PositionLatch
+        self.timings = {}  # 工程 -> 所要時間 [s]
+
+
+class ParallelHoming:
+    def __init__(self, motion, sensors, poll_interval=None):
+        """
+        motion : MotionSystem
+        sensors: {'x': SensorController, 'y': SensorController}
+        """
+        self.motion = motion
+        self.dxl = motion.dxl
+        self.log = motion.log
+        self.criteria = motion.waiter.criteria('homing')
+        self.latch_wait = getattr(config, 'DIO_LATCH_TIMEOUT_SEC', 0.1)
+        self.poll_interval = poll_interval if poll_interval is not None else getattr(
+            config, 'HOMING_POLL_INTERVAL', 0.005)
+        self.axes = [_AxisHoming(axis, config.DXL_IDS[axis], sensors[axis],
+                                 motion.pulses_per_mm_x if axis == 'x' else motion.pulses_per_mm_y)
+                     for axis in ('x', 'y')]
+
+    def _enter(self, a, phase, now):
+        if a.phase is not None:
+            a.timings[a.phase] = now - a.phase_start
+        a.phase = phase
+        a.phase_start = now
+        a.stable = 0
+
+    # --- 工程の開始 ---
+    def _start_pre_backoff(self, a, position, now):
+        a.target_pulses = int(PRE_BACKOFF_MM * a.pulses_per_mm * -a.sign)
+        self.dxl.set_operating_mode(a.dxl_id, 4)
+        self.dxl.set_profile(a.dxl_id, int(config.HOMING_SPEED_FAST), int(config.HOMING_APPROACH_ACCELERATION))
+        self.dxl.set_goal_position(a.dxl_id, position + a.target_pulses)
+        self._enter(a, PRE_BACKOFF, now)
+        a.ready_at = now + predict_move_time(a.target_pulses, int(config.HOMING_SPEED_FAST),
+                                             int(config.HOMING_APPROACH_ACCELERATION))
+
+    def _start_velocity(self, a, phase, velocity, acceleration, now):
+        self.dxl.set_operating_mode(a.dxl_id, 1)
+        self.dxl.set_profile(a.dxl_id, 0, int(acceleration))
+        self.dxl.set_goal_velocity(a.dxl_id, velocity)
+        self._enter(a, phase, now)
+
+    def _stop(self, a, phase, velocity, acceleration, now):
+        self.dxl.set_goal_velocity(a.dxl_id, 0)
+        self._enter(a, phase, now)
+        a.ready_at = now + predict_stop_time(velocity, acceleration)
+
+    def run(self):
+        """
+        両軸を同時に原点復帰させる。
+        戻り値: {axis: {工程: 所要時間 [s], 'total': 合計}}
+        """
+        try:
+            return self._run()
+        finally:
+            # 中断・エッジが来なかった場合も、走査側に残ったラッチを片付ける
+            for a in self.axes:
+                self._release_latch(a)
+
+    def _release_latch(self, a):
+        if a.latch is not None:
+            a.sensor.scanner.cancel_latch(a.latch)
+            a.latch = None
+
+    def _run(self):
+        motion = self.motion
+        ids = tuple(a.dxl_id for a in self.axes)
+        fast_speed = int(config.HOMING_SPEED_FAST)
+        slow_speed = int(config.HOMING_SPEED_SLOW)
+        stable_samples = self.criteria['stable_samples']
+        start = motion.clock.monotonic()
+
+        # 事前離脱（位置が読めない軸は省いて高速接近から）
+        present = self.dxl.sync_read_present_positions(ids)
+        for a in self.axes:
+            if present[a.dxl_id] != -1:
+                self._start_pre_backoff(a, present[a.dxl_id], start)
+            else:
+                self._start_velocity(a, FAST, fast_speed * a.sign, motion.homing_approach_accel, start)
+        self.log("XY軸 事前離脱動作開始 (位置制御で逆方向に10mm移動)...")
+
+        while any(a.phase != DONE for a in self.axes):
+            now = motion.clock.monotonic()
+
+            # センサーは両軸分を1回の走査で読む（センサー待ちの軸があるときだけ）
+            waiting = [a for a in self.axes if a.phase in (FAST, SLOW)]
+            triggered = scan_sensors({a.axis: a.sensor for a in waiting}) if waiting else {}
+            # 位置・Moving フラグも1回の同期読み取りで読む
+            state = self.dxl.sync_read_state(ids)
+
+            for a in self.axes:
+                s = state.get(a.dxl_id)
+                if s is not None and not s['moving'] and now >= a.ready_at:
+                    a.stable += 1
+                else:
+                    a.stable = 0
+                stopped = a.stable >= stable_samples
+
+                if a.phase == PRE_BACKOFF and stopped:
+                    self.log(f"{a.axis.upper()}軸 事前離脱動作完了。原点探索 (高速)...")
+                    self._start_velocity(a, FAST, fast_speed * a.sign, motion.homing_approach_accel, now)
+
+                elif a.phase == FAST and triggered.get(a.axis):
+                    self._stop(a, FAST_STOP, fast_speed, motion.homing_approach_accel, now)
+                    self.log(f"{a.axis.upper()}軸 センサー検知。")
+
+                elif a.phase == FAST_STOP and stopped:
+                    a.start_pos = s['position']
+                    a.target_pulses = int(float(motion.homing_backoff_mm) * a.pulses_per_mm * -a.sign)
+                    a.backoff_velocity = int(motion.homing_backoff_speed * (-a.sign)) or int(-a.sign)
+                    self._start_velocity(a, BACKOFF, a.backoff_velocity, motion.homing_backoff_accel, now)
+                    a.deadline = now + motion._backoff_timeout
+
+                elif a.phase == BACKOFF:
+                    if now > a.deadline:
+                        self.log(f"  !! {a.axis.upper()}軸 バックオフがタイムアウトしました。停止します。")
+                        reached = True
+                    elif s is None:
+                        reached = False
+                    else:
+                        moved = s['position'] - a.start_pos
+                        reached = ((a.target_pulses >= 0 and moved >= a.target_pulses)
+                                   or (a.target_pulses <= 0 and moved <= a.target_pulses))
+                    if reached:
+                        self._stop(a, BACKOFF_STOP, a.backoff_velocity, motion.homing_backoff_accel, now)
+
+                elif a.phase == BACKOFF_STOP and stopped:
+                    self.log(f"{a.axis.upper()}軸 原点確定 (低速)...")
+                    scanner = getattr(a.sensor, 'scanner', None)
+                    if scanner is not None and scanner.running:
+                        a.latch = scanner.arm_latch(a.sensor.scanner_name, (a.dxl_id,))
+                    self._start_velocity(a, SLOW, slow_speed * a.sign, motion.homing_slow_accel, now)
+
+                elif a.phase == SLOW and triggered.get(a.axis):
+                    self._stop(a, SLOW_STOP, slow_speed, motion.homing_slow_accel, now)
+                    if a.latch is None:
+                        a.final_pos = self.dxl.read_present_position(a.dxl_id)
+                        self.log(f"{a.axis.upper()}軸 原点確定。絶対パルス位置: {a.final_pos}")
+
+                elif a.phase == SLOW_STOP and stopped:
+                    if a.latch is not None:
+                        # エッジ時刻の位置（ラッチできなければ今の位置）
+                        latched = a.latch.wait(self.latch_wait)
+                        a.final_pos = latched[1][a.dxl_id] if latched is not None else -1
+                        if a.final_pos == -1:
+                            a.final_pos = self.dxl.read_present_position(a.dxl_id)
+                        self.log(f"{a.axis.upper()}軸 原点確定 (エッジ位置)。絶対パルス位置: {a.final_pos}")
+                        self._release_latch(a)
+                    # 位置モードに戻してオフセットを保存
+                    self.dxl.set_operating_mode(a.dxl_id, 4)
+                    motion.homing_offsets[a.axis] = a.final_pos
+                    motion.current_pos[a.axis] = 0.0
+                    self._enter(a, DONE, now)
+                    a.timings['total'] = now - start
+
+            self.motion.waiter.sleep(self.poll_interval)
+
+        report = {a.axis: a.timings for a in self.axes}
+        for axis, timings in report.items():
+            phases = ", ".join(f"{PHASE_NAMES[p]} {t:.2f}s" for p, t in timings.items() if p in PHASE_NAMES)
+            self.log(f"  {axis.upper()}軸 原点復帰 {timings['total']:.2f}秒 ({phases})")
+        return report
@@ -0,0 +1,295 @@
+# input_scanner.py
+
+"""
+デジタル入力 (DI) の走査スレッド。
+従来はリミットスイッチを呼び出し側が 5ms ごと、フットペダルを 50ms ごとに個別に dio.read していたため、
+検知のタイミングが呼び出し側のポーリングの揺らぎに左右されていた。
+ここでは専用スレッドが一定周期（config.DIO_SCAN_RATE_HZ）で登録された全入力を1回の走査で読み、
+  - 変化（エッジ）に時刻を付けて記録する（前回の走査と今回の走査の中間の時刻）
+  - エッジを待つ (wait_for_edge) / コールバックを呼ぶ (add_callback)
+  - エッジ時刻のモーター位置をラッチする (arm_latch)
+を提供する。位置のラッチはバスに新たな読み取りを足さず、バスが公開している位置
+（テレメトリ・動作中の同期読み取り）のうちエッジの前後の2点から、エッジ時刻の位置を補間する。
+時刻は clock.monotonic() 基準（バスの公開時刻と同じ時計。公開時刻は読み取りの要求を出した時刻なので、
+読み取りにかかる時間の分だけ補間がずれることはない）。
+エッジが来なかったラッチは、呼び出し側が cancel_latch で片付ける。
+"""
+
+import threading
+from collections import deque
+
+import config
+from clock import default_clock
+
+
+class InputEdge:
+    """1回の入力変化"""
+    __slots__ = ('name', 'state', 't', 'seq')
+
+    def __init__(self, name, state, t, seq):
+        self.name = name
+        self.state = state  # 変化後の状態 (True=アクティブ)
+        self.t = t  # 変化の推定時刻
+        self.seq = seq  # 通し番号
+
+    def __repr__(self):
+        return f"InputEdge({self.name}, {'ON' if self.state else 'OFF'}, t={self.t:.4f})"
+
+
+class PositionLatch:
+    """
+    arm_latch の戻り値。次の該当エッジの時刻のモーター位置 [pulse] を保持する。
+    wait(timeout) -> (InputEdge, {dxl_id: 位置 or -1}) または None（タイムアウト）
+    """
+
+    def __init__(self, name, rising, dxl_ids):
+        self.name = name
+        self.rising = rising
+        self.dxl_ids = tuple(dxl_ids)
+        self.edge = None
+        self.positions = None
+        self._before = None  # エッジ検知時点でバスが公開していた位置 {dxl_id: (値, 時刻)}
+        self._done = threading.Event()
+
+    def wait(self, timeout=None):
+        if not self._done.wait(timeout):
+            return None
+        return self.edge, self.positions
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+
+class InputScanner:
+    def __init__(self, dio, inputs, rate_hz=None, bus=None, history=64, log_callback=print, clock=None):
+        """
+        dio   : myADconvert.ADfunc('DIO')
+        inputs: {名前: (DIピン, active_low)}。active_low=True は Low(0) でアクティブ
+        bus   : 位置のラッチに使う BusOwner（公開されている位置を参照する）
+        clock : 時計（省略時は bus の時計、bus もなければ clock.default_clock()）
+        """
+        self.dio = dio
+        self.clock = clock or (bus.clock if bus is not None else default_clock())
+        self.inputs = dict(inputs)
+        self.rate_hz = rate_hz or getattr(config, 'DIO_SCAN_RATE_HZ', 1000)
+        self.latch_timeout = getattr(config, 'DIO_LATCH_TIMEOUT_SEC', 0.1)
+        self.bus = bus
+        self.log = log_callback
+
+        self._lock = threading.Condition()
+        self._state = {name: False for name in self.inputs}
+        self._edges = deque(maxlen=history)
+        self._seq = 0
+        self._scan_time = 0.0
+        self._callbacks = {name: [] for name in self.inputs}
+        self._fault_callbacks = []
+        self.last_error = None  # 直近の走査が失敗していればその例外（成功したら None に戻る）
+        self._latches = []
+        self._thread = None
+        self._running = False
+        self.scan_count = 0
+        self.max_scan_interval = 0.0  # 走査間隔の最大値 [s]（検知の遅れの上限の目安）
+
+    # --- スレッド管理 ---
+    def start(self):
+        if self._running:
+            return
+        # 初期状態はエッジとして扱わない
+        states, t = self._scan()
+        with self._lock:
+            self._state.update(states)
+            self._scan_time = t
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="dio-scanner", daemon=True)
+        self._thread.start()
+        self.log(f"  [HW] DI 走査を開始しました ({self.rate_hz:.0f}Hz, 入力: {', '.join(self.inputs)})")
+
+    def stop(self, timeout=1.0):
+        self._running = False
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._running
+
+    @property
+    def last_scan_time(self):
+        """最後に走査が完了した時刻 (clock.monotonic)。非常停止の監視が走査の停止を検知するのに使う"""
+        with self._lock:
+            return self._scan_time
+
+    def _scan(self):
+        """登録された全入力を1回の走査で読む"""
+        states = {}
+        for name, (pin, active_low) in self.inputs.items():
+            value = self.dio.read(channel=pin, AI_DI='DI')
+            states[name] = (not value) if active_low else bool(value)
+        return states, self.clock.monotonic()
+
+    def _run(self):
+        period = 1.0 / self.rate_hz
+        next_scan = self.clock.monotonic()
+        while self._running:
+            try:
+                states, t = self._scan()
+            except Exception as e:
+                self.last_error = e
+                self.log(f"  [HW] DI 走査エラー: {e}")
+                # 入力が読めない間は非常停止ボタンも見えないので、監視側に知らせる
+                for fn in list(self._fault_callbacks):
+                    try:
+                        fn(e)
+                    except Exception as callback_error:
+                        self.log(f"  [HW] 走査エラーのコールバックでエラー: {callback_error}")
+                self.clock.sleep(0.1)
+                next_scan = self.clock.monotonic()
+                continue
+
+            self.last_error = None
+            edges = []
+            with self._lock:
+                interval = t - self._scan_time
+                self.max_scan_interval = max(self.max_scan_interval, interval)
+                edge_t = self._scan_time + interval / 2.0
+                for name, state in states.items():
+                    if state != self._state[name]:
+                        self._seq += 1
+                        edge = InputEdge(name, state, edge_t, self._seq)
+                        self._edges.append(edge)
+                        edges.append(edge)
+                self._state.update(states)
+                self._scan_time = t
+                self.scan_count += 1
+                if edges:
+                    self._lock.notify_all()
+                callbacks = [(edge, list(self._callbacks[edge.name])) for edge in edges]
+
+            for edge in edges:
+                self._capture_latches(edge)
+            self._resolve_latches(t)
+            for edge, fns in callbacks:
+                for fn in fns:
+                    try:
+                        fn(edge)
+                    except Exception as e:
+                        self.log(f"  [HW] 入力コールバックでエラー ({edge.name}): {e}")
+
+            next_scan += period
+            delay = next_scan - self.clock.monotonic()
+            if delay > 0:
+                self.clock.sleep(delay)
+            else:
+                next_scan = self.clock.monotonic()  # 遅れた分は取り戻さない
+
+    # --- 読み手 ---
+    def state(self, name):
+        """最新の走査での状態 (True=アクティブ)"""
+        with self._lock:
+            return self._state[name]
+
+    def last_edge(self, name=None):
+        with self._lock:
+            for edge in reversed(self._edges):
+                if name is None or edge.name == name:
+                    return edge
+        return None
+
+    def wait_for_edge(self, name, rising=True, after=None, timeout=None):
+        """
+        name の入力のエッジを待つ。rising=True はアクティブになる変化、False は解除、None は両方。
+        after: この通し番号より後のエッジだけを見る（省略時は呼び出し時点以降）
+        戻り値: InputEdge またはタイムアウトで None
+        """
+        deadline = None if timeout is None else self.clock.monotonic() + timeout
+        with self._lock:
+            if after is None:
+                after = self._seq
+            while True:
+                for edge in self._edges:
+                    if edge.seq > after and edge.name == name and (rising is None or edge.state == rising):
+                        return edge
+                remaining = None if deadline is None else deadline - self.clock.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self.clock.wait(self._lock, remaining)
+
+    def add_callback(self, name, fn):
+        """エッジごとに fn(InputEdge) を走査スレッドから呼ぶ（重い処理は入れないこと）"""
+        with self._lock:
+            self._callbacks[name].append(fn)
+
+    def remove_callback(self, name, fn):
+        with self._lock:
+            if fn in self._callbacks[name]:
+                self._callbacks[name].remove(fn)
+
+    def add_fault_callback(self, fn):
+        """走査（dio.read）が失敗するたびに fn(例外) を走査スレッドから呼ぶ"""
+        with self._lock:
+            self._fault_callbacks.append(fn)
+
+    def remove_fault_callback(self, fn):
+        with self._lock:
+            if fn in self._fault_callbacks:
+                self._fault_callbacks.remove(fn)
+
+    # --- 位置のラッチ ---
+    def arm_latch(self, name, dxl_ids, rising=True):
+        """次の該当エッジの時刻のモーター位置をラッチする PositionLatch を返す"""
+        latch = PositionLatch(name, rising, dxl_ids)
+        with self._lock:
+            self._latches.append(latch)
+        return latch
+
+    def cancel_latch(self, latch):
+        """ラッチを走査側から外す（確定済み・外し済みなら何もしない）"""
+        with self._lock:
+            if latch in self._latches:
+                self._latches.remove(latch)
+
+    def _capture_latches(self, edge):
+        with self._lock:
+            matched = [latch for latch in self._latches
+                       if latch.edge is None and latch.name == edge.name
+                       and (latch.rising is None or latch.rising == edge.state)]
+        for latch in matched:
+            latch.edge = edge
+            latch._before = {dxl_id: self._published_position(dxl_id) for dxl_id in latch.dxl_ids}
+
+    def _published_position(self, dxl_id):
+        if self.bus is None:
+            return None
+        return self.bus.latest((dxl_id, 'position'))
+
+    def _resolve_latches(self, now):
+        """エッジ後の位置が公開されたラッチを、前後2点の線形補間で確定する"""
+        with self._lock:
+            pending = [latch for latch in self._latches if latch.edge is not None]
+        for latch in pending:
+            edge_t = latch.edge.t
+            positions = {}
+            ready = True
+            for dxl_id in latch.dxl_ids:
+                before = latch._before.get(dxl_id)
+                after = self._published_position(dxl_id)
+                if after is None or after[1] < edge_t:
+                    if now - edge_t < self.latch_timeout:
+                        ready = False
+                        break
+                    # エッジ後の値が来ない: エッジ前の最後の値を使う（なければ -1）
+                    positions[dxl_id] = before[0] if before is not None else -1
+                elif before is None or before[1] >= edge_t or after[1] <= before[1]:
+                    positions[dxl_id] = after[0]
+                else:
+                    ratio = (edge_t - before[1]) / (after[1] - before[1])
+                    positions[dxl_id] = int(round(before[0] + (after[0] - before[0]) * ratio))
+            if not ready:
+                continue
+            latch.positions = positions
+            with self._lock:
+                if latch in self._latches:  # 途中で cancel_latch されていることがある
+                    self._latches.remove(latch)
+            latch._done.set()
@@ -6,7 +6,11 @@ myADconvert モジュールを使い、超音波溶着機と
 """
 
 import config
-from myADconvert import DIO_ch  # myADconvertから必要なクラスをインポート
+
+if getattr(config, 'HARDWARE_BACKEND', 'real') == 'sim':
+    from sim_hardware import DIO_ch  # 仮想マシンの DIO
+else:
+    from myADconvert import DIO_ch  # myADconvertから必要なクラスをインポート
 
 
 class WelderController:
@@ -16,14 +20,17 @@ class WelderController:
         self.pin = config.WELDER_PIN
         self.log("  [HW] 溶着機コントローラを初期化しました。")
 
-    def turn_on(self):
-        self.log("  [HW] << 溶着機 ON >>")
+    def turn_on(self, log=True):
+        # log=False: 溶着タイマーから呼ぶとき（ログ出力で ON/OFF が遅れないように）
+        if log:
+            self.log("  [HW] << 溶着機 ON >>")
         # ★★★ ここを修正 ★★★
         # myADconvertの仕様に合わせて AO_DO='DO' 引数を追加
         self.dio.write(channel=DIO_ch(self.pin), value=1, AO_DO='DO')
 
-    def turn_off(self):
-        self.log("  [HW] << 溶着機 OFF >>")
+    def turn_off(self, log=True):
+        if log:
+            self.log("  [HW] << 溶着機 OFF >>")
         # ★★★ ここを修正 ★★★
         # myADconvertの仕様に合わせて AO_DO='DO' 引数を追加
         self.dio.write(channel=DIO_ch(self.pin), value=0, AO_DO='DO')
@@ -38,12 +45,30 @@ class SensorController:
         self.log = log_callback
         self.dio = dio_instance
         self.pin = pin_number
+        self.scanner = None  # InputScanner（attach_scanner で設定）
+        self.scanner_name = None
         self.log(f"  [HW] センサーコントローラを初期化しました (PIN: {self.pin})。")
 
+    def attach_scanner(self, scanner, name):
+        """DI 走査スレッドの入力 name として読むようにする（走査中は dio を直接読まない）"""
+        self.scanner = scanner
+        self.scanner_name = name
+
     def is_triggered(self):
         """センサーが押されたか（信号を読み取ったか）を返す"""
+        if self.scanner is not None and self.scanner.running:
+            return self.scanner.state(self.scanner_name)
         # myADconvertのread関数に、'AI_DI'引数を追加する
         state = self.dio.read(channel=self.pin, AI_DI='DI')
 
         # センサーが押されたときに0(Low)になる場合、 not state を返す
-        return not state
\ No newline at end of file
+        return not state
+
+
+def scan_sensors(sensors):
+    """
+    複数のセンサーを1回の走査でまとめて読む。
+    sensors: {名前: SensorController} -> 戻り値 {名前: 押されているか}
+    走査スレッド (InputScanner) に接続されたセンサーは、最新の走査結果を返す。
+    """
+    return {name: sensor.is_triggered() for name, sensor in sensors.items()}
@@ -0,0 +1,101 @@
+# job_plan.py
+
+"""
+溶着ジョブの事前コンパイル。
+溶着点列・プリセット・加工原点・傾斜平面・キャリブレーション（pulses_per_mm, 原点オフセット）から、
+1点ごとの指令をすべて前計算して1つの構造化 NumPy 配列にまとめる。
+実行ループは毎回 math.hypot やプリセットのコピー、mm→パルス変換をせず、この配列を順に流すだけにする。
+範囲チェック（マシンの可動範囲・Z_LIMIT_*）もここで全点まとめて行う。
+"""
+
+import numpy as np
+
+import config
+
+# 1点分の指令
+PLAN_DTYPE = np.dtype([
+    ('x_mm', np.float64), ('y_mm', np.float64),  # 目標位置 (加工原点を加えた絶対座標)
+    ('x_pulse', np.int64), ('y_pulse', np.int64),  # 目標位置 (パルス)
+    ('dist_prev', np.float64),  # 前の点（1点目は開始位置）からの移動距離 [mm]
+    ('dist_next', np.float64),  # 次の点までの距離 [mm]（最後の点は 0）
+    ('precise', np.bool_),  # 厳密停止モードで移動するか
+    ('long_retract', np.bool_),  # 長い退避をするか
+    ('retract_pulse', np.int32),  # 溶着後の退避量 [pulse]
+    ('gentle_current', np.float64),  # 接触検知の電流 [mA]
+    ('z_hint_pulse', np.int64),  # 傾斜平面から予想される接触高さ [pulse]（傾斜補正なしは -1）
+    ('xy_ok', np.bool_),  # XY がマシンの可動範囲内か
+    ('z_ok', np.bool_),  # 予想接触高さが Z_LIMIT_* の範囲内か（予想なしは True）
+])
+
+# 距離による移動・退避の切り替え（従来 page_merged のループ内にあった値）
+PRECISE_MOVE_MM = getattr(config, 'PRECISE_MOVE_MM', 5.0)
+LONG_RETRACT_MM = getattr(config, 'LONG_RETRACT_MM', 20.0)
+RETRACT_PULSE = getattr(config, 'RETRACT_PULSE', 200)
+LONG_RETRACT_PULSE = getattr(config, 'LONG_RETRACT_PULSE', 500)
+FIRST_POINT_GENTLE_CURRENT = getattr(config, 'FIRST_POINT_GENTLE_CURRENT', -1)
+
+
+def compile_job_plan(xy, preset, motion, origin=(0.0, 0.0), start_xy=None):
+    """
+    溶着点 (N,2) [mm] から実行計画（PLAN_DTYPE の配列）を作る。
+    motion: MotionSystem（キャリブレーションと傾斜平面を参照する）
+    start_xy: 1点目の移動距離の基準（省略時は motion.current_pos）
+    """
+    xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2) + np.asarray(origin, dtype=np.float64)
+    n = len(xy)
+    plan = np.zeros(n, dtype=PLAN_DTYPE)
+    if n == 0:
+        return plan
+
+    if start_xy is None:
+        start_xy = (motion.current_pos.get('x', 0.0), motion.current_pos.get('y', 0.0))
+
+    plan['x_mm'] = xy[:, 0]
+    plan['y_mm'] = xy[:, 1]
+    plan['x_pulse'] = motion.mm_to_pulses_array(xy[:, 0], 'x')
+    plan['y_pulse'] = motion.mm_to_pulses_array(xy[:, 1], 'y')
+
+    steps = np.diff(np.vstack((np.asarray(start_xy, dtype=np.float64)[None, :], xy)), axis=0)
+    dist = np.hypot(steps[:, 0], steps[:, 1])
+    plan['dist_prev'] = dist
+    plan['dist_next'][:-1] = dist[1:]
+
+    plan['precise'] = plan['dist_prev'] >= PRECISE_MOVE_MM
+    plan['long_retract'] = plan['dist_next'] >= LONG_RETRACT_MM
+    plan['retract_pulse'] = np.where(plan['long_retract'], LONG_RETRACT_PULSE, RETRACT_PULSE)
+
+    plan['gentle_current'] = preset['gentle_current']
+    plan['gentle_current'][0] = FIRST_POINT_GENTLE_CURRENT
+
+    if motion.tilt_plane:
+        tilt = motion.tilt_plane
+        z_mm = tilt['a'] * xy[:, 0] + tilt['b'] * xy[:, 1] + tilt['c']
+        plan['z_hint_pulse'] = motion.mm_to_pulses_array(z_mm, 'z')
+        plan['z_ok'] = ((plan['z_hint_pulse'] >= config.Z_LIMIT_MIN_PULSE)
+                        & (plan['z_hint_pulse'] <= config.Z_LIMIT_MAX_PULSE))
+    else:
+        plan['z_hint_pulse'] = -1
+        plan['z_ok'] = True
+
+    tolerance = 1e-6
+    plan['xy_ok'] = ((xy[:, 0] >= -tolerance) & (xy[:, 0] <= config.MACHINE_MAX_X_MM + tolerance)
+                     & (xy[:, 1] >= -tolerance) & (xy[:, 1] <= config.MACHINE_MAX_Y_MM + tolerance))
+    return plan
+
+
+def validate_job_plan(plan, max_report=5):
+    """
+    範囲外の点をまとめて調べる。
+    戻り値: エラーメッセージのリスト（空なら問題なし）
+    """
+    errors = []
+    bad_xy = np.flatnonzero(~plan['xy_ok'])
+    if len(bad_xy):
+        samples = ", ".join(f"#{i + 1}({plan['x_mm'][i]:.2f}, {plan['y_mm'][i]:.2f})" for i in bad_xy[:max_report])
+        errors.append(f"XY がマシンの可動範囲外の点が {len(bad_xy)} 点あります: {samples}")
+    bad_z = np.flatnonzero(~plan['z_ok'])
+    if len(bad_z):
+        samples = ", ".join(f"#{i + 1}(Z={plan['z_hint_pulse'][i]})" for i in bad_z[:max_report])
+        errors.append(f"予想接触高さが Z の可動範囲 ({config.Z_LIMIT_MIN_PULSE}〜{config.Z_LIMIT_MAX_PULSE}) "
+                      f"外の点が {len(bad_z)} 点あります: {samples}")
+    return errors
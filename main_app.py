@@ -38,11 +38,17 @@ from page_dxf_editor import PageDxfEditor
 from page_merged import PageMergedPreviewExecution
 
 # ハードウェア関連
-from myADconvert import ADfunc
+import config
+if getattr(config, 'HARDWARE_BACKEND', 'real') == 'sim':
+    from sim_hardware import ADfunc  # 実機なし: 仮想マシンの DIO
+else:
+    from myADconvert import ADfunc
 from motion_system import MotionSystem
 from io_controller import WelderController, SensorController
-import config
+from input_scanner import InputScanner
+from estop_watchdog import EmergencyStopWatchdog, REASON_BUTTON
 import presets
+from weld_path import WeldPath
 
 
 class MainApp(tk.Tk):
@@ -54,13 +60,14 @@ class MainApp(tk.Tk):
         # --- データ共有用 ---
         default_preset = list(presets.WELDING_PRESETS.keys())[0]
         self.shared_data = {
-            "weld_points": [],
+            "weld_points": WeldPath(),
             "preset_name": default_preset
         }
 
         # --- ハードウェア初期化 ---
         self.hardware = {
-            "dio": None, "motion": None, "welder": None, "sensors": {}, "emergency_sensor": None
+            "dio": None, "motion": None, "welder": None, "sensors": {}, "emergency_sensor": None,
+            "inputs": None, "estop": None
         }
         self._init_hardware()
 
@@ -97,10 +104,55 @@ class MainApp(tk.Tk):
                 'y': SensorController(dio, config.LIMIT_SWITCH_Y_PIN)
             }
             self.hardware["emergency_sensor"] = SensorController(dio, config.EMERGENCY_STOP_PIN)
+
+            # DI は走査スレッドでまとめて読む（センサーは走査結果を参照する）
+            motion = self.hardware["motion"]
+            inputs = InputScanner(dio, {
+                'limit_x': (config.LIMIT_SWITCH_X_PIN, True),
+                'limit_y': (config.LIMIT_SWITCH_Y_PIN, True),
+                'emergency': (config.EMERGENCY_STOP_PIN, True),
+                'foot_pedal': (config.FOOT_PEDAL_PIN, False),
+            }, bus=motion.dxl.bus if motion else None)
+            self.hardware["sensors"]['x'].attach_scanner(inputs, 'limit_x')
+            self.hardware["sensors"]['y'].attach_scanner(inputs, 'limit_y')
+            self.hardware["emergency_sensor"].attach_scanner(inputs, 'emergency')
+            inputs.start()
+            self.hardware["inputs"] = inputs
+
+            # 非常停止ボタンの監視（走査スレッド上で溶着機OFF・トルクOFFまで行う）
+            estop = EmergencyStopWatchdog(inputs, motion, self.hardware["welder"],
+                                          on_trip=lambda latency: self.after(0, self._on_hardware_estop, latency))
+            estop.start()
+            self.hardware["estop"] = estop
             print("ハードウェア初期化完了")
         except Exception as e:
             messagebox.showerror("初期化エラー", f"ハードウェア初期化中にエラーが発生しました:\n{e}")
 
+    def _on_hardware_estop(self, latency):
+        """非常停止ボタンが作動した後の画面側の処理（モーター・溶着機は監視側で停止済み）"""
+        for page in self.pages.values():
+            if hasattr(page, 'stop_event'):
+                page.stop_event.set()
+            if hasattr(page, 'pause_event'):
+                page.pause_event.set()
+            logic = getattr(page, 'logic', None)
+            if logic is not None:
+                logic.stop_event.set()
+            if hasattr(page, 'recover_btn'):
+                page.recover_btn.config(state='normal')
+            if hasattr(page, 'stop_btn'):
+                page.stop_btn.config(state='disabled')
+            if hasattr(page, 'status_label'):
+                page.status_label.config(text="非常停止", fg="red")
+        if latency.get('reason', REASON_BUTTON) == REASON_BUTTON:
+            cause = "非常停止ボタンが押されました。"
+        else:
+            cause = "デジタル入力が読めなくなったため（非常停止ボタンを監視できません）、非常停止しました。"
+        messagebox.showwarning("非常停止",
+                               cause + "全モーターのトルクをOFFにし、溶着機を停止しました。\n"
+                               f"({EmergencyStopWatchdog.format_latency(latency)})\n"
+                               "非常停止ボタンを解除し、機械を安全な範囲に移動させた後、「復帰」ボタンを押してください。")
+
     def show_page(self, page_name):
         if page_name not in self.pages:
             return
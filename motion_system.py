@@ -15,15 +15,28 @@
 
 import time
 import math
+import numpy as np
 import config
 import presets
 from dynamixel_controller import DynamixelController
+from dxl_bus import BusHaltedError
+from motion_wait import (MotionWaiter, SettleLearner, CancelToken, MotionCancelled, predict_move_time,
+                         predict_stop_time)
 from settings_io import load_settings, save_settings
+from telemetry import TelemetryService
+from contact_predictor import ContactPredictor
+from retract_planner import RetractPlanner
+from trace_streamer import TraceStreamer
+from homing import ParallelHoming
+from weld_timer import WeldPulseTimer
+from clock import default_clock
 
 
 class MotionSystem:
-    def __init__(self, log_callback=print):
+    def __init__(self, log_callback=print, clock=None):
+        """clock: 待機・計時に使う時計（省略時は clock.default_clock()。仮想マシンではその時計）"""
         self.log = log_callback
+        self.clock = clock or default_clock()
         self.log("モーションシステムを初期化しています...")
 
         # デフォルト値（config から）
@@ -47,7 +60,9 @@ class MotionSystem:
         # 以下は既存の初期化処理
         self.homing_offsets = {'x': 0, 'y': 0, 'z': 0}
         self.is_homed = False
-        self.dxl = DynamixelController(log_callback=self.log)
+        self.dxl = DynamixelController(log_callback=self.log, clock=self.clock)
+        self.telemetry = TelemetryService(self.dxl, list(config.DXL_IDS.values()), log_callback=self.log)
+        self.waiter = MotionWaiter(self.dxl, telemetry=self.telemetry, clock=self.clock)
         self.current_pos = {'x': 0.0, 'y': 0.0, 'z': 0.0}
         self.tilt_plane = None
 
@@ -55,6 +70,48 @@ class MotionSystem:
         self.homing_backoff_acceleration = getattr(config, 'HOMING_BACKOFF_ACCELERATION', 5)
         self.homing_backoff_mm = getattr(config, 'HOMING_BACKOFF_MM', 20)
         self._backoff_timeout = getattr(config, 'HOMING_BACKOFF_TIMEOUT', 5.0)
+        self.parallel_homing = getattr(config, 'PARALLEL_HOMING', True)
+
+        self.z_xy_clearance_pulse = getattr(config, 'Z_XY_CLEARANCE_PULSE', 120)
+
+        # 接触高さの予測による高速アプローチ
+        self.contact_predictor = ContactPredictor()
+        self.predictive_z_approach = getattr(config, 'PREDICTIVE_Z_APPROACH', True)
+        self.contact_margin_neighbors = getattr(config, 'CONTACT_APPROACH_MARGIN_PULSE', 30)
+        self.contact_margin_tilt = getattr(config, 'CONTACT_APPROACH_MARGIN_TILT_PULSE', 80)
+        self.contact_tight_spread = getattr(config, 'CONTACT_APPROACH_TIGHT_SPREAD_PULSE', 10)
+        self.contact_approach_velocity = getattr(config, 'CONTACT_APPROACH_VELOCITY_Z', 100)
+        self.contact_approach_acceleration = getattr(config, 'CONTACT_APPROACH_ACCELERATION_Z', 50)
+        self.contact_approach_current = getattr(config, 'CONTACT_APPROACH_CURRENT_MA', 300)
+        self.contact_max_error = getattr(config, 'CONTACT_PREDICT_MAX_ERROR_PULSE', 40)
+        self.contact_final_push_sec = getattr(config, 'CONTACT_FINAL_PUSH_SEC', 0.1)
+        self.contact_final_release_sec = getattr(config, 'CONTACT_FINAL_RELEASE_SEC', 0.1)
+
+        # 移動ごとの退避量の計画（経路上の表面の予測に接触実績と傾斜平面を使う）
+        self.retract_planner = RetractPlanner(self.contact_predictor, hint_fn=self.tilt_hint_pulse)
+        self.adaptive_retract = getattr(config, 'ADAPTIVE_RETRACT', True)
+
+        # XY の同時到着（直線補間）
+        self.coordinated_xy = getattr(config, 'COORDINATED_XY', True)
+        # 経路トレース（詳細プレビュー）の目標位置ストリーミング
+        self.trace_streamer = TraceStreamer(self)
+
+        # 押し付け安定判定の学習（プリセット=加圧電流ごと）と、点ごとの安定までの時間の記録
+        self.settle_learner = SettleLearner()
+        self.settle_times = []
+        # 接触しなかったため溶着しなかった点 (x_mm, y_mm, 理由)
+        self.skipped_points = []
+
+        # 溶着時間の計時を専用スレッドで行う（False なら従来どおりこのスレッドで sleep）
+        self.weld_timer = WeldPulseTimer(log_callback, clock=self.clock) if getattr(config, 'WELD_TIMER_THREAD', True) else None
+
+        # 速度・電流の監視による接触検知（False なら固定時間の押し付け）
+        self.contact_detection = getattr(config, 'CONTACT_DETECTION', True)
+        self.contact_current_ratio = getattr(config, 'CONTACT_CURRENT_RATIO', 0.8)
+
+        # Z軸を電流制限付き位置制御 (mode 5) で動かすか
+        self.z_current_position = getattr(config, 'Z_CURRENT_BASED_POSITION', False)
+        self.z_move_current = getattr(config, 'Z_MOVE_CURRENT_MA', 1000)
 
         self.homing_approach_accel = getattr(config, 'HOMING_APPROACH_ACCELERATION', 20)  # 初回用
         self.homing_backoff_accel = getattr(config, 'HOMING_BACKOFF_ACCELERATION', 10)  # バックオフ用
@@ -63,6 +120,7 @@ class MotionSystem:
         if not self.dxl.connect(config.DEVICENAME):
             raise ConnectionError("Dynamixelへの接続に失敗しました。")
         self._setup_motors()
+        self.telemetry.start()
         self.log("モーションシステムの初期化が完了しました。")
 
     def _setup_motors(self):
@@ -72,9 +130,11 @@ class MotionSystem:
             if axis in ['x', 'y']:
                 self.dxl.set_operating_mode(dxl_id, 4)
             else:
-                # Z軸の設定
-                self.dxl.set_operating_mode(dxl_id, 3)
+                # Z軸の設定 (電流制限付き位置制御を使う場合は mode 5 のまま運用する)
+                self.dxl.set_operating_mode(dxl_id, 5 if self.z_current_position else 3)
                 self.dxl.set_profile(dxl_id, config.PROFILE_VELOCITY_Z, config.PROFILE_ACCELERATION_Z)
+                if self.z_current_position:
+                    self.dxl.set_goal_current(dxl_id, self.z_move_current)
 
                 # ▼▼▼ 追加: Z軸の Position P Gain を上げる設定 ▼▼▼
                 # 例: 2000 に設定 (デフォルトは通常 800)
@@ -100,105 +160,108 @@ class MotionSystem:
             self.log(f"ホーミングバックオフ設定更新エラー: {e}")
             return False
 
-    def move_xy_abs(self, x_mm, y_mm, preset, precise_mode=False):
+    def move_xy_abs(self, x_mm, y_mm, preset, precise_mode=False, pulses=None):
         """
         XY軸を絶対座標へ移動
         precise_mode=True : プレビュー用。停止を確認してから次へ進む。
         precise_mode=False: 本番/ジョグ用。移動指令を出したら即完了扱い（または移動中フラグ監視のみ）。
+        pulses=(x_pulse, y_pulse) を渡すと mm→パルス変換を省く（コンパイル済みジョブ用）
         """
         self.log(f"XY -> ({x_mm:.2f}, {y_mm:.2f})mm (Precise: {precise_mode})")
-        velocity = preset['velocity_xy']
-        acceleration = preset['acceleration_xy']
 
-        self.dxl.set_profile(config.DXL_IDS['x'], velocity, acceleration)
-        self.dxl.set_profile(config.DXL_IDS['y'], velocity, acceleration)
+        if pulses is None:
+            x_pulse = self._mm_to_pulses(x_mm, 'x')
+            y_pulse = self._mm_to_pulses(y_mm, 'y')
+        else:
+            x_pulse, y_pulse = int(pulses[0]), int(pulses[1])
 
-        x_pulse = self._mm_to_pulses(x_mm, 'x')
-        y_pulse = self._mm_to_pulses(y_mm, 'y')
+        # 指令済みの位置からの移動量でプロファイルを決め、プロファイル上の所要時間を見積もる
+        x_id, y_id = config.DXL_IDS['x'], config.DXL_IDS['y']
+        dx = x_pulse - self._mm_to_pulses(self.current_pos['x'], 'x')
+        dy = y_pulse - self._mm_to_pulses(self.current_pos['y'], 'y')
+        profiles = self._set_xy_profiles(dx, dy, preset)
+        predicted = max(predict_move_time(dx, *profiles[x_id]), predict_move_time(dy, *profiles[y_id]))
 
-        self.dxl.set_goal_position(config.DXL_IDS['x'], x_pulse)
-        self.dxl.set_goal_position(config.DXL_IDS['y'], y_pulse)
+        # X/Y の目標位置は1パケットで同時に書き込む (GroupSyncWrite)
+        self.dxl.sync_write_goal_positions({x_id: x_pulse, y_id: y_pulse})
 
         if precise_mode:
             # --- 【厳密モード】プレビュー・長距離移動用 ---
-            # 「位置が合うまで」ではなく「モーターが止まるまで」待つように変更
-            time.sleep(0.1)  # 動き出し待ち
-
-            timeout = 10.0  # タイムアウトも少し短縮
-            start_time = time.time()
-            stop_count = 0  # 停止安定カウンタ
-
-            while True:
-                # タイムアウト脱出
-                if time.time() - start_time > timeout:
-                    self.log("  警告: XY移動がタイムアウトしました(強制進行)。")
-                    break
-
-                is_moving_x = self.dxl.is_moving(config.DXL_IDS['x'])
-                is_moving_y = self.dxl.is_moving(config.DXL_IDS['y'])
-
-                # 読み取りエラー時はリトライ
-                if is_moving_x is None or is_moving_y is None:  # Noneチェックが必要なら適宜
-                    time.sleep(0.05)
-                    continue
-
-                if (not is_moving_x and not is_moving_y):
-                    # 両方の軸が停止している状態が3回(約0.15秒)続いたら完了とする
-                    stop_count += 1
-                    if stop_count >= 3:
-                        # 念のため位置ズレをログに残すが、待機はしない
-                        cur_x = self.dxl.read_present_position(config.DXL_IDS['x'])
-                        cur_y = self.dxl.read_present_position(config.DXL_IDS['y'])
-                        if cur_x != -1 and cur_y != -1:
-                            diff_x = abs(x_pulse - cur_x)
-                            diff_y = abs(y_pulse - cur_y)
-                            if diff_x > 100 or diff_y > 100:
-                                self.log(f"  (停止確認: 誤差 X:{diff_x} Y:{diff_y} pulse)")
-                        break
-                else:
-                    # 動いているならカウンタをリセット
-                    stop_count = 0
-
-                time.sleep(0.05)
+            # 「位置が合うまで」ではなく「モーターが止まるまで」待つ。
+            # 予測完了時刻の直前まで眠り、その後は両軸停止が続くまで短い間隔で監視する
+            if not self.waiter.wait_until_idle((x_id, y_id), predicted, 'xy_precise'):
+                self.log("  警告: XY移動がタイムアウトしました(強制進行)。")
+            else:
+                # 念のため位置ズレをログに残すが、待機はしない
+                present = self.dxl.sync_read_present_positions((x_id, y_id))
+                cur_x, cur_y = present[x_id], present[y_id]
+                if cur_x != -1 and cur_y != -1:
+                    diff_x = abs(x_pulse - cur_x)
+                    diff_y = abs(y_pulse - cur_y)
+                    tolerance = self.waiter.criteria('xy_precise')['position_tolerance']
+                    if diff_x > tolerance or diff_y > tolerance:
+                        self.log(f"  (停止確認: 誤差 X:{diff_x} Y:{diff_y} pulse)")
 
         else:
             # --- 【高速モード】本番溶着・ジョグ用 ---
-            # 従来通り、Movingフラグが落ちるのを待つ（または即抜け）
-            # ここでは「動いている間待つ」設定にします
-            while self.dxl.is_moving(config.DXL_IDS['x']) or self.dxl.is_moving(config.DXL_IDS['y']):
-                time.sleep(0.01)
+            # Movingフラグが落ちるのを待つ（予測完了時刻までは監視しない）
+            if not self.waiter.wait_until_idle((x_id, y_id), predicted, 'xy_fast'):
+                self.log("  警告: XY移動がタイムアウトしました(強制進行)。")
 
         self.current_pos['x'], self.current_pos['y'] = x_mm, y_mm
 
-    def move_xy_continuous(self, x_mm, y_mm, preset, threshold_mm=5.0):
+    def _set_xy_profiles(self, dx_pulse, dy_pulse, preset):
         """
-        目標地点の threshold_mm 手前まで到達したら次へ進む。
-        さらに、物理的に停止してしまった場合も検知して次へ進む（フリーズ防止）。
+        XY のプロファイル（速度・加速度）を設定する。
+        COORDINATED_XY が有効なら、長いほうの軸は preset の値のまま、短いほうの軸の速度・加速度を
+        移動量の比で縮める。同じ形の台形を縮めることになるので両軸が同時に着き、経路は直線になる
+        （移動量はキャリブレーション済みの pulses_per_mm で換算したパルス）。
+        戻り値: {dxl_id: (velocity, acceleration)}
         """
         velocity = preset['velocity_xy']
         acceleration = preset['acceleration_xy']
+        x_id, y_id = config.DXL_IDS['x'], config.DXL_IDS['y']
+        profiles = {x_id: (velocity, acceleration), y_id: (velocity, acceleration)}
+
+        longest = max(abs(dx_pulse), abs(dy_pulse))
+        # 速度 0 は「上限なし」なので縮められない
+        if self.coordinated_xy and longest > 0 and velocity > 0:
+            for dxl_id, delta in ((x_id, dx_pulse), (y_id, dy_pulse)):
+                ratio = abs(delta) / longest
+                # 0 は「上限なし」になってしまうので最低 1
+                scaled_v = max(1, int(round(velocity * ratio)))
+                scaled_a = max(1, int(round(acceleration * ratio))) if acceleration > 0 else 0
+                profiles[dxl_id] = (scaled_v, scaled_a)
+
+        self.dxl.sync_write_profiles(profiles)
+        return profiles
 
-        self.dxl.set_profile(config.DXL_IDS['x'], velocity, acceleration)
-        self.dxl.set_profile(config.DXL_IDS['y'], velocity, acceleration)
-
+    def move_xy_continuous(self, x_mm, y_mm, preset, threshold_mm=5.0):
+        """
+        目標地点の threshold_mm 手前まで到達したら次へ進む。
+        さらに、物理的に停止してしまった場合も検知して次へ進む（フリーズ防止）。
+        """
         x_pulse = self._mm_to_pulses(x_mm, 'x')
         y_pulse = self._mm_to_pulses(y_mm, 'y')
+        self._set_xy_profiles(x_pulse - self._mm_to_pulses(self.current_pos['x'], 'x'),
+                              y_pulse - self._mm_to_pulses(self.current_pos['y'], 'y'), preset)
 
-        self.dxl.set_goal_position(config.DXL_IDS['x'], x_pulse)
-        self.dxl.set_goal_position(config.DXL_IDS['y'], y_pulse)
+        x_id, y_id = config.DXL_IDS['x'], config.DXL_IDS['y']
+        self.dxl.sync_write_goal_positions({x_id: x_pulse, y_id: y_pulse})
 
         # --- 停止検知用の変数 ---
-        last_check_time = time.time()
+        last_check_time = self.clock.monotonic()
         # 最初のチェックで引っかからないよう、初期値は現在地から遠い値にしておく
         last_x_mm = -99999.0
         last_y_mm = -99999.0
 
         while True:
-            cur_x_p = self.dxl.read_present_position(config.DXL_IDS['x'])
-            cur_y_p = self.dxl.read_present_position(config.DXL_IDS['y'])
+            # X/Y の現在位置は1パケットでまとめて読む (GroupSyncRead)
+            present = self.dxl.sync_read_present_positions((x_id, y_id))
+            cur_x_p, cur_y_p = present[x_id], present[y_id]
 
             if cur_x_p == -1 or cur_y_p == -1:
-                time.sleep(0.002)
+                self.waiter.sleep(0.002)
                 continue
 
             cur_x_mm = self._pulses_to_mm(cur_x_p, 'x')
@@ -211,7 +274,7 @@ class MotionSystem:
 
             # 2. 停止検知 (0.2秒ごとにチェック)
             # もしモーターが動かなくなっていたら、待機し続けずに次へ進む
-            if time.time() - last_check_time > 0.2:
+            if self.clock.monotonic() - last_check_time > 0.2:
                 moved_dist = math.hypot(cur_x_mm - last_x_mm, cur_y_mm - last_y_mm)
 
                 # 0.2秒間で 1.0mm も動いていなければ「停止」とみなす
@@ -221,13 +284,28 @@ class MotionSystem:
 
                 last_x_mm = cur_x_mm
                 last_y_mm = cur_y_mm
-                last_check_time = time.time()
+                last_check_time = self.clock.monotonic()
 
-            time.sleep(0.002)
+            self.waiter.sleep(0.002)
 
         self.current_pos['x'] = x_mm
         self.current_pos['y'] = y_mm
 
+    def trace_path(self, xy, speed_mm_s, accel_mm_s2, stop_event=None, pause_event=None, progress_callback=None):
+        """
+        経路 xy (N,2) [mm] を止まらずになぞる（詳細プレビュー用）。
+        1点目へは通常の移動で行き、その先は目標位置を時刻どおりに流し込む（trace_streamer 参照）。
+        戻り値: 最後まで走れたら True
+        """
+        xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+        if len(xy) == 0:
+            return True
+        first_preset = {'velocity_xy': self.trace_streamer.axis_velocity(speed_mm_s),
+                        'acceleration_xy': self.trace_streamer.axis_acceleration(accel_mm_s2)}
+        self.move_xy_abs(float(xy[0, 0]), float(xy[0, 1]), first_preset, precise_mode=True)
+        return self.trace_streamer.run(xy, speed_mm_s, accel_mm_s2, stop_event=stop_event,
+                                       pause_event=pause_event, progress_callback=progress_callback)
+
     def _home_single_axis(self, axis, sensor):
         """
         単軸ホーミング（事前離脱動作とバックオフを組み込んだバージョン）
@@ -264,15 +342,12 @@ class MotionSystem:
             # 目標位置へ移動命令
             self.dxl.set_goal_position(dxl_id, target_pulse)
 
-            # 動き出すまで少し待つ
-            time.sleep(0.1)
-
-            # モーターが停止するまで待機
-            while self.dxl.is_moving(dxl_id):
-                time.sleep(0.01)
+            # モーターが停止するまで待機（プロファイルから所要時間を予測）
+            predicted = predict_move_time(desired_pre_pulses, int(config.HOMING_SPEED_FAST),
+                                          int(config.HOMING_APPROACH_ACCELERATION))
+            self.waiter.wait_until_idle((dxl_id,), predicted, 'homing')
 
             self.log(f"{axis.upper()}軸 事前離脱動作完了。")
-            time.sleep(0.1)
 
         # ==========================================================================
         # 【ステップ1】初回アプローチ（高速でセンサーを探索）
@@ -283,12 +358,12 @@ class MotionSystem:
         self.dxl.set_goal_velocity(dxl_id, fast_speed)
 
         while not sensor.is_triggered():
-            time.sleep(0.005)
+            self.waiter.sleep(0.005)
 
-        # 停止
+        # 停止（減速が終わるまで待つ）
         self.dxl.set_goal_velocity(dxl_id, 0)
         self.log(f"{axis.upper()}軸 センサー検知。")
-        time.sleep(0.3)
+        self.waiter.wait_until_idle((dxl_id,), predict_stop_time(fast_speed, self.homing_approach_accel), 'homing')
 
         # ==========================================================================
         # 【ステップ2】バックオフ（センサーから離れる）
@@ -309,11 +384,11 @@ class MotionSystem:
             self.dxl.set_profile(dxl_id, 0, int(self.homing_backoff_accel))
             self.dxl.set_goal_velocity(dxl_id, velocity_value)
 
-            t0 = time.time()
+            t0 = self.clock.monotonic()
             timeout = self._backoff_timeout
 
             while True:
-                now = time.time()
+                now = self.clock.monotonic()
                 if now - t0 > timeout:
                     self.log("  !! バックオフがタイムアウトしました。停止します。")
                     break
@@ -324,10 +399,11 @@ class MotionSystem:
                 if (desired_backoff_pulses >= 0 and moved >= desired_backoff_pulses) or \
                         (desired_backoff_pulses <= 0 and moved <= desired_backoff_pulses):
                     break
-                time.sleep(0.02)
+                self.waiter.sleep(0.02)
 
             self.dxl.set_goal_velocity(dxl_id, 0)
-            time.sleep(0.05)
+            self.waiter.wait_until_idle((dxl_id,), predict_stop_time(velocity_value, self.homing_backoff_accel),
+                                        'homing')
 
         # ==========================================================================
         # 【ステップ3】低速で再接近し、原点確定
@@ -338,12 +414,12 @@ class MotionSystem:
         self.dxl.set_goal_velocity(dxl_id, slow_speed)
 
         while not sensor.is_triggered():
-            time.sleep(0.005)
+            self.waiter.sleep(0.005)
 
         self.dxl.set_goal_velocity(dxl_id, 0)
         final_pos = self.dxl.read_present_position(dxl_id)
         self.log(f"{axis.upper()}軸 原点確定。絶対パルス位置: {final_pos}")
-        time.sleep(0.3)
+        self.waiter.wait_until_idle((dxl_id,), predict_stop_time(slow_speed, self.homing_slow_accel), 'homing')
 
         # 位置モードに戻してオフセットを保存
         self.dxl.set_operating_mode(dxl_id, 4)
@@ -353,30 +429,178 @@ class MotionSystem:
 
     def home_all_axes(self, sensors):
         self.log("--- XY原点復帰シーケンス開始 ---")
-        self._home_single_axis('x', sensors['x'])
-        self._home_single_axis('y', sensors['y'])
+        try:
+            if self.parallel_homing:
+                # X と Y を同時に（1つのループで両軸の工程を進める）
+                ParallelHoming(self, sensors).run()
+            else:
+                self._home_single_axis('x', sensors['x'])
+                self._home_single_axis('y', sensors['y'])
+        except MotionCancelled:
+            # 速度制御のまま中断されたので、原点未確定として扱う（停止は safe_stop で行う）
+            self.is_homed = False
+            raise
         self.log("--- XY原点復帰シーケンス完了 ---")
         default_preset = presets.WELDING_PRESETS[config.DEFAULT_PRESET_NAME]
         self.move_xy_abs(0, 0, default_preset)
         self.is_homed = True
 
-    def descend_until_contact(self, preset):
+    def descend_until_contact(self, preset, gentle_current=None, push_time=0.3, release_time=0.2):
+        """
+        優しい電流で Z を下ろして接触位置を求める。
+        戻り値: (接触位置 [pulse] or None, 理由)
+          理由: 'contact' / 'limit'（接触せずに下限を越えた）/ 'timeout'（動いたが接触しなかった）/
+                'no_motion'（電流が小さく動かなかった）/ 'read_error'（位置の読み取りに失敗）
+        """
         self.log("  Z軸を下降させ、接触点を探索...")
         z_id = config.DXL_IDS['z']
         self.dxl.set_profile(z_id, config.PROFILE_VELOCITY_Z, config.PROFILE_ACCELERATION_Z)
-        self.dxl.set_operating_mode(z_id, 0)
-        gentle_current = preset['gentle_current'] * config.MOTOR_DIRECTIONS['z*1']
-        self.dxl.set_goal_current(z_id, gentle_current)
-        time.sleep(0.3)
-        self.dxl.set_goal_current(z_id, 0)
-        time.sleep(0.2)
-        contact_pulse = self.dxl.read_present_position(z_id)
+        if gentle_current is None:
+            gentle_current = preset['gentle_current']
+        gentle_current = gentle_current * config.MOTOR_DIRECTIONS['z*1']
+        self._z_push(z_id, gentle_current)
+
+        if self.contact_detection:
+            # 速度が落ちた（電流制限付き位置制御では電流も上がった）時点で接触とみなし、すぐに返す
+            threshold = 0
+            if self.z_current_position:
+                # 実際の電流上限は Goal Current の分解能 (2.69mA) に切り捨てた値
+                threshold = int(abs(gentle_current) / 2.69) * 2.69 * self.contact_current_ratio
+            contacted, contact_pulse, _, reason = self.waiter.wait_for_contact(
+                z_id, current_threshold=threshold, limit_pulse=config.Z_LIMIT_MAX_PULSE)
+            self._z_release(z_id)
+            self._z_position_mode(z_id)
+            if not contacted:
+                reason_text = {'limit': "下限に到達",
+                               'no_motion': "Z軸が動きませんでした。優しい接触電流が小さすぎる可能性があります"
+                               }.get(reason, "タイムアウト")
+                self.log(f"  警告: 接触を検知できませんでした ({reason_text}, 位置: {contact_pulse})。")
+                return None, reason
+            self.log(f"  接触を検知。パルス位置: {contact_pulse}")
+            return contact_pulse, 'contact'
+
+        self.waiter.sleep(push_time)
+        self._z_release(z_id)
+        self.waiter.sleep(release_time)
+        # 電流解除後に取得されたテレメトリの位置を使う（監視が止まっていれば直接読む）
+        contact_pulse = -1
+        sample = self.telemetry.wait_for_sample(self.clock.monotonic(), timeout=0.1)
+        if sample is not None:
+            contact_pulse = sample.position.get(z_id, -1)
+        if contact_pulse == -1:
+            contact_pulse = self.dxl.read_present_position(z_id)
         if contact_pulse == -1:
             self.log("  エラー: Z軸の位置読み取りに失敗。")
-            self.dxl.set_operating_mode(z_id, 3)
-            return None
+            self._z_position_mode(z_id)
+            return None, 'read_error'
         self.log(f"  接触を検知。パルス位置: {contact_pulse}")
-        self.dxl.set_operating_mode(z_id, 3)
+        self._z_position_mode(z_id)
+        return contact_pulse, 'contact'
+
+    # --- Z軸の駆動: 電流制御モードと位置制御モードの切り替え、または mode 5 の指令 ---
+    # mode 5（電流制限付き位置制御）では動作モードを切り替えず、
+    #   位置移動 = 目標位置 + 移動用の電流上限、押し付け = 押し付け先の目標位置 + プリセットの電流、
+    #   解除 = 電流 0
+    # として、トルクOFF/ONを伴うモード切り替えをなくす。
+    def _z_position_mode(self, z_id):
+        """位置指令の前準備（mode 5 では何もしない）"""
+        if not self.z_current_position:
+            self.dxl.set_operating_mode(z_id, 3)  # 位置制御モード
+
+    def _z_command_position(self, z_id, z_pulse, current_limit=None):
+        """
+        Z軸の目標位置を書き込む（mode 5 では押し付け・解除で下げた電流上限も戻す）
+        current_limit: mode 5 での電流上限 [mA]（省略時は Z_MOVE_CURRENT_MA）
+        """
+        self.dxl.set_goal_position(z_id, z_pulse)
+        if self.z_current_position:
+            self.dxl.set_goal_current(z_id, self.z_move_current if current_limit is None else current_limit)
+
+    def _z_push(self, z_id, current_ma):
+        """向き込みの電流 current_ma [mA] で押し付ける"""
+        if self.z_current_position:
+            # 電流を先に下げてから、電流の向きの可動端を目標にする（正の電流でパルスが増える = 下向き）
+            target = config.Z_LIMIT_MAX_PULSE if current_ma >= 0 else config.Z_LIMIT_MIN_PULSE
+            self.dxl.set_goal_current(z_id, abs(current_ma))
+            self.dxl.set_goal_position(z_id, target)
+        else:
+            self.dxl.set_operating_mode(z_id, 0)  # 電流制御モード
+            self.dxl.set_goal_current(z_id, current_ma)
+
+    def _z_release(self, z_id):
+        """押し付けを解除する（どちらの方式でも電流 0）"""
+        self.dxl.set_goal_current(z_id, 0)
+
+    def reset_job_learning(self):
+        """ジョブ開始時に、前のワークで学習した接触高さ・押し付け安定の情報と記録を捨てる"""
+        self.contact_predictor.reset()
+        self.settle_learner.reset()
+        self.settle_times = []
+        self.skipped_points = []
+        if self.weld_timer is not None:
+            self.weld_timer.reset()
+
+    def approach_and_contact(self, preset, gentle_current=None, hint_pulse=-1):
+        """
+        これまでの接触実績（と傾斜平面）から接触高さを予測し、その少し上までは位置制御で速く下ろして、
+        残りだけ優しい電流で接触させる。予測できない・予測が外れた場合は descend_until_contact に戻る。
+        hint_pulse: 傾斜平面から予想した接触高さ（なければ -1）
+        戻り値: (接触位置 [pulse] or None, 理由)。理由は descend_until_contact と同じ
+        """
+        x_mm, y_mm = self.current_pos['x'], self.current_pos['y']
+        contact_pulse = None
+        reason = None
+        if self.predictive_z_approach:
+            prediction = self.contact_predictor.predict(x_mm, y_mm, hint_pulse)
+            if prediction is not None:
+                contact_pulse = self._predictive_contact(preset, gentle_current, *prediction)
+                if contact_pulse is not None:
+                    reason = 'contact'
+
+        if contact_pulse is None:
+            contact_pulse, reason = self.descend_until_contact(preset, gentle_current=gentle_current)
+        if contact_pulse is not None:
+            self.contact_predictor.add(x_mm, y_mm, contact_pulse, hint_pulse)
+        return contact_pulse, reason
+
+    def _predictive_contact(self, preset, gentle_current, predicted, source):
+        """予測高さを使った接触。うまくいかなかった場合は None を返す（呼び出し側で従来の接触動作を行う）"""
+        z_id = config.DXL_IDS['z']
+        # 近くの実績が2点以上あってそろっているときだけ小さい余裕にする
+        spread = self.contact_predictor.neighbor_spread(self.current_pos['x'], self.current_pos['y'])
+        tight = source == 'neighbors' and spread is not None and spread <= self.contact_tight_spread
+        margin = self.contact_margin_neighbors if tight else self.contact_margin_tilt
+        approach = predicted - margin  # 退避方向はパルスが小さくなる向き
+
+        start = self.telemetry.latest_position(z_id, max_age=0.1)
+        if start == -1:
+            start = self.dxl.read_present_position(z_id)
+        if start == -1 or approach <= start:
+            return None  # 現在地がすでに予測面の近く（またはそれより下）
+        if not config.Z_LIMIT_MIN_PULSE <= approach <= config.Z_LIMIT_MAX_PULSE:
+            return None
+
+        self.log(f"  予測接触高さ {predicted} ({source}) の {margin} パルス上 ({approach}) まで位置制御で下降...")
+        self._z_position_mode(z_id)
+        # 予測が外れて途中で当たっても強くぶつからないよう、速度と（mode 5 では）電流を抑えて下ろす
+        reached_pulse = self._move_z_and_wait(z_id, approach, "Z軸予測下降",
+                                              profile=(self.contact_approach_velocity,
+                                                       self.contact_approach_acceleration),
+                                              current_limit=self.contact_approach_current)
+        tolerance = self.waiter.criteria('z')['position_tolerance']
+        if reached_pulse == -1 or abs(reached_pulse - approach) > tolerance:
+            # 予測より手前で当たった可能性がある
+            self.log(f"  予測下降が目標に届きませんでした (現在: {reached_pulse})。通常の接触動作に切り替えます。")
+            return None
+
+        contact_pulse, _ = self.descend_until_contact(preset, gentle_current=gentle_current,
+                                                      push_time=self.contact_final_push_sec,
+                                                      release_time=self.contact_final_release_sec)
+        if contact_pulse is None:
+            return None
+        if abs(contact_pulse - predicted) > self.contact_max_error:
+            self.log(f"  予測外れ (予測 {predicted}, 実測 {contact_pulse})。通常の接触動作に切り替えます。")
+            return None
         return contact_pulse
 
     def update_pulses_per_mm(self, axis, new_value):
@@ -420,6 +644,12 @@ class MotionSystem:
             self.log(f"settings.json の保存中に例外が発生しました: {e}")
             return False
 
+    def mm_to_pulses_array(self, mm_values, axis):
+        """_mm_to_pulses の配列版（同じく 0 方向への切り捨て）"""
+        pulses_per_mm = {'x': self.pulses_per_mm_x, 'y': self.pulses_per_mm_y, 'z': self.pulses_per_mm_z}[axis]
+        pulse_delta = np.trunc(np.asarray(mm_values, dtype=np.float64) * pulses_per_mm).astype(np.int64)
+        return self.homing_offsets[axis] + pulse_delta * config.MOTOR_DIRECTIONS[axis]
+
     def _mm_to_pulses(self, mm_value, axis):
         pulse_delta = 0
         if axis == 'x':
@@ -444,10 +674,24 @@ class MotionSystem:
             mm_value = pulse_delta / self.pulses_per_mm_z
         return mm_value
 
+    def measured_position_mm(self, axis, max_age=0.5):
+        """テレメトリの実測位置 [mm]。取得できない（古い・失敗）場合は None"""
+        dxl_id = config.DXL_IDS.get(axis)
+        pulse = self.telemetry.latest_position(dxl_id, max_age=max_age) if dxl_id is not None else -1
+        if pulse == -1:
+            return None
+        return self._pulses_to_mm(pulse, axis)
+
     def set_tilt_plane(self, plane_coeffs):
         self.tilt_plane = plane_coeffs
         self.log(f"傾斜補正データを設定: a={plane_coeffs['a']:.4f}, b={plane_coeffs['b']:.4f}, c={plane_coeffs['c']:.4f}")
 
+    def tilt_hint_pulse(self, x_mm, y_mm):
+        """傾斜平面から予想した (x, y) の表面高さ [pulse]。傾斜補正がなければ -1"""
+        if not self.tilt_plane:
+            return -1
+        return self._mm_to_pulses(self.get_tilted_z(x_mm, y_mm), 'z')
+
     def get_tilted_z(self, x_mm, y_mm):
         if self.tilt_plane:
             return self.tilt_plane['a'] * x_mm + self.tilt_plane['b'] * y_mm + self.tilt_plane['c']
@@ -483,35 +727,12 @@ class MotionSystem:
         z_id = config.DXL_IDS['z']
 
         # 1. モードとプロファイルを設定
-        self.dxl.set_operating_mode(z_id, 3)  # 位置制御モード
+        self._z_position_mode(z_id)
         self.dxl.set_profile(z_id, config.PROFILE_VELOCITY_Z, config.PROFILE_ACCELERATION_Z)
 
-        # 2. 目標位置を書き込み
-        self.dxl.set_goal_position(z_id, z_pulse)
-
-        # --- 移動完了待ち処理 ---
+        # 2. 目標位置を書き込み、到達を待つ
         self.log(f"  (移動待機中... 目標: {z_pulse})")
-        POSITION_THRESHOLD = 10
-        timeout_sec = 5.0
-        start_time = time.time()
-
-        while True:
-            current_pulse = self.dxl.read_present_position(z_id)
-            if current_pulse == -1:
-                self.log("  (警告: 現在位置の読み取りに失敗。待機を中断)")
-                break
-
-            diff = abs(z_pulse - current_pulse)
-            if diff <= POSITION_THRESHOLD:
-                self.log(f"  (目標位置に到達。 現在: {current_pulse})")
-                break
-
-            if (time.time() - start_time) > timeout_sec:
-                self.log(f"  (警告: Z軸移動がタイムアウトしました。 現在: {current_pulse})")
-                break
-            time.sleep(0.05)
-
-        final_pulse = self.dxl.read_present_position(z_id)
+        final_pulse = self._move_z_and_wait(z_id, z_pulse, "Z軸移動")
         if final_pulse != -1:
             self.log(f"Z軸 パルス移動完了。 最終位置: {final_pulse}")
         else:
@@ -519,6 +740,37 @@ class MotionSystem:
 
         return True  # 移動成功
 
+    def _move_z_and_wait(self, z_id, z_pulse, label, profile=None, current_limit=None):
+        """
+        Z軸に目標位置を書き込み、到達（許容 position_tolerance）まで待つ。
+        プロファイル速度が設定されていれば所要時間を予測し、その直前までは監視しない。
+        profile: (プロファイル速度, 加速度) を渡すとその値を書き込んでから動かす（省略時は設定済みの
+                 PROFILE_VELOCITY_Z / PROFILE_ACCELERATION_Z として扱う）
+        current_limit: mode 5 での電流上限 [mA]（_z_command_position に渡す）
+        戻り値: 最後に読めた現在位置 (読み取り失敗時 -1)
+        """
+        if profile is None:
+            velocity, acceleration = config.PROFILE_VELOCITY_Z, config.PROFILE_ACCELERATION_Z
+        else:
+            velocity, acceleration = profile
+            self.dxl.set_profile(z_id, velocity, acceleration)
+        predicted = 0.0
+        if velocity > 0:
+            start_pulse = self.dxl.read_present_position(z_id)
+            if start_pulse != -1:
+                predicted = predict_move_time(z_pulse - start_pulse, velocity, acceleration)
+
+        self._z_command_position(z_id, z_pulse, current_limit)
+        reached, current_pulse = self.waiter.wait_until_position(z_id, z_pulse, predicted, 'z')
+
+        if current_pulse == -1:
+            self.log("  (警告: 現在位置の読み取りに失敗。待機を中断)")
+        elif reached:
+            self.log(f"  (目標位置に到達。 現在: {current_pulse})")
+        else:
+            self.log(f"  (警告: {label}がタイムアウトしました。 現在: {current_pulse})")
+        return current_pulse
+
     def move_z_abs_pulse_force(self, z_pulse):
         """
         ソフトリミットチェックを行わずに、Z軸を指定パルスへ強制移動させます。
@@ -528,35 +780,12 @@ class MotionSystem:
         z_id = config.DXL_IDS['z']
 
         # 1. モードとプロファイルを設定
-        self.dxl.set_operating_mode(z_id, 3)  # 位置制御モード
+        self._z_position_mode(z_id)
         self.dxl.set_profile(z_id, config.PROFILE_VELOCITY_Z, config.PROFILE_ACCELERATION_Z)
 
-        # 2. 目標位置を書き込み (リミットチェックなしで実行)
-        self.dxl.set_goal_position(z_id, z_pulse)
-
-        # --- 移動完了待ち処理 (元のロジックを維持) ---
+        # 2. 目標位置を書き込み (リミットチェックなしで実行)、到達を待つ
         self.log(f"  (強制移動待機中... 目標: {z_pulse})")
-        POSITION_THRESHOLD = 10
-        timeout_sec = 5.0
-        start_time = time.time()
-
-        while True:
-            current_pulse = self.dxl.read_present_position(z_id)
-            if current_pulse == -1:
-                self.log("  (警告: 現在位置の読み取りに失敗。待機を中断)")
-                break
-
-            diff = abs(z_pulse - current_pulse)
-            if diff <= POSITION_THRESHOLD:
-                self.log(f"  (目標位置に到達。 現在: {current_pulse})")
-                break
-
-            if (time.time() - start_time) > timeout_sec:
-                self.log(f"  (警告: Z軸強制移動がタイムアウトしました。 現在: {current_pulse})")
-                break
-            time.sleep(0.05)
-
-        final_pulse = self.dxl.read_present_position(z_id)
+        final_pulse = self._move_z_and_wait(z_id, z_pulse, "Z軸強制移動")
         if final_pulse != -1:
             self.log(f"Z軸 強制移動完了。 最終位置: {final_pulse}")
         else:
@@ -587,82 +816,162 @@ class MotionSystem:
             self.log(f"{axis.upper()}軸の原点オフセットを {current_pulse} に設定。")
         return True
 
-    def execute_welding_press(self, welder, preset):
+    def execute_welding_press(self, welder, preset, next_xy=None, retract_amount=None, gentle_current=None,
+                              z_hint=-1, next_point=None):
+        """
+        接触 → 加圧 → 溶着 → 退避 を行う。
+        retract_amount / gentle_current を渡すと preset の値（long_retract による切り替え）より優先する。
+        z_hint: 傾斜平面から予想した接触高さ [pulse]（接触高さの予測に使う。なければ -1）
+        next_point=(x_mm, y_mm): 次に溶着する点。渡すと経路上の表面の予測から退避量を決める
+          （予測できなければ retract_amount / long_retract による従来の退避量）
+        next_xy=(x_mm, y_mm, preset, precise_mode[, (x_pulse, y_pulse)]) を渡すとパイプライン実行になり、
+        退避中に Z がクリアランス高さを越えた時点で次の点への XY 移動を始める（XY移動の完了まで待って返る）。
+        戻り値: next_xy を渡した場合は XY 移動まで済ませたかどうか、それ以外は True
+          （接触しなかったため溶着しなかった場合は False。その点は skipped_points に記録する）
+        """
         self.log("--- 溶着プレスシーケンス開始 ---")
         z_id = config.DXL_IDS['z']
 
+        # Z軸が上がっている（接触前）ここが一時停止できる安全な地点
+        self.pause_at_safe_point()
+
         # 1. 接触検知 (既存処理)
         self.log("  ステップ1: 優しい接触を開始 (電流制御)...")
-        self.descend_until_contact(preset)
+        _, contact_reason = self.approach_and_contact(preset, gentle_current=gentle_current, hint_pulse=z_hint)
+        if contact_reason in ('limit', 'timeout'):
+            # Z は動いたのにワークに当たらなかった（下限を越えた・届かなかった）: ここでは加圧・溶着しない
+            # （'no_motion' は1点目の -1mA のように、わざと接触させない場合なのでそのまま加圧する）
+            self.log("  エラー: ワークに接触しなかったため、この点は溶着せずに安全高さへ退避します。")
+            self.skipped_points.append((self.current_pos['x'], self.current_pos['y'], contact_reason))
+            self.move_z_abs_pulse_force(config.SAFE_Z_PULSE)
+            self.log("--- 溶着プレスシーケンス中止 ---")
+            return False
 
         # 2. 加圧開始
         self.log(f"  ステップ2: {preset['weld_current']}mAで加圧し、安定を待機...")
-        self.dxl.set_operating_mode(z_id, 0)  # 電流制御モード
         press_current_ma = preset['weld_current'] * config.MOTOR_DIRECTIONS['z']
-        self.dxl.set_goal_current(z_id, press_current_ma)
+        self._z_push(z_id, press_current_ma)
 
         # --- 【変更点1】安定検知ロジック ---
-        # 位置の変化が緩やかになるまで監視する
-        stable_threshold = 3  # 変化がこのパルス数以下なら安定とみなす
-        check_interval = 0.1  # 監視間隔 (秒)
-        timeout = 3.0  # 最大待機時間 (秒)
-        start_wait = time.time()
-
-        last_pos = self.dxl.read_present_position(z_id)
-
-        while (time.time() - start_wait) < timeout:
-            time.sleep(check_interval)
-            current_pos = self.dxl.read_present_position(z_id)
-
-            if last_pos != -1 and current_pos != -1:
-                diff = abs(current_pos - last_pos)
-                if diff <= stable_threshold:
-                    self.log(f"  -> 押し付け安定 (変化: {diff} pulse)。溶着を開始します。")
-                    break
-
-            last_pos = current_pos
+        # 短い窓で位置に直線を当てはめ、変化が学習した許容値以下になったらすぐに溶着を始める
+        settle_key = preset['weld_current']
+        stable, settle_time, stats = self.waiter.wait_until_settled(
+            z_id, self.settle_learner.noise(settle_key))
+        self.settle_times.append(settle_time)
+        if stable:
+            self.settle_learner.update(settle_key, stats['noise'])
+            self.log(f"  -> 押し付け安定 ({settle_time * 1000:.0f}ms, 変化: {stats['drift']:.1f} / "
+                     f"許容 {stats['tolerance']:.1f} pulse)。溶着を開始します。")
         else:
             self.log("  警告: 安定待ちがタイムアウトしました。強制的に進行します。")
 
         # 3. 溶着実行
-        welder.turn_on()
         weld_time_sec = preset['weld_time']
-        time.sleep(weld_time_sec)
-        welder.turn_off()
+        if self.weld_timer is not None:
+            token = self.waiter.cancel_token
+            pulse = self.weld_timer.pulse(welder, weld_time_sec,
+                                          stop_event=token.stop_event if token is not None else None)
+            self.log(f"  [HW] << 溶着機 ON {pulse['actual'] * 1000:.1f}ms (目標 {weld_time_sec * 1000:.0f}ms) >>")
+            if pulse['aborted']:
+                raise MotionCancelled()
+        else:
+            welder.turn_on()
+            try:
+                self.waiter.sleep(weld_time_sec)
+            finally:
+                # 中断されても必ず OFF にする
+                welder.turn_off()
         self.log(f"  ステップ2: {weld_time_sec}秒の溶着完了。")
 
         # 4. 加圧解除と退避
-        self.dxl.set_goal_current(z_id, 0)
+        self._z_release(z_id)
 
         # --- 【変更点2】相対退避ロジック (待機処理削除版) ---
+        xy_done = False
         final_pos = self.dxl.read_present_position(z_id)
         if final_pos != -1:
-            # プリセットに 'long_retract' が True で入っていたら -300 退避
-            if preset.get('long_retract', False):
-                retract_amount = 500
-                self.log(f"  ステップ3: 次の移動が長いため、退避量を増やします(-{retract_amount})。")
-            else:
-                # 通常時は -200 退避．100の場合シートをちゃんと抑えないと巻き上げてしまう
-                retract_amount = 200
+            planned = None
+            if self.adaptive_retract and next_point is not None:
+                planned = self.retract_planner.plan(final_pos, (self.current_pos['x'], self.current_pos['y']),
+                                                    next_point, preset)
+            if planned is not None:
+                retract_amount = planned
+                self.log(f"  ステップ3: 次の点の経路上の表面高さから退避量を {retract_amount} に決定。")
+            elif retract_amount is None:
+                # ジョブ計画で退避量が決まっていなければ（決まっていればそのまま使う）プリセットから決める
+                # プリセットに 'long_retract' が True で入っていたら -300 退避
+                if preset.get('long_retract', False):
+                    retract_amount = 500
+                    self.log(f"  ステップ3: 次の移動が長いため、退避量を増やします(-{retract_amount})。")
+                else:
+                    # 通常時は -200 退避．100の場合シートをちゃんと抑えないと巻き上げてしまう
+                    retract_amount = 200
 
             retract_target = final_pos - retract_amount
             self.log(f"  ステップ3: 現在地({final_pos})から -{retract_amount} 退避 -> 目標: {retract_target}")
 
-            self.move_z_abs_pulse_force(retract_target)
+            if next_xy is None:
+                self.move_z_abs_pulse_force(retract_target)
+            else:
+                xy_done = self._retract_with_xy_overlap(z_id, final_pos, retract_target, next_xy)
         else:
             self.log("  エラー: 現在地の取得に失敗したため、安全位置へ退避します。")
             self.move_z_abs_pulse_force(config.SAFE_Z_PULSE)
 
         self.log("--- 溶着プレスシーケンス完了 ---")
+        return xy_done if next_xy is not None else True
+
+    def _retract_with_xy_overlap(self, z_id, contact_pulse, retract_target, next_xy):
+        """
+        Z の退避指令を出し、Z が接触位置から z_xy_clearance_pulse だけ上昇したら XY 移動を開始する。
+        インターロック: Z がクリアランス高さより下にある間は XY 指令を出さない。
+        戻り値: XY 移動を行ったか（Z がクリアランスを越えられなかった場合は False）
+        """
+        # 退避量よりクリアランスが大きい場合は、退避目標そのものをクリアランス高さとする
+        clearance_pulse = max(contact_pulse - self.z_xy_clearance_pulse, retract_target)
+
+        self._z_position_mode(z_id)
+        self.dxl.set_profile(z_id, config.PROFILE_VELOCITY_Z, config.PROFILE_ACCELERATION_Z)
+        predicted = predict_move_time(contact_pulse - clearance_pulse, config.PROFILE_VELOCITY_Z,
+                                      config.PROFILE_ACCELERATION_Z)
+        self._z_command_position(z_id, retract_target)
+
+        # クリアランス高さを越えるまで待つ（退避方向はパルスが小さくなる向き）
+        reached, z_pulse = self.waiter.wait_until_position(z_id, clearance_pulse, predicted, 'z',
+                                                           tolerance=0, above=True)
+        if not reached:
+            # 退避の完了まで待って、もう一度だけ確認する
+            z_pulse = self._move_z_and_wait(z_id, retract_target, "Z軸退避")
+            if z_pulse == -1 or z_pulse > clearance_pulse:
+                self.log(f"  エラー: Z軸がクリアランス高さ({clearance_pulse})を越えないため、XY移動を中止します。")
+                return False
+
+        if self.pause_requested():
+            # 一時停止の要求があれば次の点へは動かず、退避の完了まで待って返る（一時停止は呼び出し側で）
+            self._move_z_and_wait(z_id, retract_target, "Z軸退避")
+            return False
+
+        x_mm, y_mm, preset, precise_mode = next_xy[:4]
+        pulses = next_xy[4] if len(next_xy) > 4 else None
+        self.log(f"  ステップ4: Z={z_pulse} (クリアランス {clearance_pulse}) を通過。XY移動を開始します。")
+        self.move_xy_abs(x_mm, y_mm, preset, precise_mode=precise_mode, pulses=pulses)
+
+        # 次の接触動作の前に、退避が終わっていることを確認する
+        reached, z_pulse = self.waiter.wait_until_position(z_id, retract_target, 0.0, 'z')
+        if not reached:
+            self.log(f"  (警告: Z軸退避の完了を確認できませんでした。 現在: {z_pulse})")
         return True
 
     def set_axis_current(self, axis, current):
         dxl_id = config.DXL_IDS.get(axis)
         if dxl_id is None:
             return
-        self.dxl.set_operating_mode(dxl_id, 0)
         current_ma = int(current * config.MOTOR_DIRECTIONS.get(axis, 1))
-        self.dxl.set_goal_current(dxl_id, current_ma)
+        if axis == 'z':
+            self._z_push(dxl_id, current_ma)
+        else:
+            self.dxl.set_operating_mode(dxl_id, 0)
+            self.dxl.set_goal_current(dxl_id, current_ma)
         self.log(f"  [電流制御] {axis.upper()}軸 駆動開始: {current_ma}mA")
 
     def stop_continuous_move(self, axis):
@@ -671,7 +980,13 @@ class MotionSystem:
             return
         self.dxl.set_goal_current(dxl_id, 0)
         self.log(f"  [連続] {axis.upper()}軸 停止。")
-        time.sleep(0.1)
+        self.clock.sleep(0.1)
+        if axis == 'z' and self.z_current_position:
+            # mode 5: 止まった位置を目標にして保持する
+            present = self.dxl.read_present_position(dxl_id)
+            if present != -1:
+                self._z_command_position(dxl_id, present)
+            return
         op_mode = 4 if axis in ['x', 'y'] else 3
         self.dxl.set_operating_mode(dxl_id, op_mode)
 
@@ -693,18 +1008,81 @@ class MotionSystem:
         self.move_xy_abs(0, 0, default_preset)
         self.log("--- 原点復帰完了 ---")
 
+    # --- 停止要求（キャンセル）と一時停止 ---
+    def set_cancel_events(self, stop_event=None, pause_event=None):
+        """
+        以後の待機ループ（移動完了・Z移動・原点復帰・押し付け安定・溶着時間）を
+        stop_event で中断（MotionCancelled）できるようにする。pause_event はクリアで一時停止要求。
+        stop_event=None で解除する。中断後は呼び出し側で safe_stop() を呼ぶこと。
+        """
+        self.waiter.cancel_token = CancelToken(stop_event, pause_event, clock=self.clock) if stop_event is not None else None
+
+    def pause_requested(self):
+        token = self.waiter.cancel_token
+        return token is not None and token.pause_requested
+
+    def pause_at_safe_point(self):
+        """一時停止の要求があれば、ここ（Z軸が上がっている地点）で解除まで待つ"""
+        token = self.waiter.cancel_token
+        if token is None or not token.pause_requested:
+            return
+        self.log("一時停止中... (Z軸退避済み)")
+        token.wait_while_paused()
+        self.log("処理を再開します。")
+
+    def safe_stop(self):
+        """
+        中断後に機械を決まった状態にする（この間は停止要求で中断しない）:
+          XY = 位置制御で今の位置に停止、Z = 押し付け電流を解除して SAFE_Z_PULSE より上へ。
+        緊急停止中（トルクOFF）は何もしない。
+        """
+        if self.dxl.bus.halted:
+            return
+        token = self.waiter.cancel_token
+        self.waiter.cancel_token = None
+        try:
+            self.log("--- 中断: 安全な状態へ移行します ---")
+            x_id, y_id, z_id = config.DXL_IDS['x'], config.DXL_IDS['y'], config.DXL_IDS['z']
+            for dxl_id in (x_id, y_id):
+                # 原点復帰中（速度制御）なら位置制御へ戻す（同じモードなら何もしない）
+                self.dxl.set_operating_mode(dxl_id, 4)
+            present = self.dxl.sync_read_present_positions((x_id, y_id))
+            goals = {dxl_id: p for dxl_id, p in present.items() if p != -1}
+            if goals:
+                self.dxl.sync_write_goal_positions(goals)
+            for axis, dxl_id in (('x', x_id), ('y', y_id)):
+                if present[dxl_id] != -1:
+                    self.current_pos[axis] = self._pulses_to_mm(present[dxl_id], 'x' if axis == 'x' else 'y')
+
+            self._z_release(z_id)
+            self._z_position_mode(z_id)
+            z_pulse = self.dxl.read_present_position(z_id)
+            if z_pulse == -1 or z_pulse > config.SAFE_Z_PULSE:
+                self.move_z_abs_pulse_force(config.SAFE_Z_PULSE)
+            else:
+                self._z_command_position(z_id, z_pulse)
+            self.log("--- 中断: 停止しました ---")
+        except BusHaltedError:
+            # 途中で緊急停止（トルクOFF）された
+            pass
+        finally:
+            self.waiter.cancel_token = token
+
     def emergency_stop(self):
         self.log("!!! 緊急停止作動。全モーターのトルクをOFF。 !!!")
-        for dxl_id in config.DXL_IDS.values():
-            self.dxl.disable_torque(dxl_id)
+        self.dxl.emergency_disable_torque(list(config.DXL_IDS.values()))
 
     def recover_from_stop(self):
         self.log("--- 復帰シーケンス開始 ---")
+        self.dxl.bus.resume()
         self._setup_motors()
         self.log("全モーターのトルクをONにしました。")
 
     def shutdown(self):
         self.log("シャットダウン処理...")
+        self.telemetry.stop()
+        if self.weld_timer is not None:
+            self.weld_timer.stop()
         for dxl_id in config.DXL_IDS.values():
             self.dxl.disable_torque(dxl_id)
         self.dxl.disconnect()
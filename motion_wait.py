@@ -0,0 +1,395 @@
+# motion_wait.py
+
+"""
+移動完了待ちエンジン。
+プロファイル速度・加速度と移動量から台形プロファイルの所要時間を予測し、
+完了直前までは眠って待ち、その後だけ短い間隔でモーターを監視する。
+固定の time.sleep(0.05〜0.1) ポーリングと安定カウンタによる無駄時間を減らすためのもの。
+完了判定の条件（監視間隔・許容誤差・安定回数・タイムアウト等）は移動の種類ごとに
+config.MOTION_WAIT_CRITERIA で上書きできる。
+待機中の sleep は CancelToken（停止・一時停止の要求）を見ていて、停止要求があれば
+監視間隔を待たずに MotionCancelled を送出する。
+"""
+
+import math
+import threading
+from collections import deque
+
+import numpy as np
+
+import config
+from clock import SYSTEM_CLOCK
+
+# Dynamixel X シリーズのプロファイル単位
+PROFILE_VELOCITY_UNIT_RPM = 0.229  # [rev/min] / 1
+PROFILE_ACCELERATION_UNIT_RPM2 = 214.577  # [rev/min^2] / 1
+
+# 移動の種類ごとの完了判定条件
+#   poll_interval     : 予測完了時刻以降の監視間隔 [s]
+#   lead_time         : 予測完了時刻のどれだけ前から監視を始めるか [s]
+#   stable_samples    : 完了条件が何回連続で成立したら完了とするか
+#   position_tolerance: 目標位置との許容誤差 [pulse]（位置で判定する移動のみ）
+#   velocity_threshold: この速度 [生値, 0.229rpm] 以下を「止まった」とみなす（wait_for_contact のみ）
+#   min_time          : 判定を始めるまでの時間 [s]（押し始めの速度 0 を接触と誤認しないため）
+#   min_travel        : この距離 [pulse] 動くか速度が velocity_threshold を超えるまでは接触とみなさない（wait_for_contact のみ）
+#   window_samples    : 直線当てはめに使うサンプル数（wait_until_settled のみ）
+#   min_drift / max_drift: 窓内の位置の変化（当てはめた傾き×窓の時間）の許容値の下限・上限 [pulse]
+#   noise_k           : 許容値 = noise_k × 学習したノイズ（窓内の当てはめ残差の標準偏差）
+#   settle_time       : 完了判定後に追加で待つ時間 [s]
+#   timeout           : 最大待ち時間 [s]
+DEFAULT_CRITERIA = {
+    'xy_precise': {'poll_interval': 0.01, 'lead_time': 0.03, 'stable_samples': 2,
+                   'position_tolerance': 100, 'settle_time': 0.0, 'timeout': 10.0},
+    'xy_fast': {'poll_interval': 0.005, 'lead_time': 0.02, 'stable_samples': 1,
+                'position_tolerance': 100, 'settle_time': 0.0, 'timeout': 10.0},
+    'z': {'poll_interval': 0.005, 'lead_time': 0.02, 'stable_samples': 1,
+          'position_tolerance': 10, 'settle_time': 0.0, 'timeout': 5.0},
+    'homing': {'poll_interval': 0.01, 'lead_time': 0.03, 'stable_samples': 2,
+               'position_tolerance': 20, 'settle_time': 0.05, 'timeout': 10.0},
+    'press_settle': {'poll_interval': 0.005, 'lead_time': 0.0, 'stable_samples': 2, 'window_samples': 8,
+                     'min_drift': 1.0, 'max_drift': 3.0, 'noise_k': 3.0,
+                     'settle_time': 0.0, 'timeout': 3.0},
+    'contact': {'poll_interval': 0.005, 'lead_time': 0.0, 'stable_samples': 3, 'velocity_threshold': 2,
+                # timeout まで届かなかった点は溶着せずにスキップするので、優しい電流で SAFE_Z から下限まで下りきれる長さにする
+                'min_time': 0.05, 'min_travel': 5, 'settle_time': 0.0, 'timeout': 5.0},
+}
+
+
+def profile_velocity_to_pulses(velocity):
+    """プロファイル速度の設定値を [pulse/s] に換算"""
+    return velocity * PROFILE_VELOCITY_UNIT_RPM / 60.0 * config.DXL_PULSES_PER_REVOLUTION
+
+
+def profile_acceleration_to_pulses(acceleration):
+    """プロファイル加速度の設定値を [pulse/s^2] に換算"""
+    return acceleration * PROFILE_ACCELERATION_UNIT_RPM2 / 3600.0 * config.DXL_PULSES_PER_REVOLUTION
+
+
+def predict_move_time(distance_pulses, profile_velocity, profile_acceleration):
+    """
+    台形（距離が短ければ三角）速度プロファイルでの所要時間 [s] を返す。
+    速度 0 は「上限なし」の意味なので予測できず 0.0 を返す（すぐ監視を始める）。
+    加速度 0 は「無限大」として等速移動で計算する。
+    """
+    distance = abs(distance_pulses)
+    if distance == 0 or profile_velocity <= 0:
+        return 0.0
+
+    v = profile_velocity_to_pulses(profile_velocity)
+    if profile_acceleration <= 0:
+        return distance / v
+
+    a = profile_acceleration_to_pulses(profile_acceleration)
+    if distance >= v * v / a:
+        # 加速 -> 等速 -> 減速
+        return distance / v + v / a
+    # 最高速度に届かない三角プロファイル
+    return 2.0 * math.sqrt(distance / a)
+
+
+def predict_stop_time(profile_velocity, profile_acceleration):
+    """速度制御中の軸を速度 0 にしたときの減速時間 [s]（加速度 0 は即停止とみなす）"""
+    if profile_velocity == 0 or profile_acceleration <= 0:
+        return 0.0
+    return profile_velocity_to_pulses(abs(profile_velocity)) / profile_acceleration_to_pulses(profile_acceleration)
+
+
+def fit_window(t, position):
+    """
+    窓内のサンプルに直線を当てはめる。
+    戻り値: (窓内の位置の変化 = |傾き|×窓の時間 [pulse], 残差の標準偏差 [pulse])
+    """
+    t = np.asarray(t, dtype=np.float64)
+    position = np.asarray(position, dtype=np.float64)
+    tc = t - t.mean()
+    denom = float(np.dot(tc, tc))
+    if denom <= 0.0:
+        return 0.0, 0.0
+    slope = float(np.dot(tc, position - position.mean())) / denom
+    residual = position - (position.mean() + slope * tc)
+    return abs(slope) * float(t[-1] - t[0]), float(residual.std())
+
+
+class MotionCancelled(Exception):
+    """停止要求 (CancelToken) によって待機を中断した"""
+
+
+class CancelToken:
+    """
+    停止・一時停止の要求を待機ループへ伝える。
+    stop_event : セットされたら停止
+    pause_event: クリアされている間は一時停止の要求あり（画面の pause_event をそのまま渡す）
+    """
+
+    def __init__(self, stop_event=None, pause_event=None, clock=None):
+        self.stop_event = stop_event if stop_event is not None else threading.Event()
+        self.pause_event = pause_event
+        self.clock = clock or SYSTEM_CLOCK
+
+    @property
+    def cancelled(self):
+        return self.stop_event.is_set()
+
+    @property
+    def pause_requested(self):
+        return self.pause_event is not None and not self.pause_event.is_set()
+
+    def check(self):
+        if self.stop_event.is_set():
+            raise MotionCancelled()
+
+    def sleep(self, seconds):
+        """seconds 秒待つ。途中で停止要求があればすぐに MotionCancelled"""
+        if seconds > 0:
+            if self.clock.wait(self.stop_event, seconds):
+                raise MotionCancelled()
+        else:
+            self.check()
+
+    def wait_while_paused(self, poll_interval=0.05):
+        """一時停止の要求が解除されるまで待つ（停止要求があれば MotionCancelled）"""
+        while self.pause_requested:
+            self.sleep(poll_interval)
+        self.check()
+
+
+class SettleLearner:
+    """
+    押し付け安定時のノイズ（当てはめ残差）をプリセットごとに指数移動平均で覚える。
+    ジョブ内の過去の溶着から、そのプリセットでの安定判定の許容値を決めるために使う。
+    """
+
+    def __init__(self, alpha=0.3):
+        self.alpha = alpha
+        self._noise = {}
+
+    def reset(self):
+        self._noise.clear()
+
+    def noise(self, key):
+        return self._noise.get(key)
+
+    def update(self, key, noise):
+        previous = self._noise.get(key)
+        self._noise[key] = noise if previous is None else previous + self.alpha * (noise - previous)
+
+
+class MotionWaiter:
+    """
+    DynamixelController を監視して移動完了を待つ。
+    どの待ち関数も「予測完了時刻の lead_time 前まで眠る → poll_interval で監視」の順に動く。
+    """
+
+    def __init__(self, dxl, telemetry=None, clock=None):
+        self.dxl = dxl
+        self.telemetry = telemetry
+        self.clock = clock or dxl.clock
+        self.cancel_token = None  # CancelToken（None なら中断しない）
+        self.criteria_table = {k: dict(v) for k, v in DEFAULT_CRITERIA.items()}
+        for move_type, overrides in getattr(config, 'MOTION_WAIT_CRITERIA', {}).items():
+            self.criteria_table.setdefault(move_type, {}).update(overrides)
+
+    def criteria(self, move_type):
+        return self.criteria_table[move_type]
+
+    def update_criteria(self, move_type, **kwargs):
+        """ランタイムで判定条件を調整する（UI等から）"""
+        self.criteria_table.setdefault(move_type, {}).update(kwargs)
+
+    def sleep(self, seconds):
+        """待機ループ用の sleep。停止要求があれば MotionCancelled"""
+        if self.cancel_token is not None:
+            self.cancel_token.sleep(seconds)
+        elif seconds > 0:
+            self.clock.sleep(seconds)
+
+    def check_cancel(self):
+        if self.cancel_token is not None:
+            self.cancel_token.check()
+
+    def _sleep_until_predicted(self, start_time, predicted_time, c):
+        remaining = start_time + predicted_time - c['lead_time'] - self.clock.perf_counter()
+        if remaining > 0:
+            self.sleep(remaining)
+
+    def wait_until_idle(self, dxl_ids, predicted_time, move_type):
+        """
+        全軸の Moving フラグが stable_samples 回連続で落ちるまで待つ。
+        戻り値: タイムアウトせずに完了したら True
+        """
+        c = self.criteria(move_type)
+        start = self.clock.perf_counter()
+        self._sleep_until_predicted(start, predicted_time, c)
+
+        idle_count = 0
+        while True:
+            moving = self.dxl.sync_read_moving(dxl_ids)
+            if not any(moving.values()):
+                idle_count += 1
+                if idle_count >= c['stable_samples']:
+                    break
+            else:
+                idle_count = 0
+
+            if self.clock.perf_counter() - start > c['timeout']:
+                return False
+            self.sleep(c['poll_interval'])
+
+        if c['settle_time'] > 0:
+            self.sleep(c['settle_time'])
+        return True
+
+    def wait_until_position(self, dxl_id, target_pulse, predicted_time, move_type, tolerance=None, above=False):
+        """
+        現在位置が目標の position_tolerance 以内に入るまで待つ。
+        above=True の場合は「現在位置 <= 目標 + 許容誤差」（Z軸ではその高さより上）になるまで待つ。
+        tolerance を渡すと position_tolerance の代わりに使う。
+        戻り値: (完了したか, 最後に読めた位置 or -1)
+          位置の読み取りに失敗した場合は (False, -1) ですぐに返す（従来と同じく待機を中断）。
+        """
+        c = self.criteria(move_type)
+        if tolerance is None:
+            tolerance = c['position_tolerance']
+        start = self.clock.perf_counter()
+        self._sleep_until_predicted(start, predicted_time, c)
+
+        in_count = 0
+        current = -1
+        while True:
+            current = self.dxl.read_present_position(dxl_id)
+            if current == -1:
+                return False, -1
+
+            if above:
+                in_position = current <= target_pulse + tolerance
+            else:
+                in_position = abs(target_pulse - current) <= tolerance
+            if in_position:
+                in_count += 1
+                if in_count >= c['stable_samples']:
+                    break
+            else:
+                in_count = 0
+
+            if self.clock.perf_counter() - start > c['timeout']:
+                return False, current
+            self.sleep(c['poll_interval'])
+
+        if c['settle_time'] > 0:
+            self.sleep(c['settle_time'])
+        return True, current
+
+    def wait_for_contact(self, dxl_id, current_threshold=0, limit_pulse=None, move_type='contact'):
+        """
+        押し付け中の軸の位置・速度・電流を短い間隔で読み、接触を検知したらすぐに返す。
+        接触 = 軸が動いたのを確認した後（min_travel 以上の移動か velocity_threshold を超える速度）、
+               速度が velocity_threshold 以下に落ち（stable_samples 回連続）、
+               かつ電流の大きさが current_threshold [mA] 以上（0 なら電流は見ない）。
+        一度も動かないまま止まっているのは、電流が小さすぎて動けないだけかもしれないので接触とはみなさない。
+        limit_pulse: この位置を越えたら（パルスが増える向き）接触しなかったとみなす
+        戻り値: (接触したか, 接触位置 or 最後の位置 or -1, 接触時刻 clock.monotonic or None, 理由)
+          理由: 'contact' / 'limit' / 'timeout' / 'no_motion'（タイムアウトまで一度も動かなかった）
+        テレメトリが動いていれば focus 中のサンプルを読む（バスを奪い合わない）。
+        """
+        c = self.criteria(move_type)
+        start = self.clock.monotonic()
+        still_count = 0
+        contact_time = None
+        position = -1
+        start_position = None
+        moved = False
+        samples = self._state_samples(dxl_id, c['poll_interval'])
+        try:
+            for now, state in samples:
+                if state is not None:
+                    position = state['position']
+                    if limit_pulse is not None and position >= limit_pulse:
+                        return False, position, None, 'limit'
+                    if start_position is None:
+                        start_position = position
+                    if not moved:
+                        moved = (abs(position - start_position) >= c['min_travel']
+                                 or abs(state['velocity']) > c['velocity_threshold'])
+
+                    still = moved and (abs(state['velocity']) <= c['velocity_threshold']
+                                       and abs(state['current']) >= current_threshold)
+                    if still and now - start >= c['min_time']:
+                        if still_count == 0:
+                            contact_time = now  # 止まり始めた時刻を接触時刻とする
+                        still_count += 1
+                        if still_count >= c['stable_samples']:
+                            return True, position, contact_time, 'contact'
+                    else:
+                        still_count = 0
+
+                if now - start > c['timeout']:
+                    return False, position, None, 'timeout' if moved else 'no_motion'
+        finally:
+            samples.close()
+
+    def _state_samples(self, dxl_id, poll_interval):
+        """
+        dxl_id の (時刻, 状態 dict or None) を新しいものから順に返し続けるジェネレータ。
+        テレメトリが動いていれば focus 中のサンプルを読み（バスには触れない）、
+        動いていなければ poll_interval ごとに自分で同期読み取りする。
+        """
+        telemetry = self.telemetry
+        if telemetry is None or not telemetry.running:
+            while True:
+                t = self.clock.monotonic()
+                yield t, self.dxl.sync_read_state((dxl_id,)).get(dxl_id)
+                self.sleep(poll_interval)
+
+        with telemetry.focus((dxl_id,)):
+            last_t = self.clock.monotonic()
+            while True:
+                self.check_cancel()
+                sample = telemetry.wait_for_sample(last_t, timeout=poll_interval * 4)
+                if sample is None:
+                    yield self.clock.monotonic(), None
+                    continue
+                last_t = sample.t
+                position = sample.position.get(dxl_id, -1)
+                if position == -1:
+                    yield last_t, None
+                    continue
+                yield last_t, {'position': position, 'current': sample.current[dxl_id],
+                               'velocity': sample.velocity[dxl_id], 'moving': sample.moving[dxl_id]}
+
+    def wait_until_settled(self, dxl_id, learned_noise=None, move_type='press_settle'):
+        """
+        押し付け中の位置を読み、直近 window_samples 個に直線を当てはめて安定を判定する。
+        安定 = 窓内の位置の変化が許容値以下（stable_samples 回連続）。
+        許容値は learned_noise（過去の溶着で学習したノイズ）× noise_k を min_drift〜max_drift に収めた値で、
+        学習前は max_drift（従来の固定しきい値相当）を使う。
+        戻り値: (安定したか, 押し付け開始からの時間 [s], {'drift', 'noise', 'tolerance'} or None)
+        """
+        c = self.criteria(move_type)
+        if learned_noise is None:
+            tolerance = c['max_drift']
+        else:
+            tolerance = min(max(c['noise_k'] * learned_noise, c['min_drift']), c['max_drift'])
+
+        window = deque(maxlen=c['window_samples'])
+        start = self.clock.monotonic()
+        settled_count = 0
+        stats = None
+        samples = self._state_samples(dxl_id, c['poll_interval'])
+        try:
+            for t, state in samples:
+                if state is not None:
+                    window.append((t, state['position']))
+                    if len(window) == window.maxlen:
+                        drift, noise = fit_window(*zip(*window))
+                        stats = {'drift': drift, 'noise': noise, 'tolerance': tolerance}
+                        if drift <= tolerance:
+                            settled_count += 1
+                            if settled_count >= c['stable_samples']:
+                                return True, t - start, stats
+                        else:
+                            settled_count = 0
+
+                if self.clock.monotonic() - start > c['timeout']:
+                    return False, self.clock.monotonic() - start, stats
+        finally:
+            samples.close()
@@ -12,9 +12,11 @@ from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolb
 import config
 import presets
 from dxf_parser import get_all_entities_as_segments, find_all_connected_paths
-from path_generator import generate_path_as_points
+from path_generator import generate_path_as_array
+from path_optimizer import optimize_path_order
 from plot_builder import create_plot_figure
 from csv_handler import save_path_to_csv
+from weld_path import WeldPath
 
 
 class PageDxfEditor(tk.Frame):
@@ -114,11 +116,17 @@ class PageDxfEditor(tk.Frame):
                 messagebox.showwarning("解析エラー", "図形を構築できませんでした。")
                 return
 
+            # パスの順序・向き・開始頂点を選び直して、パス間の空走距離を減らす
+            if getattr(config, 'OPTIMIZE_PATH_ORDER', True):
+                all_paths, report = optimize_path_order(all_paths)
+                print(f"溶着順序を最適化: 空走距離 {report['before']:.1f}mm -> {report['after']:.1f}mm "
+                      f"({report['saved']:.1f}mm 短縮, {report['paths']} パス)")
+
             selected_preset_name = self.controller.shared_data['preset_name']
             active_preset = presets.WELDING_PRESETS[selected_preset_name]
 
             # ★ここを変更: 生成された複数のパスを渡す
-            path_data = generate_path_as_points(all_paths, active_preset)
+            path_data = WeldPath(generate_path_as_array(all_paths, active_preset))
 
             if not path_data:
                 messagebox.showerror("経路生成エラー", "DXFファイルから有効な溶着点を1つも生成できませんでした。")
@@ -165,7 +173,8 @@ class PageDxfEditor(tk.Frame):
 
     def go_to_preview(self):
         if self.current_fig and hasattr(self.current_fig, '_weld_data'):
-            self.controller.shared_data['weld_points'] = self.current_fig._weld_data
+            # 実行ページ側で入替・シフトしても編集中のデータに影響しないようコピーを渡す
+            self.controller.shared_data['weld_points'] = self.current_fig._weld_data.copy()
 
             # 「まだシフトしていない」ことを示すフラグを設定
             self.controller.shared_data['is_shifted'] = False
@@ -183,10 +192,7 @@ class PageDxfEditor(tk.Frame):
         path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV files", "*.csv")])
         if not path: return
 
-        data_to_save = []
-        for d in self.current_fig._weld_data:
-            new_row = {'x': f"{d['x']:.4f}", 'y': f"{d['y']:.4f}"}
-            data_to_save.append(new_row)
+        data_to_save = [{'x': f"{x:.4f}", 'y': f"{y:.4f}"} for x, y in self.current_fig._weld_data.xy.tolist()]
 
         timestamp_to_save = self.current_fig._timestamp
         if save_path_to_csv(path, data_to_save, timestamp_to_save):
@@ -225,8 +231,7 @@ class PageDxfEditor(tk.Frame):
             return int(idx) if dist_sq[idx] < threshold_px ** 2 else None
 
         def update_scatter_positions():
-            pts = np.array([[d['x'], d['y']] for d in weld_data]) if weld_data else np.empty((0, 2))
-            scatter.set_offsets(pts)
+            scatter.set_offsets(weld_data.xy)
             canvas.draw_idle()
             fig._timestamp = datetime.datetime.now()
 
@@ -18,6 +18,7 @@ class PageManualControl(tk.Frame):
         self.dio = self.controller.hardware['dio']
         self.welder = self.controller.hardware['welder']
         self.sensors = self.controller.hardware['sensors']
+        self.inputs = self.controller.hardware.get('inputs')
 
         if self.motion:
             self.motion.log = self.add_log
@@ -125,7 +126,7 @@ class PageManualControl(tk.Frame):
     # ★追加: フットペダル監視ループ (別スレッドで実行)
     def _foot_pedal_loop(self):
         # foot_button.py の設定に準拠
-        BUTTON_CH = 0
+        BUTTON_CH = getattr(config, 'FOOT_PEDAL_PIN', 0)
         WELDER_CH = 0  # config.WELDER_PIN と同じはずですが念のため0
 
         last_state = -1
@@ -136,7 +137,12 @@ class PageManualControl(tk.Frame):
                     break
 
                 # ボタン状態読み取り
-                button_state = self.dio.read(channel=BUTTON_CH, AI_DI='DI')
+                if self.inputs is not None and self.inputs.running:
+                    # DI 走査スレッドのエッジを待つ（50ms ポーリングの遅れがない）
+                    self.inputs.wait_for_edge('foot_pedal', rising=None, timeout=0.05)
+                    button_state = 1 if self.inputs.state('foot_pedal') else 0
+                else:
+                    button_state = self.dio.read(channel=BUTTON_CH, AI_DI='DI')
 
                 if button_state != last_state:
                     if button_state == 1:
@@ -148,7 +154,8 @@ class PageManualControl(tk.Frame):
 
                     last_state = button_state
 
-                time.sleep(0.05)
+                if self.inputs is None or not self.inputs.running:
+                    time.sleep(0.05)
             except Exception as e:
                 self.add_log(f"フットペダルエラー: {e}")
                 self.foot_pedal_active = False
@@ -165,10 +172,12 @@ class PageManualControl(tk.Frame):
             pass
 
     def _start_ui_update_loop(self):
-        """Z軸の現在位置表示を定期的に更新する"""
+        """Z軸の現在位置表示を定期的に更新する（テレメトリの実測値、無ければ指令値）"""
         if self.motion and hasattr(self, 'z_pos_var'):
             try:
-                z_mm = self.motion.current_pos.get('z', 0.0)
+                z_mm = self.motion.measured_position_mm('z')
+                if z_mm is None:
+                    z_mm = self.motion.current_pos.get('z', 0.0)
                 self.z_pos_var.set(f"Z軸現在地: {z_mm:.2f} mm")
             except Exception:
                 pass
@@ -1,10 +1,7 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 import threading
-import time
-import copy
 import traceback
-import math
 import matplotlib
 
 matplotlib.use('TkAgg')
@@ -16,6 +13,11 @@ from page_welding_control_logic import WeldingControlLogic
 import presets
 import config
 from procedures import run_preview
+from weld_path import WeldPath
+from weld_scheduler import ThermalModel, schedule_welds, format_report
+from job_plan import compile_job_plan, validate_job_plan
+from dxl_bus import BusHaltedError
+from motion_wait import MotionCancelled
 
 
 # Logicクラスがボタン設定を変更しようとした際のエラー回避用ダミー
@@ -293,10 +295,11 @@ class PageMergedPreviewExecution(tk.Frame):
         if self.motion:
             self.motion.log = self.add_log
         p_name = self.controller.shared_data.get('preset_name', 'Unknown')
-        points = self.controller.shared_data.get('weld_points', [])
+        points = WeldPath.coerce(self.controller.shared_data.get('weld_points'))
+        self.controller.shared_data['weld_points'] = points
         is_shifted = self.controller.shared_data.get('is_shifted', False)
         if not is_shifted or self.base_points is None:
-            self.base_points = copy.deepcopy(points)
+            self.base_points = points.copy()
             self.controller.shared_data['is_shifted'] = False
 
         self.lbl_preset.config(text=f"プリセット: {p_name}")
@@ -334,8 +337,8 @@ class PageMergedPreviewExecution(tk.Frame):
         s_size = max(1.0, min(s_size, 50.0))
 
         if points:
-            x_vals = [float(p['x']) for p in points]
-            y_vals = [float(p['y']) for p in points]
+            x_vals = points.x
+            y_vals = points.y
 
             ax.plot(x_vals, y_vals, 'b-', alpha=0.3, label='Path Order')
             ax.scatter(x_vals, y_vals, c='red', s=s_size, zorder=5, label='Weld Points')
@@ -370,7 +373,7 @@ class PageMergedPreviewExecution(tk.Frame):
             return
 
         if self.base_points is None:
-            self.base_points = copy.deepcopy(self.controller.shared_data.get('weld_points', []))
+            self.base_points = WeldPath.coerce(self.controller.shared_data.get('weld_points')).copy()
 
         dx = self.motion.current_pos.get('x', 0.0)
         dy = self.motion.current_pos.get('y', 0.0)
@@ -383,12 +386,7 @@ class PageMergedPreviewExecution(tk.Frame):
         if not messagebox.askyesno("確認", msg):
             return
 
-        new_points = []
-        for p in self.base_points:
-            new_points.append({
-                'x': float(p['x']) + dx,
-                'y': float(p['y']) + dy
-            })
+        new_points = self.base_points.copy().translate(dx, dy)
 
         self.controller.shared_data['weld_points'] = new_points
         self.controller.shared_data['is_shifted'] = True
@@ -401,30 +399,21 @@ class PageMergedPreviewExecution(tk.Frame):
         self.draw_preview(new_points)
 
     def swap_xy_coordinates(self):
-        points = self.controller.shared_data.get('weld_points', [])
+        points = WeldPath.coerce(self.controller.shared_data.get('weld_points'))
         if not points:
             return
 
         if not messagebox.askyesno("確認", "全ての点のX座標とY座標を入れ替えますか？\n(グラフが更新されます)"):
             return
 
-        new_points = []
-        for p in points:
-            new_points.append({
-                'x': float(p['y']),
-                'y': float(p['x'])
-            })
+        points.swap_xy()
+        self.controller.shared_data['weld_points'] = points
 
-        self.controller.shared_data['weld_points'] = new_points
-
-        if hasattr(self, 'base_points') and self.base_points:
-            base_new = []
-            for p in self.base_points:
-                base_new.append({'x': float(p['y']), 'y': float(p['x'])})
-            self.base_points = base_new
+        if self.base_points:
+            self.base_points.swap_xy()
 
         self.add_log("XY座標を入れ替えました。")
-        self.draw_preview(new_points)
+        self.draw_preview(points)
 
     # =======================================================
     # 一時停止・再開メソッド
@@ -451,7 +440,7 @@ class PageMergedPreviewExecution(tk.Frame):
     # =======================================================
     def run_range_preview(self):
         """四隅だけの高速プレビュー (別スレッド実行)"""
-        points = self.controller.shared_data.get('weld_points', [])
+        points = WeldPath.coerce(self.controller.shared_data.get('weld_points'))
         if not points:
             messagebox.showwarning("警告", "データがありません")
             return
@@ -461,20 +450,19 @@ class PageMergedPreviewExecution(tk.Frame):
         self.pause_event.set()
         self.status_label.config(text="実行中 (範囲プレビュー)", fg="blue")
 
-        # 別スレッドで実行（フリーズ防止）
-        t = threading.Thread(target=self._range_preview_thread, args=(points,))
+        # 別スレッドで実行（フリーズ防止）。実行中に入替・シフトされても影響しないようコピーを渡す
+        t = threading.Thread(target=self._range_preview_thread, args=(points.copy(),))
         t.daemon = True
         t.start()
 
     def _range_preview_thread(self, points):
+        # 移動・Z移動の完了待ちの途中でも、停止ボタンで中断できるようにする
+        self.motion.set_cancel_events(self.stop_event, self.pause_event)
         try:
             self.add_log("--- 範囲プレビュー (四隅) 開始 ---")
 
             # 1. 範囲計算
-            xs = [p['x'] for p in points]
-            ys = [p['y'] for p in points]
-            min_x, max_x = min(xs), max(xs)
-            min_y, max_y = min(ys), max(ys)
+            min_x, max_x, min_y, max_y = WeldPath.coerce(points).bounds()
 
             # エリアチェック (マシンスペック内か)
             if (min_x < 0 or max_x > config.MACHINE_MAX_X_MM or
@@ -502,21 +490,28 @@ class PageMergedPreviewExecution(tk.Frame):
                 # 厳密モードで移動 (motion_system側で調整した閾値を使用)
                 self.motion.move_xy_abs(cx, cy, self.active_preset, precise_mode=True)
 
-                time.sleep(0.5)
+                self.motion.waiter.sleep(0.5)
 
             self.add_log("--- 範囲プレビュー 完了 ---")
             self.motion.return_to_origin()
             self.status_label.config(text="待機中", fg="black")
 
+        except MotionCancelled:
+            self.add_log("中断されました。")
+            self.motion.safe_stop()
+        except BusHaltedError:
+            self.add_log("緊急停止中のためモーター指令が拒否されました。処理を中断します。")
         except Exception as e:
             traceback.print_exc()
             self.add_log(f"エラー: {e}")
             self.status_label.config(text="エラー停止", fg="red")
+        finally:
+            self.motion.set_cancel_events(None)
 
     def run_detailed_preview(self):
         """実際の経路をなぞる詳細プレビュー (溶着なし)"""
         if not self.motion: return
-        points = self.controller.shared_data.get('weld_points', [])
+        points = WeldPath.coerce(self.controller.shared_data.get('weld_points'))
         if not points:
             messagebox.showwarning("警告", "溶着データがありません。")
             return
@@ -525,11 +520,12 @@ class PageMergedPreviewExecution(tk.Frame):
         self.pause_event.set()
         self.status_label.config(text="実行中 (詳細プレビュー)", fg="blue")
 
-        t = threading.Thread(target=self._detailed_preview_thread, args=(points,))
+        t = threading.Thread(target=self._detailed_preview_thread, args=(points.copy(),))
         t.daemon = True
         t.start()
 
     def _detailed_preview_thread(self, points):
+        self.motion.set_cancel_events(self.stop_event, self.pause_event)
         try:
             self.add_log("--- 詳細プレビュー (経路トレース) 開始 ---")
 
@@ -544,56 +540,42 @@ class PageMergedPreviewExecution(tk.Frame):
             self.add_log("移動を開始します...")
             self.motion.move_z_abs_pulse(config.SAFE_Z_PULSE)
 
-            # プレビュー用の高速設定
-            preview_preset = self.active_preset.copy()
-            preview_preset['velocity_xy'] = 300
-            preview_preset['acceleration_xy'] = 100
-
-            for i, p in enumerate(points):
-                # 一時停止/中断チェック (省略なし)
-                if not self.pause_event.is_set():
-                    self.add_log(f"[{i + 1}/{len(points)}] 一時停止中...")
-                    while not self.pause_event.is_set():
-                        if self.stop_event.is_set(): return
-                        time.sleep(0.1)
-                    self.add_log("再開します。")
-
-                if self.stop_event.is_set():
-                    self.add_log("中断されました。")
-                    return
-
-                target_x = float(p['x'])
-                target_y = float(p['y'])
+            # 経路を止まらずになぞる（目標位置を時刻どおりに流し込み、一時停止は経路上で減速して止まる）
+            xy = points.xy
+            self.add_log(f"経路トレース: {len(xy)}点")
 
-                if i % 10 == 0:
-                    self.add_log(f"Trace ({i + 1}/{len(points)}): {target_x:.1f}, {target_y:.1f}")
+            def report_progress(s_mm, length_mm):
+                self.add_log(f"Trace: {s_mm:.0f} / {length_mm:.0f}mm")
 
-                # ▼▼▼ 修正: 連続移動処理 (最後だけはしっかり止める) ▼▼▼
-                is_last_point = (i == len(points) - 1)
-
-                if is_last_point:
-                    # 最後の点は正確に止まる
-                    self.motion.move_xy_abs(target_x, target_y, preview_preset, precise_mode=True)
-                else:
-                    # 途中の点は 3.0mm 手前で次の命令へ移る
-                    # (停止検知機能がついたので、もし止まっても自動で次へ進みます)
-                    self.motion.move_xy_continuous(target_x, target_y, preview_preset, threshold_mm=3.0)
+            finished = self.motion.trace_path(xy, config.TRACE_PREVIEW_SPEED_MM_S, config.TRACE_PREVIEW_ACCEL_MM_S2,
+                                              stop_event=self.stop_event, pause_event=self.pause_event,
+                                              progress_callback=report_progress)
+            if not finished:
+                self.add_log("中断されました。")
+                return
 
             self.add_log("--- 詳細プレビュー完了 ---")
             self.motion.return_to_origin()
             self.status_label.config(text="待機中", fg="black")
 
+        except MotionCancelled:
+            self.add_log("中断されました。")
+            self.motion.safe_stop()
+        except BusHaltedError:
+            self.add_log("緊急停止中のためモーター指令が拒否されました。処理を中断します。")
         except Exception as e:
             traceback.print_exc()
             self.add_log(f"エラー: {e}")
             self.status_label.config(text="エラー停止", fg="red")
+        finally:
+            self.motion.set_cancel_events(None)
 
     def start_real_welding(self):
         if not self.motion:
             messagebox.showerror("エラー", "モーションシステム未接続")
             return
 
-        points = self.controller.shared_data.get('weld_points', [])
+        points = WeldPath.coerce(self.controller.shared_data.get('weld_points'))
         if not points:
             messagebox.showwarning("警告", "溶着データがありません。")
             return
@@ -620,11 +602,24 @@ class PageMergedPreviewExecution(tk.Frame):
         self.status_label.config(text="実行中", fg="black")
 
         # 引数に auto_pause_interval を追加
-        t = threading.Thread(target=self._welding_flow_absolute_thread, args=(points, auto_pause_interval))
+        t = threading.Thread(target=self._welding_flow_absolute_thread, args=(points.copy(), auto_pause_interval))
         t.daemon = True
         t.start()
 
+    def _wait_interruptible(self, seconds):
+        """seconds 秒待つ。途中で中断されたら False"""
+        clock = self.motion.clock
+        deadline = clock.monotonic() + seconds
+        while True:
+            remaining = deadline - clock.monotonic()
+            if remaining <= 0:
+                return True
+            if clock.wait(self.stop_event, min(remaining, 0.1)):
+                return False
+
     def _welding_flow_absolute_thread(self, points, auto_pause_interval=0):
+        # 待機ループ（移動・押し付け・溶着時間）の途中でも停止ボタンで中断し、一時停止は次の Z 退避済みの地点で止まる
+        self.motion.set_cancel_events(self.stop_event, self.pause_event)
         try:
             self.add_log("--- 溶着プロセス開始 ---")
 
@@ -636,111 +631,154 @@ class PageMergedPreviewExecution(tk.Frame):
                 self.add_log("中断されました。")
                 return
 
-            self.add_log(f"--- 溶着ジョブ実行 ({len(points)}点) ---")
+            # 熱スケジューラ: 近い点を続けて溶着しない順に並べ替え、冷却は領域ごとの待ちで行う（自動停止は並べ替え後の点数で数える）
+            thermal = None
+            if getattr(config, 'THERMAL_SCHEDULING', False):
+                schedule = schedule_welds(points.xy, self.active_preset['weld_time'],
+                                          start_xy=(self.motion.current_pos.get('x', 0.0),
+                                                    self.motion.current_pos.get('y', 0.0)))
+                points = WeldPath(points.xy[schedule.order])
+                thermal = ThermalModel(points.xy)
+                self.add_log(f"※ 熱スケジュール: {format_report(schedule.report)}")
+
+            # 1点ごとの指令（パルス目標・移動モード・退避量・範囲チェック）を先に全部計算する
+            plan = compile_job_plan(points.xy, self.active_preset, self.motion)
+            errors = validate_job_plan(plan)
+            if errors:
+                for error in errors:
+                    self.add_log(f"!!! エラー: {error}")
+                messagebox.showerror("範囲チェックエラー", "\n\n".join(errors))
+                return
+
+            n_points = len(plan)
+            self.add_log(f"--- 溶着ジョブ実行 ({n_points}点) ---")
             if auto_pause_interval > 0:
                 self.add_log(f"※ {auto_pause_interval}点ごとに自動で一時停止します。")
 
             self.motion.move_z_abs_pulse(config.SAFE_Z_PULSE)
+            # 接触高さ・押し付け安定の学習は前のワークのものなので捨てる
+            self.motion.reset_job_learning()
 
-            current_x = self.motion.current_pos.get('x', 0.0)
-            current_y = self.motion.current_pos.get('y', 0.0)
+            # パイプライン実行: 退避中に次の点への XY 移動を重ねる（済んでいれば次の周回で移動を省く）
+            pipelined = getattr(config, 'PIPELINED_WELDING', False)
+            if pipelined:
+                self.add_log("※ パイプライン実行: Z軸がクリアランス高さを越えた時点で次の点へ移動します。")
+            xy_done = False
 
-            for i, p in enumerate(points):
+            preset = self.active_preset
+            for i, step in enumerate(plan):
                 # --- 一時停止チェック ---
                 if not self.pause_event.is_set():
-                    self.add_log(f"[{i + 1}/{len(points)}] 一時停止中... (Z軸退避済み)")
+                    self.add_log(f"[{i + 1}/{n_points}] 一時停止中... (Z軸退避済み)")
                     while not self.pause_event.is_set():
                         if self.stop_event.is_set():
                             self.add_log("一時停止中に緊急停止されました。")
                             return
-                        time.sleep(0.1)
-                    self.add_log(f"[{i + 1}/{len(points)}] 処理を再開します。")
+                        self.motion.clock.wait(self.stop_event, 0.1)
+                    self.add_log(f"[{i + 1}/{n_points}] 処理を再開します。")
 
                 # --- 中断チェック ---
                 if self.stop_event.is_set():
                     self.add_log("中断されました。緊急停止します。")
                     return
 
-                target_x = float(p['x'])
-                target_y = float(p['y'])
-
-                # 距離判定: 現在地から5mm以上移動するなら厳密停止モードにする
-                dist = math.hypot(target_x - current_x, target_y - current_y)
-                is_precise = (dist >= 5.0)
-
-                self.add_log(f"({i + 1}/{len(points)}) 移動: X={target_x:.2f}, Y={target_y:.2f}")
-
-                self.motion.move_xy_abs(target_x, target_y, self.active_preset, precise_mode=is_precise)
+                target_x = float(step['x_mm'])
+                target_y = float(step['y_mm'])
 
-                current_x = target_x
-                current_y = target_y
-
-                if i == 0:
-                    time.sleep(1)
-
-                # ▼▼▼▼▼▼▼▼▼▼ 修正ここから ▼▼▼▼▼▼▼▼▼▼
-
-                # 1. 実行用のプリセットをコピー作成
-                exec_preset = self.active_preset.copy()
-
-                # 2. 次の点までの距離を計算する
-                dist_to_next = 0.0
-                if i < len(points) - 1:
-                    next_p = points[i + 1]
-                    # 次の点の座標
-                    nx = float(next_p['x'])
-                    ny = float(next_p['y'])
-                    # 現在のターゲット(target_x, target_y)からの距離
-                    dist_to_next = math.hypot(nx - target_x, ny - target_y)
-
-                # 3. 距離が20mm以上なら、退避量を増やすフラグ(long_retract)をON
-                if dist_to_next >= 20.0:
-                    exec_preset['long_retract'] = True
-                    self.add_log(f"  -> 次の点まで {dist_to_next:.1f}mm。退避量を増やします(-300)。")
+                if xy_done:
+                    self.add_log(f"({i + 1}/{n_points}) 移動済み: X={target_x:.2f}, Y={target_y:.2f}")
                 else:
-                    exec_preset['long_retract'] = False
+                    self.add_log(f"({i + 1}/{n_points}) 移動: X={target_x:.2f}, Y={target_y:.2f}")
+                    self.motion.move_xy_abs(target_x, target_y, preset, precise_mode=bool(step['precise']),
+                                            pulses=(step['x_pulse'], step['y_pulse']))
+                xy_done = False
 
-                # 4. 1点目(i=0)の場合のみ、接触検知電流(gentle_current)を変更
                 if i == 0:
-                    special_current = -1  # ★ここで電流値を指定
-                    exec_preset['gentle_current'] = special_current
-                    self.add_log(f"★初回限定: 接触検知電流を {special_current}mA に変更して実行します。")
-
-                # 5. 実行 (コピーしたプリセットを渡す)
-                self.motion.execute_welding_press(self.welder, exec_preset)
+                    self.motion.waiter.sleep(1)
+                    self.add_log(f"★初回限定: 接触検知電流を {step['gentle_current']}mA に変更して実行します。")
+
+                if step['long_retract']:
+                    self.add_log(f"  -> 次の点まで {step['dist_next']:.1f}mm。退避量を増やします(-{step['retract_pulse']})。")
+
+                auto_pause_now = (auto_pause_interval > 0 and (i + 1) < n_points
+                                  and (i + 1) % auto_pause_interval == 0)
+
+                # 熱モデル上、この領域がまだ冷えていなければ待つ
+                if thermal is not None:
+                    cooling = thermal.wait_for(i, self.motion.clock.monotonic())
+                    if cooling > 0:
+                        self.add_log(f"  -> 領域の冷却待ち {cooling:.1f}秒")
+                        if not self._wait_interruptible(cooling):
+                            self.add_log("冷却待ち中に中断されました。")
+                            return
+                    thermal.deposit(i, self.motion.clock.monotonic())
+
+                # 溶着実行
+                # パイプライン実行では、一時停止・中断の予定がなければ退避と次の XY 移動を重ねる
+                press_args = dict(retract_amount=int(step['retract_pulse']),
+                                  gentle_current=float(step['gentle_current']),
+                                  z_hint=int(step['z_hint_pulse']))
+                # 次の点までの経路の表面高さから退避量を決める（一時停止の予定があるときは従来の退避量）
+                if i < n_points - 1 and not auto_pause_now:
+                    press_args['next_point'] = (float(plan['x_mm'][i + 1]), float(plan['y_mm'][i + 1]))
+                if (pipelined and i < n_points - 1 and not auto_pause_now
+                        and self.pause_event.is_set() and not self.stop_event.is_set()):
+                    nxt = plan[i + 1]
+                    next_xy = (float(nxt['x_mm']), float(nxt['y_mm']), preset, bool(nxt['precise']),
+                               (nxt['x_pulse'], nxt['y_pulse']))
+                    self.add_log(f"  -> 退避中に次の点 ({i + 2}/{n_points}) へ移動します。")
+                    xy_done = self.motion.execute_welding_press(self.welder, preset, next_xy=next_xy, **press_args)
+                else:
+                    self.motion.execute_welding_press(self.welder, preset, **press_args)
 
                 # ▼▼▼ 自動一時停止チェック ▼▼▼
-                if auto_pause_interval > 0 and (i + 1) < len(points) and (i + 1) % auto_pause_interval == 0:
+                if auto_pause_now:
                     self.add_log(f"--- 自動停止: {i + 1}点完了。冷却のため一時停止します ---")
                     # 次のループ開始時に止まるように pause_event をクリアする
                     self.pause_job()
                 # ▲▲▲ 自動一時停止チェック ▲▲▲
 
-                # ▲▲▲▲▲▲▲▲▲▲ 修正ここまで ▲▲▲▲▲▲▲▲▲▲
-
             if not self.stop_event.is_set():
                 self.add_log("--- 溶着ジョブ完了 ---")
+                settle_times = self.motion.settle_times
+                if settle_times:
+                    self.add_log(f"押し付け安定までの時間: 平均 {1000 * sum(settle_times) / len(settle_times):.0f}ms, "
+                                 f"最大 {1000 * max(settle_times):.0f}ms ({len(settle_times)}点)")
+                weld_timer = self.motion.weld_timer
+                if weld_timer is not None:
+                    self.add_log(f"溶着時間のばらつき: {weld_timer.format_stats(weld_timer.stats())}")
+                for x_mm, y_mm, reason in self.motion.skipped_points:
+                    self.add_log(f"!!! 未溶着: X={x_mm:.2f}, Y={y_mm:.2f} (接触せず: {reason})")
                 self.motion.return_to_origin()
                 self.status_label.config(text="待機中", fg="black")
             else:
                 self.add_log("緊急停止状態のため、原点復帰をスキップします。")
 
+        except MotionCancelled:
+            self.add_log("中断されました。安全な状態で停止します。")
+            self.motion.safe_stop()
+        except BusHaltedError:
+            self.add_log("緊急停止中のためモーター指令が拒否されました。処理を中断します。")
         except Exception as e:
             traceback.print_exc()
             err_msg = f"エラー発生: {e}\n{traceback.format_exc()}"
             self.add_log(err_msg)
             messagebox.showerror("実行時エラー", str(e))
             self.status_label.config(text="エラー停止", fg="red")
+        finally:
+            self.motion.set_cancel_events(None)
 
     def run_dry_run_preview(self):
         # 旧メソッド名の互換性維持（念のため）
         self.run_range_preview()
 
     def on_emergency_stop(self):
+        # 先にバスを止めてトルクOFFにしてから停止要求を出す（動作スレッドの safe_stop と競合させない）
+        self.logic.halt_hardware()
         self.stop_event.set()
         self.pause_event.set()
-        self.logic.on_emergency_stop()
         self.status_label.config(text="緊急停止", fg="red")
+        self.logic.on_emergency_stop(halted=True)
 
     def on_recovery(self):
         self.stop_event.clear()
@@ -1,8 +1,9 @@
 import threading
-import time
 from tkinter import messagebox, filedialog
 from procedures import run_tilt_calibration, teach_origin_by_jog, run_preview
 from csv_handler import load_path_from_csv
+from dxl_bus import BusHaltedError
+from motion_wait import MotionCancelled
 
 
 class WeldingControlLogic:
@@ -54,6 +55,8 @@ class WeldingControlLogic:
         self.run_in_thread(self._welding_flow_thread, points)
 
     def _welding_flow_thread(self, points):
+        motion = self.main.motion
+        motion.set_cancel_events(self.stop_event, getattr(self.main, 'pause_event', None))
         try:
             self.main.add_log("--- 溶着プロセス開始 ---")
             self.main.motion.home_all_axes(self.main.sensors)
@@ -112,7 +115,7 @@ class WeldingControlLogic:
 
                 if i == 0:
                     self.main.add_log("-> 初回移動のため1秒待機します。")
-                    time.sleep(1)
+                    motion.waiter.sleep(1)
 
                 # ▼▼▼▼▼▼▼▼▼▼ 修正ここから ▼▼▼▼▼▼▼▼▼▼
 
@@ -135,9 +138,16 @@ class WeldingControlLogic:
             self.main.add_log("--- 溶着ジョブ完了 ---")
             self.main.motion.return_to_origin()
 
+        except MotionCancelled:
+            self.main.add_log("中断されました。")
+            motion.safe_stop()
+        except BusHaltedError:
+            self.main.add_log("緊急停止中のためモーター指令が拒否されました。処理を中断します。")
         except Exception as e:
             self.main.add_log(f"エラーが発生しました: {e}")
             messagebox.showerror("実行時エラー", f"ジョブ実行中にエラーが発生しました:\n{e}")
+        finally:
+            motion.set_cancel_events(None)
 
     # --- キャリブレーション ---
     def run_calibration(self):
@@ -314,6 +324,8 @@ class WeldingControlLogic:
             self.run_in_thread(self._homing_thread)
 
     def _homing_thread(self):
+        # 原点探索（速度制御）の途中でも停止ボタンで中断できるようにする
+        self.main.motion.set_cancel_events(self.stop_event)
         try:
             self.main.is_moving = True
             if hasattr(self.main, 'homing_button'):
@@ -337,7 +349,11 @@ class WeldingControlLogic:
                 self._set_jog_buttons_enabled(True)
                 self.is_z_homed = True
                 self.main.add_log("原点復帰が完了しました。手動操作が可能です。")
+        except MotionCancelled:
+            self.main.add_log("原点復帰を中断しました。")
+            self.main.motion.safe_stop()
         finally:
+            self.main.motion.set_cancel_events(None)
             self.main.is_moving = False
             if hasattr(self.main, 'homing_button'):
                 try:
@@ -489,8 +505,11 @@ class WeldingControlLogic:
             self._set_jog_buttons_enabled(True)
 
     # --- 緊急停止と復帰 ---
-    def on_emergency_stop(self):
-        self.stop_event.set()
+    def halt_hardware(self):
+        """
+        バスを停止状態にして全軸トルクOFF、溶着機OFF。
+        停止要求 (stop_event) より先に行う（動作スレッドの safe_stop がトルクOFFと競合しないように）
+        """
         if getattr(self.main, 'motion', None):
             try:
                 self.main.motion.emergency_stop()
@@ -502,6 +521,12 @@ class WeldingControlLogic:
                 self.main.add_log("!!! 溶着機をOFFにしました。 !!!")
             except Exception:
                 pass
+
+    def on_emergency_stop(self, halted=False):
+        """halted=True: 呼び出し側で halt_hardware 済み"""
+        if not halted:
+            self.halt_hardware()
+        self.stop_event.set()
         if hasattr(self.main, 'recover_btn'):
             self.main.recover_btn.config(state='normal')
         if hasattr(self.main, 'stop_btn'):
@@ -516,6 +541,13 @@ class WeldingControlLogic:
         self.run_in_thread(self._recovery_thread)
 
     def _recovery_thread(self):
+        controller = getattr(self.main, 'controller', None)
+        estop = controller.hardware.get('estop') if controller is not None else None
+        if estop is not None and not estop.reset():
+            self.main.add_log("非常停止ボタンが押されたままか、デジタル入力が読めていません。確認してから復帰してください。")
+            if hasattr(self.main, 'recover_btn'):
+                self.main.recover_btn.config(state='normal')
+            return
         if getattr(self.main, 'motion', None):
             try:
                 self.main.motion.recover_from_stop()
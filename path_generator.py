@@ -3,45 +3,82 @@ import numpy as np
 import config
 
 
-def _generate_points_for_single_loop(vertices, preset):
-    """1つの閉じた（または開いた）パスに対して点を生成する"""
-    path_points = []
-    if len(vertices) < 2:
-        return path_points
+def _generate_array_for_single_loop(vertices, pitch):
+    """
+    1つの閉じた（または開いた）パスに対して、ピッチごとの溶着点を (N,2) 配列で生成する。
+    累積弧長(np.cumsum)・ピッチ位置(np.arange)・区間検索(np.searchsorted)で
+    パス1本を一括計算する。
+    """
+    path_vertices = np.asarray(vertices, dtype=float)
+    if len(path_vertices) < 2:
+        return np.empty((0, 2), dtype=float)
 
-    path_vertices = np.array(vertices)
-    pitch = preset['weld_pitch']
+    start_points = path_vertices[:-1, :2]
+    segment_vectors = path_vertices[1:, :2] - start_points
+    segment_lengths = np.hypot(segment_vectors[:, 0], segment_vectors[:, 1])
+
+    # 長さがほぼゼロのセグメントは除外（従来と同じ 1e-6 判定）
+    valid = segment_lengths >= 1e-6
+    start_points = start_points[valid]
+    segment_vectors = segment_vectors[valid]
+    segment_lengths = segment_lengths[valid]
+
+    if len(segment_lengths) == 0:
+        return path_vertices[:1, :2].copy()
 
-    # 始点を追加
-    path_points.append({'x': float(path_vertices[0, 0]), 'y': float(path_vertices[0, 1])})
+    # 各セグメント始点までの累積距離
+    cumulative = np.concatenate(([0.0], np.cumsum(segment_lengths)))
+    total_length = cumulative[-1]
 
-    accumulated_distance = 0.0
+    # 始点(距離0)の次から、全長未満のピッチ位置をすべて作る
+    stations = np.arange(1, int(np.ceil(total_length / pitch)) + 1) * pitch
+    stations = stations[stations < total_length]
 
-    for i in range(len(path_vertices) - 1):
-        start_point = path_vertices[i]
-        end_point = path_vertices[i + 1]
+    # 各ピッチ位置がどのセグメントに入るかを求めて線形補間
+    seg_idx = np.searchsorted(cumulative, stations, side='right') - 1
+    seg_idx = np.clip(seg_idx, 0, len(segment_lengths) - 1)
+    ratio = (stations - cumulative[seg_idx]) / segment_lengths[seg_idx]
+    interpolated = start_points[seg_idx] + ratio[:, None] * segment_vectors[seg_idx]
 
-        segment_vector = end_point - start_point
-        segment_length = np.linalg.norm(segment_vector)
+    return np.vstack((path_vertices[:1, :2], interpolated))
 
-        if segment_length < 1e-6:
-            continue
 
-        segment_direction = segment_vector / segment_length
-        dist_at_segment_start = accumulated_distance
+def _points_to_dicts(points_array):
+    """(N,2) 配列を従来の [{'x':..., 'y':...}, ...] 形式に変換する（互換用）"""
+    return [{'x': x, 'y': y} for x, y in points_array.tolist()]
 
-        # このセグメント内でピッチごとの点を計算
-        next_weld_dist = (np.floor(dist_at_segment_start / pitch) + 1) * pitch
 
-        while next_weld_dist < dist_at_segment_start + segment_length:
-            dist_within_segment = next_weld_dist - dist_at_segment_start
-            new_point_coord = start_point + dist_within_segment * segment_direction
-            path_points.append({'x': float(new_point_coord[0]), 'y': float(new_point_coord[1])})
-            next_weld_dist += pitch
+def _generate_points_for_single_loop(vertices, preset):
+    """1つの閉じた（または開いた）パスに対して点を生成する"""
+    return _points_to_dicts(_generate_array_for_single_loop(vertices, preset['weld_pitch']))
+
+
+def _normalize_paths(all_paths_vertices):
+    # 受け取った vertices が「リストのリスト(複数パス)」か「ただのリスト(単一パス)」か判定して統一
+    # dxf_parser修正後は リストのリスト [[v1,v2...], [v3,v4...]] で来る想定
+    if isinstance(all_paths_vertices[0][0], (float, int)):
+        # 旧形式対策（万が一単一リストが来た場合）
+        return [all_paths_vertices]
+    return all_paths_vertices
+
 
-        accumulated_distance += segment_length
+def generate_path_as_array(all_paths_vertices, preset):
+    """
+    複数のパス（頂点リストのリスト）を受け取り、すべての溶着点を (N,2) の float 配列で返す。
+    """
+    if not all_paths_vertices:
+        return np.empty((0, 2), dtype=float)
 
-    return path_points
+    pitch = preset['weld_pitch']
+    arrays = [_generate_array_for_single_loop(vertices, pitch)
+              for vertices in _normalize_paths(all_paths_vertices)]
+    # ※ここでパスとパスの間の「空走移動」は自動的に発生します。
+    # 機械制御側(PageMerged)で、距離が離れている場合は自動的に
+    # 一旦停止・Z退避するように修正済み（dist > 5.0mm の判定）なので、
+    # ここでは単純に座標を繋げるだけでOKです。
+    if not arrays:
+        return np.empty((0, 2), dtype=float)
+    return np.concatenate(arrays, axis=0)
 
 
 def generate_path_as_points(all_paths_vertices, preset):
@@ -51,23 +88,4 @@ def generate_path_as_points(all_paths_vertices, preset):
     """
     if not all_paths_vertices:
         return []
-
-    combined_points = []
-
-    # 受け取った vertices が「リストのリスト(複数パス)」か「ただのリスト(単一パス)」か判定して統一
-    # dxf_parser修正後は リストのリスト [[v1,v2...], [v3,v4...]] で来る想定
-    if isinstance(all_paths_vertices[0][0], (float, int)):
-        # 旧形式対策（万が一単一リストが来た場合）
-        all_paths_list = [all_paths_vertices]
-    else:
-        all_paths_list = all_paths_vertices
-
-    for i, vertices in enumerate(all_paths_list):
-        points = _generate_points_for_single_loop(vertices, preset)
-        combined_points.extend(points)
-        # ※ここでパスとパスの間の「空走移動」は自動的に発生します。
-        # 機械制御側(PageMerged)で、距離が離れている場合は自動的に
-        # 一旦停止・Z退避するように修正済み（dist > 5.0mm の判定）なので、
-        # ここでは単純に座標リストを繋げるだけでOKです。
-
-    return combined_points
\ No newline at end of file
+    return _points_to_dicts(generate_path_as_array(all_paths_vertices, preset))
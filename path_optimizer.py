@@ -0,0 +1,288 @@
+# path_optimizer.py
+
+"""
+パス（頂点リスト）の溶着順序の最適化。
+find_all_connected_paths の結果を DXF のエンティティ順のまま繋ぐと、
+パス間の空走移動が長くなり、長い退避(long_retract)や厳密停止が増える。
+ここでは
+  - パスの順番
+  - 向き（開いたパスはどちらの端から始めるか）
+  - 閉じたパスの開始頂点
+を選び直して、パス間の空走距離の合計を小さくする。
+  1. 最近傍法で初期順序を作る
+  2. 近傍リストに絞った 2-opt（区間反転）と Or-opt（1〜3本の移動）で改善する
+  3. 閉じたパスの開始頂点を前後のパスに合わせて選び直す（2〜3 を改善がなくなるまで繰り返す）
+近傍の探索は NumPy でまとめて距離を計算して行う。
+"""
+
+import math
+
+import numpy as np
+
+
+class _Path:
+    """最適化中の1パスの状態（頂点は (M,2) 配列で持つ）"""
+    __slots__ = ('vertices', 'xy', 'points', 'closed', 'flip', 'start')
+
+    def __init__(self, vertices, tolerance):
+        self.vertices = vertices
+        self.xy = np.asarray([v[:2] for v in vertices], dtype=float)
+        self.closed = len(vertices) >= 3 and bool(np.hypot(*(self.xy[0] - self.xy[-1])) <= tolerance)
+        if self.closed:
+            self.xy = self.xy[:-1]  # 終点(=始点)の重複を除く
+        self.points = [tuple(p) for p in self.xy.tolist()]  # 距離計算用（タプルのほうが速い）
+        self.flip = False  # True なら逆向きにたどる
+        self.start = 0  # 閉じたパスの開始頂点
+
+    def entry(self):
+        if self.closed:
+            return self.points[self.start]
+        return self.points[-1] if self.flip else self.points[0]
+
+    def exit(self):
+        if self.closed:
+            return self.points[self.start]
+        return self.points[0] if self.flip else self.points[-1]
+
+    def ordered_vertices(self):
+        """選ばれた向き・開始頂点で並べ直した頂点リスト（元の頂点オブジェクトをそのまま使う）"""
+        if self.closed:
+            core = self.vertices[:-1]
+            result = core[self.start:] + core[:self.start] + [core[self.start]]
+        else:
+            result = list(self.vertices)
+        if self.flip:
+            result.reverse()
+        return result
+
+
+def _dist(a, b):
+    return math.hypot(a[0] - b[0], a[1] - b[1])
+
+
+def _travel_of_vertex_lists(paths, start_xy):
+    """頂点リストを与えられた順にたどったときの空走距離（start_xy から）"""
+    total = 0.0
+    current = start_xy
+    for vertices in paths:
+        if not vertices:
+            continue
+        total += _dist(current, vertices[0])
+        current = vertices[-1]
+    return total
+
+
+class _Tour:
+    def __init__(self, paths, start_xy, neighbors):
+        self.paths = paths
+        self.start_xy = start_xy
+        self.neighbors = neighbors
+        self.order = []
+        self.pos = [0] * len(paths)
+
+    def set_order(self, order):
+        self.order = list(order)
+        for k, p in enumerate(self.order):
+            self.pos[p] = k
+
+    def prev_exit(self, k):
+        return self.start_xy if k == 0 else self.paths[self.order[k - 1]].exit()
+
+    def next_entry(self, k):
+        return None if k >= len(self.order) - 1 else self.paths[self.order[k + 1]].entry()
+
+    # --- 最近傍法 ---
+    def build_nearest_neighbor(self):
+        # 各パスの入口候補: 開いたパスは両端、閉じたパスは全頂点
+        cand_xy, cand_path, cand_flip, cand_start = [], [], [], []
+        for idx, path in enumerate(self.paths):
+            if path.closed:
+                m = len(path.xy)
+                cand_xy.append(path.xy)
+                cand_path.append(np.full(m, idx))
+                cand_flip.append(np.zeros(m, dtype=bool))
+                cand_start.append(np.arange(m))
+            else:
+                cand_xy.append(path.xy[[0, -1]])
+                cand_path.append(np.full(2, idx))
+                cand_flip.append(np.array([False, True]))
+                cand_start.append(np.zeros(2, dtype=int))
+        cand_xy = np.concatenate(cand_xy)
+        cand_path = np.concatenate(cand_path)
+        cand_flip = np.concatenate(cand_flip)
+        cand_start = np.concatenate(cand_start)
+
+        alive = np.ones(len(cand_xy), dtype=bool)
+        order = []
+        current = self.start_xy
+        for _ in range(len(self.paths)):
+            alive_idx = np.flatnonzero(alive)
+            d = np.hypot(cand_xy[alive_idx, 0] - current[0], cand_xy[alive_idx, 1] - current[1])
+            best = alive_idx[int(np.argmin(d))]
+            idx = int(cand_path[best])
+            path = self.paths[idx]
+            path.flip = bool(cand_flip[best])
+            path.start = int(cand_start[best])
+            order.append(idx)
+            alive[cand_path == idx] = False
+            current = path.exit()
+        self.set_order(order)
+
+    # --- 2-opt ---
+    def two_opt(self):
+        """区間 [i, j] を反転（各パスの向きも反転）する改善を、近傍リストの範囲で探す"""
+        improved = False
+        n = len(self.order)
+        for i in range(n):
+            a = self.prev_exit(i)
+            e_i = self.paths[self.order[i]].entry()
+            # 新しい辺 a -> (位置 j のパスの出口) の候補は、位置 i-1 のパスの近傍だけ調べる
+            candidates = self.neighbors[self.order[i - 1]] if i > 0 else self.neighbors[self.order[0]]
+            for q in candidates:
+                j = self.pos[q]
+                if j <= i:
+                    continue
+                x_j = self.paths[self.order[j]].exit()
+                e_next = self.next_entry(j)
+                old = _dist(a, e_i) + (_dist(x_j, e_next) if e_next is not None else 0.0)
+                new = _dist(a, x_j) + (_dist(e_i, e_next) if e_next is not None else 0.0)
+                if new < old - 1e-9:
+                    self._reverse(i, j)
+                    improved = True
+                    e_i = self.paths[self.order[i]].entry()
+        return improved
+
+    def _reverse(self, i, j):
+        segment = self.order[i:j + 1]
+        segment.reverse()
+        self.order[i:j + 1] = segment
+        for k in range(i, j + 1):
+            p = self.order[k]
+            self.pos[p] = k
+            self.paths[p].flip = not self.paths[p].flip
+
+    # --- Or-opt ---
+    def or_opt(self, max_chain=3):
+        """連続する 1〜max_chain 本のパスを、別の位置へ（必要なら反転して）移す"""
+        improved = False
+        for chain in range(1, max_chain + 1):
+            i = 0
+            while i + chain <= len(self.order):
+                if self._try_move_chain(i, chain):
+                    improved = True
+                else:
+                    i += 1
+        return improved
+
+    def _try_move_chain(self, i, chain):
+        j = i + chain - 1
+        first = self.paths[self.order[i]]
+        last = self.paths[self.order[j]]
+        a = self.prev_exit(i)
+        b = self.next_entry(j)
+        first_entry = first.entry()
+        last_exit = last.exit()
+        removed_gain = _dist(a, first_entry) + (_dist(last_exit, b) if b is not None else 0.0)
+        removed_gain -= _dist(a, b) if b is not None else 0.0
+
+        best = None
+        for q in self.neighbors[self.order[i]] + self.neighbors[self.order[j]]:
+            p = self.pos[q]
+            if i - 1 <= p <= j:
+                continue
+            # 位置 p のパスの後ろに挿入する
+            x_p = self.paths[self.order[p]].exit()
+            e_next = self.next_entry(p)
+            base = _dist(x_p, e_next) if e_next is not None else 0.0
+            forward = _dist(x_p, first_entry) + (_dist(last_exit, e_next) if e_next is not None else 0.0)
+            backward = _dist(x_p, last_exit) + (_dist(first_entry, e_next) if e_next is not None else 0.0)
+            for added, reverse in ((forward - base, False), (backward - base, True)):
+                gain = removed_gain - added
+                if gain > 1e-9 and (best is None or gain > best[0]):
+                    best = (gain, p, reverse)
+
+        if best is None:
+            return False
+
+        _, p, reverse = best
+        moved = self.order[i:j + 1]
+        anchor = self.order[p]
+        rest = self.order[:i] + self.order[j + 1:]
+        if reverse:
+            moved.reverse()
+            for idx in moved:
+                self.paths[idx].flip = not self.paths[idx].flip
+        insert_at = rest.index(anchor) + 1
+        self.set_order(rest[:insert_at] + moved + rest[insert_at:])
+        return True
+
+    # --- 閉じたパスの開始頂点 ---
+    def choose_start_vertices(self):
+        """前の出口と次の入口までの距離の和が最小になる頂点を、閉じたパスの開始点にする"""
+        improved = False
+        for k, idx in enumerate(self.order):
+            path = self.paths[idx]
+            if not path.closed:
+                continue
+            prev_pt = self.prev_exit(k)
+            next_pt = self.next_entry(k)
+            cost = np.hypot(path.xy[:, 0] - prev_pt[0], path.xy[:, 1] - prev_pt[1])
+            if next_pt is not None:
+                cost = cost + np.hypot(path.xy[:, 0] - next_pt[0], path.xy[:, 1] - next_pt[1])
+            best = int(np.argmin(cost))
+            if cost[best] < cost[path.start] - 1e-9:
+                path.start = best
+                improved = True
+        return improved
+
+
+def _neighbor_lists(paths, k):
+    """各パスに近いパス k 本（パスの代表点=頂点の重心で判定）"""
+    n = len(paths)
+    if n <= 1:
+        return [[] for _ in range(n)]
+    k = min(k, n - 1)
+    centers = np.array([p.xy.mean(axis=0) for p in paths])
+    neighbors = []
+    for i in range(n):
+        d = np.hypot(centers[:, 0] - centers[i, 0], centers[:, 1] - centers[i, 1])
+        d[i] = np.inf
+        nearest = np.argpartition(d, k - 1)[:k]
+        neighbors.append([int(q) for q in nearest[np.argsort(d[nearest])]])
+    return neighbors
+
+
+def optimize_path_order(all_paths_vertices, start_xy=None, tolerance=1e-3, neighbor_count=10, max_rounds=20):
+    """
+    パスの順序・向き・閉じたパスの開始頂点を選び直す。
+    start_xy を省略した場合は、元の先頭パスの始点から開始する（1点目の溶着位置の目安を変えないため）。
+    戻り値: (並べ替えた頂点リストのリスト, 報告 dict)
+      報告: {'before': 元の空走距離, 'after': 最適化後の空走距離, 'saved': 差, 'paths': パス数}  単位は図面の単位(mm)
+    """
+    source = [list(vertices) for vertices in all_paths_vertices if len(vertices) > 0]
+    if not source:
+        return [], {'before': 0.0, 'after': 0.0, 'saved': 0.0, 'paths': 0}
+    if start_xy is None:
+        start_xy = tuple(source[0][0][:2])
+    start_xy = (float(start_xy[0]), float(start_xy[1]))
+    before = _travel_of_vertex_lists(source, start_xy)
+
+    paths = [_Path(vertices, tolerance) for vertices in source]
+    tour = _Tour(paths, start_xy, _neighbor_lists(paths, neighbor_count))
+    tour.build_nearest_neighbor()
+
+    for _ in range(max_rounds):
+        improved = tour.two_opt()
+        improved |= tour.or_opt()
+        improved |= tour.choose_start_vertices()
+        if not improved:
+            break
+
+    ordered = [paths[idx].ordered_vertices() for idx in tour.order]
+    after = _travel_of_vertex_lists(ordered, start_xy)
+    if after > before:
+        # 元の順序のほうが短い場合はそのまま返す
+        ordered, after = source, before
+
+    report = {'before': before, 'after': after, 'saved': before - after, 'paths': len(source)}
+    return ordered, report
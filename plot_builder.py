@@ -1,6 +1,7 @@
 # plot_builder.py
 import matplotlib.pyplot as plt
 import numpy as np
+from weld_path import as_xy_array
 
 
 def create_plot_figure(all_paths_vertices, weld_points_data):
@@ -28,11 +29,10 @@ def create_plot_figure(all_paths_vertices, weld_points_data):
                 ax.plot(p_arr[:, 0], p_arr[:, 1], 'b-', linewidth=1.0, alpha=0.7)
 
     # 点の座標収集
-    if weld_points_data:
-        px = [p['x'] for p in weld_points_data]
-        py = [p['y'] for p in weld_points_data]
-        all_x.extend(px)
-        all_y.extend(py)
+    pts = as_xy_array(weld_points_data)
+    if len(pts) > 0:
+        all_x.extend(pts[:, 0])
+        all_y.extend(pts[:, 1])
 
     # スケール調整
     if all_x and all_y:
@@ -45,8 +45,7 @@ def create_plot_figure(all_paths_vertices, weld_points_data):
         s_size = 20.0
 
     # 溶着点を描画
-    if weld_points_data:
-        pts = np.array([[p['x'], p['y']] for p in weld_points_data])
+    if len(pts) > 0:
         scatter = ax.scatter(pts[:, 0], pts[:, 1], c='red', s=s_size, label='Weld Points', zorder=5)
     else:
         scatter = ax.scatter([], [], c='red', s=s_size, label='Weld Points', zorder=5)
@@ -13,6 +13,8 @@
 #   'weld_current'     : 標準5．溶着時の加圧電流 (mA)。大きいほど強く押す。
 #   'gentle_current'   : ゆっくりめ-1，速め10．接触検知時の優しい接触電流 (mA)。　
 #   'weld_time'        : 標準1．超音波を発振する時間 (秒)。
+#   'sheet_lift'       : 省略可．溶着後の退避で、シートの浮き上がりに対して取る余裕 (パルス)。
+#                        省略時は config.RETRACT_SHEET_LIFT_PULSE。
 # ==========================================================================
 
 WELDING_PRESETS = {
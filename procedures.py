@@ -5,6 +5,7 @@ import numpy as np
 import time
 from tkinter import messagebox
 import presets
+from weld_path import as_xy_array
 
 
 def run_homing_sequence(motion_system, sensors):
@@ -45,7 +46,7 @@ def run_tilt_calibration(motion_system, num_points, preset):
         motion_system.log(f"({i + 1}/{num_points}) 点 ({x:.1f}, {y:.1f}) の高さを測定します...")
         motion_system.move_xy_abs(x, y, preset)
 
-        contact_pulse = motion_system.descend_until_contact(preset)
+        contact_pulse, _ = motion_system.descend_until_contact(preset)
 
         if contact_pulse is None:
             motion_system.log("!!! Z軸の位置取得に失敗したため、キャリブレーションを中止します。")
@@ -99,13 +100,11 @@ def run_preview(motion, points, work_origin, preset):
         motion.log("エラー: プレビューする点がありません。")
         return False
 
-    path_x = [p['x'] for p in points]
-    path_y = [p['y'] for p in points]
-
-    min_x_abs = work_origin[0] + min(path_x)
-    max_x_abs = work_origin[0] + max(path_x)
-    min_y_abs = work_origin[1] + min(path_y)
-    max_y_abs = work_origin[1] + max(path_y)
+    xy = as_xy_array(points)
+    min_x_abs = work_origin[0] + float(xy[:, 0].min())
+    max_x_abs = work_origin[0] + float(xy[:, 0].max())
+    min_y_abs = work_origin[1] + float(xy[:, 1].min())
+    max_y_abs = work_origin[1] + float(xy[:, 1].max())
 
     motion.log(f"計算上の加工範囲: X=[{min_x_abs:.2f} ~ {max_x_abs:.2f}], Y=[{min_y_abs:.2f} ~ {max_y_abs:.2f}]")
 
@@ -0,0 +1,66 @@
+# retract_planner.py
+
+"""
+溶着後の Z 退避量の計画。
+従来は一律 200 パルス（次の点まで 20mm 以上なら 500 パルス）退避していたが、
+2mm ピッチでは Z の移動がサイクル時間の大きな割合を占める。ここでは移動ごとに
+  - 現在の Z 位置（加圧後の実測）
+  - 移動経路上の表面の高さ（接触実績・傾斜平面からの予測。経路に沿って数点で見る）
+  - 移動距離（長い移動ほどシートのばたつきに備えて余裕を足す）
+  - プリセットごとの「シートの浮き上がり」余裕 (preset['sheet_lift'])
+から必要な退避量を決める。ただし従来の通常退避量 (RETRACT_MIN_PULSE = 200。100 ではシートを巻き上げる) と、
+XY 移動を始めてよい高さ (Z_XY_CLEARANCE_PULSE) の大きい方より小さくはしない。
+経路上の表面が予測できない場合は None を返し、呼び出し側は従来の退避量を使う。
+"""
+
+import math
+
+import config
+
+
+class RetractPlanner:
+    def __init__(self, predictor, hint_fn=None):
+        """
+        predictor: ContactPredictor（接触実績からの表面高さの予測）
+        hint_fn  : (x_mm, y_mm) -> 傾斜平面から予想した高さ [pulse]（なければ -1）を返す関数
+        """
+        self.predictor = predictor
+        self.hint_fn = hint_fn or (lambda x_mm, y_mm: -1)
+        self.sheet_lift = getattr(config, 'RETRACT_SHEET_LIFT_PULSE', 60)
+        self.per_mm = getattr(config, 'RETRACT_PER_MM_PULSE', 5.0)
+        self.sample_mm = getattr(config, 'RETRACT_SAMPLE_MM', 5.0)
+        # XY 移動は Z が接触位置から Z_XY_CLEARANCE_PULSE 上がってから始めるので、それより小さくはしない
+        self.min_retract = max(getattr(config, 'RETRACT_MIN_PULSE', 200),
+                               getattr(config, 'Z_XY_CLEARANCE_PULSE', 120))
+
+    def _highest_surface(self, from_xy, to_xy):
+        """経路上（始点を除く）で最も高い表面 [pulse]（パルスが小さいほど上）。予測できない点があれば None"""
+        dx = to_xy[0] - from_xy[0]
+        dy = to_xy[1] - from_xy[1]
+        steps = max(1, int(math.ceil(math.hypot(dx, dy) / self.sample_mm)))
+        highest = None
+        for k in range(1, steps + 1):
+            x = from_xy[0] + dx * k / steps
+            y = from_xy[1] + dy * k / steps
+            prediction = self.predictor.predict(x, y, self.hint_fn(x, y))
+            if prediction is None:
+                return None
+            surface = prediction[0]
+            highest = surface if highest is None else min(highest, surface)
+        return highest
+
+    def plan(self, z_pulse, from_xy, to_xy, preset):
+        """
+        退避量 [pulse] を返す。経路上の表面が予測できない場合は None。
+        z_pulse: 現在（加圧後）の Z 位置
+        """
+        surface = self._highest_surface(from_xy, to_xy)
+        if surface is None:
+            return None
+        travel = math.hypot(to_xy[0] - from_xy[0], to_xy[1] - from_xy[1])
+        clearance = preset.get('sheet_lift', self.sheet_lift) + self.per_mm * travel
+        target = min(surface, z_pulse) - clearance
+
+        retract = max(int(math.ceil(z_pulse - target)), self.min_retract)
+        # 上端を越えない
+        return min(retract, z_pulse - config.Z_LIMIT_MIN_PULSE)
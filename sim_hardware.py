@@ -0,0 +1,631 @@
+# sim_hardware.py
+
+"""
+実機なしで動かすための仮想マシン（config.HARDWARE_BACKEND = 'sim' で使う）。
+  - dynamixel_sdk と同じ名前・呼び出し方の PortHandler / PacketHandler / GroupSyncWrite / GroupSyncRead
+    （DynamixelController はそのまま動く）
+  - myADconvert と同じ呼び出し方の ADfunc('DIO') / DIO_ch
+  - 仮想マシン SimMachine: サーボ3軸のモデルと DIO の入出力
+サーボのモデル:
+  - コントロールテーブルをバイト列で持ち、同期読み書き（連続した複数レジスタ）もそのまま扱う
+  - 動作モード 0（電流）/ 1（速度）/ 3・4（位置）/ 5（電流制限付き位置）。モードの変更はトルクOFF時のみ
+  - 位置・速度制御はプロファイル速度・加速度（0 は上限なし）の台形で目標を追う
+  - Z 軸は傾いた平面（SIM_SURFACE）に接触する。接触後はばねとして電流に比例してめり込み、
+    電流制御では電流とばねの力がつり合う位置で止まる。位置制御では電流上限までしか押し込めない
+  - Moving フラグは現在速度が Moving Threshold を超えているか
+  - 1回の送受信ごとに、ボーレートから計算したパケットの転送時間 + USB の遅延 + 応答遅延だけ待つ
+DIO のモデル:
+  - X/Y のリミットスイッチ（原点方向の可動端、HOMING_VELOCITY_SIGN の向き）、非常停止ボタン、フットペダル
+  - 溶着機の出力は ON/OFF の時刻を記録する
+時計:
+  - SimClock は SIM_TIME_SCALE 倍で進む（ベンチマーク用）。time は置き換えず、clock.default_clock() を通して
+    時計を受け取る部品（バス、テレメトリ、完了待ち、原点復帰、DI 走査、溶着タイマー）だけがこの時計で動く。
+    画面・Tk のタイマー等は実時間のまま。
+"""
+
+import math
+import threading
+import time
+
+import config
+from motion_wait import profile_velocity_to_pulses, profile_acceleration_to_pulses
+
+# --- dynamixel_sdk 互換の定数 ---
+COMM_SUCCESS = 0
+COMM_PORT_BUSY = -1000
+COMM_TX_FAIL = -1001
+COMM_RX_TIMEOUT = -3001
+COMM_NOT_AVAILABLE = -9000
+
+ERRNUM_DATA_RANGE = 4
+ERRNUM_ACCESS = 7
+
+_COMM_MESSAGES = {
+    COMM_SUCCESS: "[TxRxResult] Communication success!",
+    COMM_PORT_BUSY: "[TxRxResult] Port is in use!",
+    COMM_TX_FAIL: "[TxRxResult] Failed transmit instruction packet!",
+    COMM_RX_TIMEOUT: "[TxRxResult] There is no status packet!",
+    COMM_NOT_AVAILABLE: "[TxRxResult] Port is not available!",
+}
+
+
+def DXL_LOBYTE(value):
+    return value & 0xFF
+
+
+def DXL_HIBYTE(value):
+    return (value >> 8) & 0xFF
+
+
+def DXL_LOWORD(value):
+    return value & 0xFFFF
+
+
+def DXL_HIWORD(value):
+    return (value >> 16) & 0xFFFF
+
+
+# --- コントロールテーブル（dynamixel_controller と同じアドレス） ---
+ADDR_CURRENT_LIMIT = 38
+ADDR_ACCELERATION_LIMIT = 40
+ADDR_TORQUE_ENABLE = 64
+ADDR_HARDWARE_ERROR_STATUS = 70
+ADDR_OPERATING_MODE = 11
+ADDR_MOVING_THRESHOLD = 24
+ADDR_GOAL_CURRENT = 102
+ADDR_GOAL_VELOCITY = 104
+ADDR_PROFILE_ACCELERATION = 108
+ADDR_PROFILE_VELOCITY = 112
+ADDR_GOAL_POSITION = 116
+ADDR_MOVING = 122
+ADDR_PRESENT_CURRENT = 126
+ADDR_PRESENT_VELOCITY = 128
+ADDR_PRESENT_POSITION = 132
+TABLE_SIZE = 1024
+
+CURRENT_UNIT_MA = 2.69
+MODEL_NUMBER = 1020  # XM430-W350
+
+# プロトコル 2.0 のパケット長（パラメータを除く）
+_INSTRUCTION_OVERHEAD = 10  # ヘッダ4 + ID + 長さ2 + 命令 + CRC2
+_STATUS_OVERHEAD = 11  # 上記 + エラー
+
+
+# ======================================================================
+# 時計
+# ======================================================================
+class SimClock:
+    """実時間の scale 倍で進む時計（clock.SystemClock と同じ呼び出し方）"""
+
+    def __init__(self, scale=1.0):
+        self.scale = float(scale)
+        self._base = time.monotonic()
+        self._perf_base = time.perf_counter()
+
+    def _elapsed(self):
+        return (time.monotonic() - self._base) * self.scale
+
+    def monotonic(self):
+        return self._base + self._elapsed()
+
+    def perf_counter(self):
+        return self._perf_base + (time.perf_counter() - self._perf_base) * self.scale
+
+    def sleep(self, seconds):
+        time.sleep(max(seconds, 0.0) / self.scale)
+
+    def wait(self, waitable, timeout=None):
+        """Event / Condition の wait(timeout)。timeout をこの時計の時間として待つ"""
+        return waitable.wait(None if timeout is None else max(timeout, 0.0) / self.scale)
+
+
+# ======================================================================
+# サーボのモデル
+# ======================================================================
+class SimServo:
+    def __init__(self, dxl_id, axis, position):
+        self.dxl_id = dxl_id
+        self.axis = axis
+        self.table = bytearray(TABLE_SIZE)
+        self.position = float(position)  # 実際の位置 [pulse]
+        self.velocity = 0.0  # 実際の速度 [pulse/s]
+        self.current_ma = 0.0
+        self.profile_position = float(position)  # プロファイル（指令）上の位置
+        self.profile_velocity = 0.0
+        self.contact = False
+        self._write(ADDR_OPERATING_MODE, 1, 3 if axis == 'z' else 4)
+        self._write(ADDR_CURRENT_LIMIT, 2, getattr(config, 'SIM_CURRENT_LIMIT_RAW', 1193))
+        self._write(ADDR_MOVING_THRESHOLD, 4, 10)
+        self._write(ADDR_GOAL_POSITION, 4, int(position))
+        self._store_present()
+
+    # --- レジスタ ---
+    def _read(self, address, length, signed=True):
+        return int.from_bytes(self.table[address:address + length], 'little', signed=signed)
+
+    def _write(self, address, length, value):
+        self.table[address:address + length] = (int(value) & ((1 << (8 * length)) - 1)).to_bytes(length, 'little')
+
+    @property
+    def torque(self):
+        return self.table[ADDR_TORQUE_ENABLE] == 1
+
+    @property
+    def mode(self):
+        return self.table[ADDR_OPERATING_MODE]
+
+    def write_bytes(self, address, data):
+        """戻り値: エラー番号（0 は成功）"""
+        if address + len(data) > TABLE_SIZE:
+            return ERRNUM_DATA_RANGE
+        if address <= ADDR_OPERATING_MODE < address + len(data) and self.torque:
+            # EEPROM 領域はトルクON中は書き込めない
+            return ERRNUM_ACCESS
+        was_torque = self.torque
+        self.table[address:address + len(data)] = bytes(data)
+        if address <= ADDR_TORQUE_ENABLE < address + len(data) and self.torque and not was_torque:
+            # トルクON時は今の位置を保持する
+            self._write(ADDR_GOAL_POSITION, 4, int(round(self.position)))
+            self._write(ADDR_GOAL_VELOCITY, 4, 0)
+            self.profile_position = self.position
+            self.profile_velocity = 0.0
+        return 0
+
+    def read_bytes(self, address, length):
+        self._store_present()
+        return bytes(self.table[address:address + length])
+
+    def _store_present(self):
+        velocity_raw = int(round(self.velocity / profile_velocity_to_pulses(1)))
+        self._write(ADDR_PRESENT_POSITION, 4, int(round(self.position)))
+        self._write(ADDR_PRESENT_VELOCITY, 4, velocity_raw)
+        self._write(ADDR_PRESENT_CURRENT, 2, int(round(self.current_ma / CURRENT_UNIT_MA)))
+        moving = abs(velocity_raw) > self._read(ADDR_MOVING_THRESHOLD, 4)
+        self.table[ADDR_MOVING] = 1 if moving else 0
+
+    # --- 運動 ---
+    def _profile_limits(self):
+        velocity = self._read(ADDR_PROFILE_VELOCITY, 4, signed=False)
+        acceleration = self._read(ADDR_PROFILE_ACCELERATION, 4, signed=False)
+        v_max = profile_velocity_to_pulses(velocity) if velocity else getattr(config, 'SIM_MAX_VELOCITY_PULSE', 20000)
+        a_max = (profile_acceleration_to_pulses(acceleration) if acceleration
+                 else getattr(config, 'SIM_MAX_ACCELERATION_PULSE', 200000))
+        return v_max, a_max
+
+    def _current_limit_ma(self):
+        limit = self._read(ADDR_CURRENT_LIMIT, 2) * CURRENT_UNIT_MA
+        if self.mode == 5:
+            return min(limit, abs(self._read(ADDR_GOAL_CURRENT, 2)) * CURRENT_UNIT_MA)
+        return limit
+
+    def _track_position(self, goal, dt):
+        """プロファイル位置を目標へ台形で進める"""
+        v_max, a_max = self._profile_limits()
+        distance = goal - self.profile_position
+        desired = math.copysign(min(v_max, math.sqrt(2.0 * a_max * abs(distance))), distance)
+        dv = max(-a_max * dt, min(a_max * dt, desired - self.profile_velocity))
+        self.profile_velocity += dv
+        step = self.profile_velocity * dt
+        if abs(distance) < 0.5 or (step * distance > 0 and abs(step) >= abs(distance)):
+            # 到着
+            self.profile_position = float(goal)
+            self.profile_velocity = 0.0
+        else:
+            self.profile_position += step
+
+    def _track_velocity(self, goal_velocity, dt):
+        _, a_max = self._profile_limits()
+        dv = max(-a_max * dt, min(a_max * dt, goal_velocity - self.profile_velocity))
+        self.profile_velocity += dv
+        self.profile_position += self.profile_velocity * dt
+
+    def step(self, dt, surface=None, stops=(None, None)):
+        """
+        dt 秒だけ進める。surface: 接触面の位置 [pulse]（これより大きいパルスで接触、None は接触なし）
+        stops: (下端, 上端) の機械的な可動端 [pulse]
+        """
+        previous = self.position
+        stiffness = getattr(config, 'SIM_CONTACT_STIFFNESS_MA_PER_PULSE', 0.5)
+        if not self.torque:
+            self.profile_position = self.position
+            self.profile_velocity = 0.0
+            self.current_ma = 0.0
+            self.velocity = 0.0
+            self._store_present()
+            return
+
+        mode = self.mode
+        if mode == 0:
+            # 電流制御: 電流に比例した速度で動き、接触中はばねの力とつり合う位置で止まる
+            current = self._read(ADDR_GOAL_CURRENT, 2) * CURRENT_UNIT_MA
+            penetration = max(0.0, self.position - surface) if surface is not None else 0.0
+            force = current - stiffness * penetration
+            gain = getattr(config, 'SIM_CURRENT_VELOCITY_GAIN', 100.0)
+            friction = getattr(config, 'SIM_FRICTION_MA', 1.0)
+            if abs(force) <= friction:
+                velocity = 0.0
+            else:
+                velocity = gain * (force - math.copysign(friction, force))
+            # つり合いを越えないようにする
+            new_position = self.position + velocity * dt
+            if surface is not None and current >= 0 and velocity > 0:
+                new_position = min(new_position, surface + max(current - friction, 0.0) / stiffness)
+            self.position = new_position
+            self.profile_position = self.position
+            self.current_ma = current
+        else:
+            if mode == 1:
+                goal_velocity = self._read(ADDR_GOAL_VELOCITY, 4) * profile_velocity_to_pulses(1)
+                self._track_velocity(goal_velocity, dt)
+            else:
+                self._track_position(self._read(ADDR_GOAL_POSITION, 4), dt)
+            position = self.profile_position
+            current = 0.0
+            if surface is not None and position > surface:
+                # 接触面より下へは電流上限までしか押し込めない
+                blocked = surface + self._current_limit_ma() / stiffness
+                position = min(position, blocked)
+                current = stiffness * (position - surface)
+            self.position = position
+            self.current_ma = current
+
+        low, high = stops
+        clamped = None
+        if low is not None and self.position < low:
+            clamped = low
+        if high is not None and self.position > high:
+            clamped = high
+        if clamped is not None:
+            # 機械的な可動端に当たったら止まる
+            self.position = float(clamped)
+            self.profile_position = self.position
+            self.profile_velocity = 0.0
+        self.contact = surface is not None and self.position > surface
+        self.velocity = (self.position - previous) / dt if dt > 0 else 0.0
+        self._store_present()
+
+
+# ======================================================================
+# 仮想マシン
+# ======================================================================
+class SimMachine:
+    def __init__(self, clock=None):
+        self.clock = clock or SimClock(getattr(config, 'SIM_TIME_SCALE', 1.0))
+        self._lock = threading.RLock()
+        self.baudrate = config.DXL_BAUDRATE
+        self.usb_latency = getattr(config, 'SIM_USB_LATENCY_SEC', 0.001)
+        self.return_delay = getattr(config, 'SIM_RETURN_DELAY_SEC', 0.0005)
+        self.step_sec = getattr(config, 'SIM_STEP_SEC', 0.001)
+
+        self.pulses_per_mm = {'x': config.PULSES_PER_MM_X, 'y': config.PULSES_PER_MM_Y}
+        self.homing_sign = {axis: config.HOMING_VELOCITY_SIGN.get(axis, -1) for axis in ('x', 'y')}
+        self.limit_pulse = dict(getattr(config, 'SIM_LIMIT_PULSE', {'x': 40000, 'y': 20000}))
+        self.overtravel = getattr(config, 'SIM_LIMIT_OVERTRAVEL_PULSE', 300)
+        surface = getattr(config, 'SIM_SURFACE', {})
+        self.surface_z = surface.get('z_pulse', 2300)
+        self.surface_tilt = (surface.get('tilt_x', 0.0), surface.get('tilt_y', 0.0))
+
+        start = getattr(config, 'SIM_START_MM', {'x': 50.0, 'y': 50.0})
+        self.servos = {}
+        for axis, dxl_id in config.DXL_IDS.items():
+            if axis == 'z':
+                position = config.SAFE_Z_PULSE
+            else:
+                position = self._mm_to_raw(axis, start.get(axis, 0.0))
+            self.servos[dxl_id] = SimServo(dxl_id, axis, position)
+        self._ids = {axis: dxl_id for axis, dxl_id in config.DXL_IDS.items()}
+
+        # DIO: 入力名 -> (ピン, active_low)、手動で操作する入力の状態、出力
+        self.inputs = {'limit_x': (config.LIMIT_SWITCH_X_PIN, True),
+                       'limit_y': (config.LIMIT_SWITCH_Y_PIN, True),
+                       'emergency': (config.EMERGENCY_STOP_PIN, True),
+                       'foot_pedal': (config.FOOT_PEDAL_PIN, False)}
+        self.manual_inputs = {'emergency': False, 'foot_pedal': False}
+        self.outputs = {}
+        self.welder_events = []  # (時刻, 0/1)
+
+        self.transactions = 0
+        self.bus_time = 0.0  # 送受信に使った時間の合計 [s]
+        self._last_update = self.clock.monotonic()
+
+    # --- 座標 ---
+    def _mm_to_raw(self, axis, mm):
+        """原点（リミットスイッチ）から mm 離れた位置の生パルス"""
+        return self.limit_pulse[axis] - self.homing_sign[axis] * mm * self.pulses_per_mm[axis]
+
+    def _raw_to_mm(self, axis, raw):
+        return (self.limit_pulse[axis] - raw) * self.homing_sign[axis] / self.pulses_per_mm[axis]
+
+    def position_mm(self):
+        """リミットスイッチ位置を原点とした X/Y [mm]"""
+        with self._lock:
+            self.advance()
+            return tuple(self._raw_to_mm(axis, self.servos[self._ids[axis]].position) for axis in ('x', 'y'))
+
+    def surface_pulse(self, x_mm, y_mm):
+        """(x, y) [mm] の接触面の Z 位置 [pulse]（パルスが大きいほど下）"""
+        return self.surface_z + self.surface_tilt[0] * x_mm + self.surface_tilt[1] * y_mm
+
+    def set_surface(self, z_pulse, tilt_x=0.0, tilt_y=0.0):
+        """接触面を設定する。tilt_x / tilt_y: 1mm あたりの Z の変化 [pulse]"""
+        with self._lock:
+            self.surface_z = z_pulse
+            self.surface_tilt = (tilt_x, tilt_y)
+
+    # --- 時間を進める ---
+    def advance(self):
+        now = self.clock.monotonic()
+        with self._lock:
+            elapsed = now - self._last_update
+            if elapsed <= 0:
+                return
+            self._last_update = now
+            steps = max(1, int(math.ceil(elapsed / self.step_sec)))
+            dt = elapsed / steps
+            x_servo = self.servos[self._ids['x']]
+            y_servo = self.servos[self._ids['y']]
+            z_servo = self.servos[self._ids['z']]
+            stops = {}
+            for axis in ('x', 'y'):
+                end = self.limit_pulse[axis] + self.homing_sign[axis] * self.overtravel
+                stops[axis] = (None, end) if self.homing_sign[axis] > 0 else (end, None)
+            z_stops = (config.Z_LIMIT_MIN_PULSE - self.overtravel, config.Z_LIMIT_MAX_PULSE + self.overtravel)
+            for _ in range(steps):
+                x_servo.step(dt, stops=stops['x'])
+                y_servo.step(dt, stops=stops['y'])
+                surface = self.surface_pulse(self._raw_to_mm('x', x_servo.position),
+                                             self._raw_to_mm('y', y_servo.position))
+                z_servo.step(dt, surface=surface, stops=z_stops)
+
+    # --- Dynamixel バス ---
+    def transfer(self, tx_bytes, rx_bytes, responders):
+        """1回の送受信にかかる時間だけ待つ（パケットの転送 + USB の遅延 + サーボの応答遅延）"""
+        duration = (tx_bytes + rx_bytes) * 10.0 / self.baudrate + self.usb_latency + self.return_delay * responders
+        self.transactions += 1
+        self.bus_time += duration
+        self.clock.sleep(duration)
+
+    def servo(self, dxl_id):
+        return self.servos.get(dxl_id)
+
+    def write(self, dxl_id, address, data):
+        with self._lock:
+            self.advance()
+            return self.servos[dxl_id].write_bytes(address, data)
+
+    def read(self, dxl_id, address, length):
+        with self._lock:
+            self.advance()
+            return self.servos[dxl_id].read_bytes(address, length)
+
+    # --- DIO ---
+    def input_active(self, name):
+        with self._lock:
+            if name in self.manual_inputs:
+                return self.manual_inputs[name]
+            axis = name[-1]
+            self.advance()
+            position = self.servos[self._ids[axis]].position
+            return self.homing_sign[axis] * (position - self.limit_pulse[axis]) >= 0
+
+    def read_di(self, pin):
+        """ピン pin の入力レベル (0/1)。同じピンの入力のいずれかがアクティブならアクティブのレベル"""
+        level = None
+        for name, (input_pin, active_low) in self.inputs.items():
+            if input_pin != pin:
+                continue
+            active = self.input_active(name)
+            value = (0 if active else 1) if active_low else (1 if active else 0)
+            if level is None or active:
+                level = value
+        return 1 if level is None else level
+
+    def write_do(self, pin, value):
+        with self._lock:
+            self.outputs[pin] = value
+            if pin == config.WELDER_PIN:
+                self.welder_events.append((self.clock.monotonic(), 1 if value else 0))
+
+    @property
+    def welder_on(self):
+        return bool(self.outputs.get(config.WELDER_PIN, 0))
+
+    def press(self, name):
+        """非常停止ボタン ('emergency') / フットペダル ('foot_pedal') を押す"""
+        with self._lock:
+            self.manual_inputs[name] = True
+
+    def release(self, name):
+        with self._lock:
+            self.manual_inputs[name] = False
+
+
+_machine = None
+_machine_lock = threading.Lock()
+
+
+def get_machine():
+    """プロセスで1台の仮想マシン（最初の呼び出しで作る）"""
+    global _machine
+    with _machine_lock:
+        if _machine is None:
+            _machine = SimMachine()
+        return _machine
+
+
+# ======================================================================
+# dynamixel_sdk 互換
+# ======================================================================
+class PortHandler:
+    def __init__(self, port_name):
+        self.port_name = port_name
+        self.is_open = False
+        self.machine = get_machine()
+
+    def openPort(self):
+        self.is_open = True
+        return True
+
+    def closePort(self):
+        self.is_open = False
+
+    def setBaudRate(self, baudrate):
+        self.machine.baudrate = baudrate
+        return True
+
+    def getBaudRate(self):
+        return self.machine.baudrate
+
+
+class PacketHandler:
+    def __init__(self, protocol_version=2.0):
+        self.protocol_version = protocol_version
+
+    def getTxRxResult(self, result):
+        return _COMM_MESSAGES.get(result, f"[TxRxResult] Unknown error ({result})")
+
+    def getRxPacketError(self, error):
+        if error == ERRNUM_ACCESS:
+            return "[RxPacketError] Writing or Reading is not available to target address!"
+        if error == ERRNUM_DATA_RANGE:
+            return "[RxPacketError] The data value exceeds the limit value!"
+        return f"[RxPacketError] Unknown error code ({error})!"
+
+    @staticmethod
+    def _timeout(port):
+        # 応答がない: 受信タイムアウトまで待つ
+        port.machine.transfer(_INSTRUCTION_OVERHEAD, 0, 0)
+        port.machine.clock.sleep(getattr(config, 'SIM_RX_TIMEOUT_SEC', 0.02))
+
+    def ping(self, port, dxl_id):
+        if port.machine.servo(dxl_id) is None:
+            self._timeout(port)
+            return 0, COMM_RX_TIMEOUT, 0
+        port.machine.transfer(_INSTRUCTION_OVERHEAD, _STATUS_OVERHEAD + 3, 1)
+        return MODEL_NUMBER, COMM_SUCCESS, 0
+
+    def _write(self, port, dxl_id, address, length, value):
+        if port.machine.servo(dxl_id) is None:
+            self._timeout(port)
+            return COMM_RX_TIMEOUT, 0
+        port.machine.transfer(_INSTRUCTION_OVERHEAD + 2 + length, _STATUS_OVERHEAD, 1)
+        data = (int(value) & ((1 << (8 * length)) - 1)).to_bytes(length, 'little')
+        return COMM_SUCCESS, port.machine.write(dxl_id, address, data)
+
+    def _read(self, port, dxl_id, address, length):
+        if port.machine.servo(dxl_id) is None:
+            self._timeout(port)
+            return 0, COMM_RX_TIMEOUT, 0
+        port.machine.transfer(_INSTRUCTION_OVERHEAD + 4, _STATUS_OVERHEAD + length, 1)
+        # SDK と同じく符号なしで返す
+        return int.from_bytes(port.machine.read(dxl_id, address, length), 'little'), COMM_SUCCESS, 0
+
+    def write1ByteTxRx(self, port, dxl_id, address, value):
+        return self._write(port, dxl_id, address, 1, value)
+
+    def write2ByteTxRx(self, port, dxl_id, address, value):
+        return self._write(port, dxl_id, address, 2, value)
+
+    def write4ByteTxRx(self, port, dxl_id, address, value):
+        return self._write(port, dxl_id, address, 4, value)
+
+    def read1ByteTxRx(self, port, dxl_id, address):
+        return self._read(port, dxl_id, address, 1)
+
+    def read2ByteTxRx(self, port, dxl_id, address):
+        return self._read(port, dxl_id, address, 2)
+
+    def read4ByteTxRx(self, port, dxl_id, address):
+        return self._read(port, dxl_id, address, 4)
+
+
+class GroupSyncWrite:
+    def __init__(self, port, ph, start_address, data_length):
+        self.port = port
+        self.start_address = start_address
+        self.data_length = data_length
+        self.data = {}
+
+    def addParam(self, dxl_id, data):
+        if dxl_id in self.data or len(data) != self.data_length:
+            return False
+        self.data[dxl_id] = bytes(data)
+        return True
+
+    def clearParam(self):
+        self.data.clear()
+
+    def txPacket(self):
+        if not self.data:
+            return COMM_NOT_AVAILABLE
+        machine = self.port.machine
+        machine.transfer(_INSTRUCTION_OVERHEAD + 4 + len(self.data) * (1 + self.data_length), 0, 0)
+        for dxl_id, data in self.data.items():
+            if machine.servo(dxl_id) is not None:
+                machine.write(dxl_id, self.start_address, data)
+        return COMM_SUCCESS
+
+
+class GroupSyncRead:
+    def __init__(self, port, ph, start_address, data_length):
+        self.port = port
+        self.start_address = start_address
+        self.data_length = data_length
+        self.ids = []
+        self.data = {}
+
+    def addParam(self, dxl_id):
+        if dxl_id in self.ids:
+            return False
+        self.ids.append(dxl_id)
+        return True
+
+    def clearParam(self):
+        self.ids = []
+        self.data = {}
+
+    def txRxPacket(self):
+        if not self.ids:
+            return COMM_NOT_AVAILABLE
+        machine = self.port.machine
+        present = [dxl_id for dxl_id in self.ids if machine.servo(dxl_id) is not None]
+        machine.transfer(_INSTRUCTION_OVERHEAD + 4 + len(self.ids),
+                         len(present) * (_STATUS_OVERHEAD + self.data_length), len(present))
+        self.data = {dxl_id: machine.read(dxl_id, self.start_address, self.data_length) for dxl_id in present}
+        if len(present) != len(self.ids):
+            machine.clock.sleep(getattr(config, 'SIM_RX_TIMEOUT_SEC', 0.02))
+            return COMM_RX_TIMEOUT
+        return COMM_SUCCESS
+
+    def isAvailable(self, dxl_id, address, data_length):
+        return (dxl_id in self.data and address >= self.start_address
+                and address + data_length <= self.start_address + self.data_length)
+
+    def getData(self, dxl_id, address, data_length):
+        if not self.isAvailable(dxl_id, address, data_length):
+            return 0
+        offset = address - self.start_address
+        return int.from_bytes(self.data[dxl_id][offset:offset + data_length], 'little')
+
+
+# ======================================================================
+# myADconvert 互換 (DIO)
+# ======================================================================
+def DIO_ch(pin):
+    return pin
+
+
+class ADfunc:
+    def __init__(self, kind='DIO'):
+        self.kind = kind
+        self.machine = get_machine()
+
+    def init(self, device_name):
+        print(f"  [SIM] 仮想 DIO '{device_name}' を使用します。")
+        return True
+
+    def read(self, channel, AI_DI='DI'):
+        return self.machine.read_di(channel)
+
+    def write(self, channel, value, AO_DO='DO'):
+        self.machine.write_do(channel, value)
@@ -0,0 +1,286 @@
+# telemetry.py
+
+"""
+モーター状態のテレメトリ。
+専用スレッドが一定周期で全軸の
+Moving / Present Current / Present Velocity / Present Position を1パケットで同期読み取りし、
+数サイクルに1回 Hardware Error Status も読んでリングバッファに書き込む。
+接触検知・押し付け安定判定・UI表示などの読み手はバスに触れずに、このバッファを参照する。
+周期はボーレートと軸数から見積もった読み取り時間が、バスの TELEMETRY_BUS_SHARE 以下になるように決める
+（57600bps・3軸では 1回約 18ms なので約 13Hz。上限は TELEMETRY_RATE_HZ）。
+押し付け中など速いサンプルが要る間は focus(軸) で、その軸だけを速い周期で読む。
+サンプルの時刻は読み取りの要求を出した時刻（読み終わった時刻ではない）。
+
+リングバッファは書き手が1スレッドだけなのでロックを使わない。
+読み手は書き込み済みサンプル数 _count をコピー前後で確認し、
+コピー中に上書きされた可能性のあるサンプルを捨てる（seqlock 方式）。
+"""
+
+import contextlib
+import threading
+
+import numpy as np
+
+import config
+from dxl_bus import PRIORITY_TELEMETRY
+
+
+# Moving(122) 〜 Present Position(132..135) の長さ
+STATE_LENGTH = 14
+
+
+def estimate_sync_read_time(n_ids, length, baudrate=None):
+    """
+    同期読み取り1回の所要時間の見積もり [s]。
+    プロトコル 2.0 の命令パケット (14 + 軸数) と各軸の応答 (11 + length) の転送時間 + 往復の遅延
+    """
+    baudrate = baudrate or config.DXL_BAUDRATE
+    n_bytes = (14 + n_ids) + n_ids * (11 + length)
+    return n_bytes * 10.0 / baudrate + getattr(config, 'TELEMETRY_LINK_LATENCY_SEC', 0.002)
+
+
+class TelemetrySample:
+    """1サンプル分の状態。軸の値は {dxl_id: 値} で持つ"""
+    __slots__ = ('t', 'position', 'current', 'velocity', 'moving', 'hardware_error')
+
+    def __init__(self, t, position, current, velocity, moving, hardware_error):
+        self.t = t
+        self.position = position
+        self.current = current
+        self.velocity = velocity
+        self.moving = moving
+        self.hardware_error = hardware_error
+
+    def __repr__(self):
+        return f"TelemetrySample(t={self.t:.3f}, position={self.position}, moving={self.moving})"
+
+
+class TelemetryHistory:
+    """時間窓で切り出した履歴。各配列は (サンプル数, 軸数)、t は (サンプル数,)"""
+    __slots__ = ('ids', 't', 'position', 'current', 'velocity', 'moving', 'hardware_error')
+
+    def __init__(self, ids, t, position, current, velocity, moving, hardware_error):
+        self.ids = ids
+        self.t = t
+        self.position = position
+        self.current = current
+        self.velocity = velocity
+        self.moving = moving
+        self.hardware_error = hardware_error
+
+    def __len__(self):
+        return len(self.t)
+
+    def column(self, dxl_id):
+        """軸の列番号"""
+        return self.ids.index(dxl_id)
+
+
+class TelemetryService:
+    """
+    DynamixelController の状態を一定周期で読み続けるサービス。
+    時刻は dxl.clock の monotonic() 基準。読み取りに失敗した軸の値は -1（hardware_error は未取得でも -1）。
+    """
+
+    def __init__(self, dxl, dxl_ids, rate_hz=None, history_sec=None, log_callback=print):
+        self.dxl = dxl
+        self.clock = dxl.clock
+        self.ids = tuple(dxl_ids)
+        self.log = log_callback
+        self.bus_share = getattr(config, 'TELEMETRY_BUS_SHARE', 0.25)
+        self.rate_hz = rate_hz or self._derive_rate(len(self.ids), self.bus_share,
+                                                    getattr(config, 'TELEMETRY_RATE_HZ', 50))
+        self.focus_share = getattr(config, 'TELEMETRY_FOCUS_BUS_SHARE', 0.8)
+        self.focus_max_rate_hz = getattr(config, 'TELEMETRY_FOCUS_RATE_HZ', 200)
+        self.error_every = max(1, getattr(config, 'TELEMETRY_ERROR_EVERY', 25))
+        history_sec = history_sec or getattr(config, 'TELEMETRY_HISTORY_SEC', 5.0)
+        fastest = max(self.rate_hz, self._derive_rate(1, self.focus_share, self.focus_max_rate_hz))
+        self.capacity = max(2, int(fastest * history_sec))
+
+        n = len(self.ids)
+        self._t = np.zeros(self.capacity, dtype=np.float64)
+        self._position = np.full((self.capacity, n), -1, dtype=np.int64)
+        self._current = np.full((self.capacity, n), -1, dtype=np.int32)
+        self._velocity = np.full((self.capacity, n), -1, dtype=np.int32)
+        self._moving = np.zeros((self.capacity, n), dtype=np.bool_)
+        self._hardware_error = np.full((self.capacity, n), -1, dtype=np.int16)
+        self._count = 0  # 書き込み済みサンプル総数（書き手だけが増やす）
+        self._last_error = np.full(n, -1, dtype=np.int16)
+
+        self._thread = None
+        self._running = False
+        self._wake = threading.Condition()
+        self._focus = []  # focus() 中の軸のタプル（入れ子は最後のものが有効）
+        self._focus_lock = threading.Lock()
+        self._focus_changed = threading.Event()
+
+    @staticmethod
+    def _derive_rate(n_ids, share, max_rate_hz):
+        """読み取り時間がバスの share 以下になる周期 [Hz]（max_rate_hz が上限）"""
+        return min(float(max_rate_hz), share / estimate_sync_read_time(n_ids, STATE_LENGTH))
+
+    # --- スレッド管理 ---
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="dxl-telemetry", daemon=True)
+        self._thread.start()
+        self.log(f"  [Telemetry] 状態監視を開始しました ({self.rate_hz:.1f} Hz, "
+                 f"バス使用率 約{self.rate_hz * estimate_sync_read_time(len(self.ids), STATE_LENGTH) * 100:.0f}%)")
+
+    def stop(self, timeout=1.0):
+        if not self._running:
+            return
+        self._running = False
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._running
+
+    # --- 速いサンプルが要る間だけ、一部の軸を速い周期で読む ---
+    @contextlib.contextmanager
+    def focus(self, dxl_ids):
+        """
+        with の間は dxl_ids だけを速い周期（バスの TELEMETRY_FOCUS_BUS_SHARE まで）で読む。
+        その間、他の軸の値は -1（読んでいない）になる。
+        """
+        dxl_ids = tuple(dxl_ids)
+        with self._focus_lock:
+            self._focus.append(dxl_ids)
+        self._focus_changed.set()
+        try:
+            yield self
+        finally:
+            with self._focus_lock:
+                self._focus.remove(dxl_ids)
+            self._focus_changed.set()
+
+    def _current_targets(self):
+        """(今読む軸, 周期 [Hz], 全軸か)"""
+        with self._focus_lock:
+            ids = self._focus[-1] if self._focus else None
+        if ids is None:
+            return self.ids, self.rate_hz, True
+        return ids, self._derive_rate(len(ids), self.focus_share, self.focus_max_rate_hz), False
+
+    def _run(self):
+        next_time = self.clock.monotonic()
+        cycle = 0
+        while self._running:
+            ids, rate_hz, all_ids = self._current_targets()
+            try:
+                self._poll(ids, all_ids and cycle % self.error_every == 0)
+            except Exception as e:
+                # 緊急停止中・切断処理中なども含め、監視は止めずに次の周期で再試行する
+                self.log(f"  [Telemetry] 警告: 状態の読み取りに失敗しました - {e}")
+            if all_ids:
+                cycle += 1
+
+            next_time += 1.0 / rate_hz
+            delay = next_time - self.clock.monotonic()
+            if delay > 0:
+                # focus の開始・終了ではすぐに周期を切り替える
+                if self.clock.wait(self._focus_changed, delay):
+                    self._focus_changed.clear()
+                    next_time = self.clock.monotonic()
+            else:
+                next_time = self.clock.monotonic()  # 周期に間に合わなかったら位相を取り直す
+
+    def _poll(self, ids, read_error):
+        bus = self.dxl.bus
+        state = bus.call(self.dxl.sync_read_state, ids, priority=PRIORITY_TELEMETRY)
+        if read_error:
+            errors = bus.call(self.dxl.sync_read_hardware_error, self.ids, priority=PRIORITY_TELEMETRY)
+            for col, dxl_id in enumerate(self.ids):
+                self._last_error[col] = errors.get(dxl_id, -1)
+        # 時刻は読み取りの要求を出した時刻
+        stamps = [s['t'] for s in state.values() if s is not None]
+        self._write(stamps[0] if stamps else self.clock.monotonic(), state)
+
+    def _write(self, t, state):
+        i = self._count % self.capacity
+        for col, dxl_id in enumerate(self.ids):
+            s = state.get(dxl_id)
+            if s is None:
+                self._position[i, col] = -1
+                self._current[i, col] = -1
+                self._velocity[i, col] = -1
+                self._moving[i, col] = False
+            else:
+                self._position[i, col] = s['position']
+                self._current[i, col] = s['current']
+                self._velocity[i, col] = s['velocity']
+                self._moving[i, col] = s['moving']
+        self._hardware_error[i] = self._last_error
+        self._t[i] = t
+        self._count += 1  # サンプルを書き終えてから公開する
+        with self._wake:
+            self._wake.notify_all()
+
+    # --- 読み手 ---
+    def latest(self):
+        """最新サンプルを返す（まだ無ければ None）"""
+        while True:
+            count = self._count
+            if count == 0:
+                return None
+            i = (count - 1) % self.capacity
+            sample = TelemetrySample(
+                float(self._t[i]),
+                dict(zip(self.ids, self._position[i].tolist())),
+                dict(zip(self.ids, self._current[i].tolist())),
+                dict(zip(self.ids, self._velocity[i].tolist())),
+                dict(zip(self.ids, self._moving[i].tolist())),
+                dict(zip(self.ids, self._hardware_error[i].tolist())),
+            )
+            # コピー中に同じ枠が上書きされていなければ有効
+            if self._count - count < self.capacity - 1:
+                return sample
+
+    def latest_position(self, dxl_id, max_age=None):
+        """最新の実測位置 [pulse]。未取得・読み取り失敗・max_age 秒より古い場合は -1"""
+        sample = self.latest()
+        if sample is None:
+            return -1
+        if max_age is not None and self.clock.monotonic() - sample.t > max_age:
+            return -1
+        return sample.position.get(dxl_id, -1)
+
+    def history(self, seconds):
+        """直近 seconds 秒のサンプルを古い順に返す"""
+        while True:
+            count = self._count
+            n = min(count, self.capacity - 1)
+            idx = np.arange(count - n, count) % self.capacity
+            t = self._t[idx]
+            position = self._position[idx]
+            current = self._current[idx]
+            velocity = self._velocity[idx]
+            moving = self._moving[idx]
+            hardware_error = self._hardware_error[idx]
+            # コピー中に書き手が1周して古い側の枠を上書きしていたらやり直す
+            if self._count - count < self.capacity - n:
+                break
+
+        if n:
+            keep = t >= t[-1] - seconds
+            t, position, current, velocity = t[keep], position[keep], current[keep], velocity[keep]
+            moving, hardware_error = moving[keep], hardware_error[keep]
+        return TelemetryHistory(self.ids, t, position, current, velocity, moving, hardware_error)
+
+    def wait_for_sample(self, after, timeout=1.0):
+        """時刻 after（monotonic）より後に取得されたサンプルを待って返す。タイムアウトなら None"""
+        deadline = self.clock.monotonic() + timeout
+        while True:
+            sample = self.latest()
+            if sample is not None and sample.t > after:
+                return sample
+            remaining = deadline - self.clock.monotonic()
+            if remaining <= 0 or not self._running:
+                return None
+            with self._wake:
+                self.clock.wait(self._wake, min(remaining, 2.0 / self.rate_hz))
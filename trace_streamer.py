@@ -0,0 +1,207 @@
+# trace_streamer.py
+
+"""
+経路トレース（詳細プレビュー）用の目標位置ストリーミング。
+従来は点ごとに move_xy_continuous を呼び、2ms ごとに現在位置を読みながら
+3mm 手前まで待っていたため、バスが読み取りで埋まり、点ごとに加減速していた。
+ここでは
+  1. 経路を弧長で等間隔に再サンプリングし、全点のパルスを先に計算しておく
+  2. 経路に沿った進み s を台形の速度計画（角・終点の手前で減速）で時刻ごとに進め、
+     一定周期で s より少し先（先読み窓: 速度 × TRACE_LOOKAHEAD_SEC）の点を目標位置として書き込む
+  3. 現在位置は安全確認のために低い頻度でだけ読み、計画から大きく遅れていたら止める
+所要時間はほぼ「経路長 / プレビュー速度」になる。
+"""
+
+import math
+
+import numpy as np
+
+import config
+from motion_wait import profile_velocity_to_pulses, profile_acceleration_to_pulses
+
+
+def resample_path(xy, spacing_mm):
+    """
+    折れ線 (N,2) [mm] を弧長で等間隔に再サンプリングする。
+    戻り値: (点 (M,2), 各点の弧長 (M,), 全長)。長さ 0 の区間は除く
+    """
+    xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+    if len(xy) > 1:
+        step = np.hypot(*np.diff(xy, axis=0).T)
+        xy = xy[np.concatenate(([True], step > 1e-9))]
+    if len(xy) < 2:
+        return xy.copy(), np.zeros(len(xy)), 0.0
+
+    arc = np.concatenate(([0.0], np.cumsum(np.hypot(*np.diff(xy, axis=0).T))))
+    length = float(arc[-1])
+    count = max(2, int(math.ceil(length / spacing_mm)) + 1)
+    s = np.linspace(0.0, length, count)
+    points = np.column_stack((np.interp(s, arc, xy[:, 0]), np.interp(s, arc, xy[:, 1])))
+    return points, s, length
+
+
+def corner_speed_limits(xy, speed, corner_deg):
+    """
+    元の頂点のうち、向きが corner_deg 以上変わる角の (弧長, 許容速度) を返す。
+    許容速度は曲がる角度が大きいほど小さくする（180°の折り返しで 0）。
+    """
+    xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+    if len(xy) > 1:
+        step = np.hypot(*np.diff(xy, axis=0).T)
+        xy = xy[np.concatenate(([True], step > 1e-9))]
+    if len(xy) < 3:
+        return np.empty(0), np.empty(0)
+
+    seg = np.diff(xy, axis=0)
+    seg_len = np.hypot(seg[:, 0], seg[:, 1])
+    arc = np.concatenate(([0.0], np.cumsum(seg_len)))
+    unit = seg / seg_len[:, None]
+    cos_turn = np.clip(np.einsum('ij,ij->i', unit[:-1], unit[1:]), -1.0, 1.0)
+    turn = np.degrees(np.arccos(cos_turn))
+    sharp = turn >= corner_deg
+    # 頂点 k+1 の曲がり角 turn[k]
+    limits = speed * np.cos(np.radians(turn[sharp]) / 2.0)
+    return arc[1:-1][sharp], np.maximum(limits, 0.0)
+
+
+class TraceStreamer:
+    def __init__(self, motion, log_callback=None):
+        """motion: MotionSystem（dxl・キャリブレーション・完了待ちを使う）"""
+        self.motion = motion
+        self.log = log_callback or motion.log
+        self.rate_hz = getattr(config, 'TRACE_STREAM_RATE_HZ', 50.0)
+        self.lookahead_sec = getattr(config, 'TRACE_LOOKAHEAD_SEC', 0.1)
+        self.spacing_mm = getattr(config, 'TRACE_RESAMPLE_MM', 0.5)
+        self.corner_deg = getattr(config, 'TRACE_CORNER_DEG', 30.0)
+        self.monitor_sec = getattr(config, 'TRACE_MONITOR_SEC', 0.2)
+        self.max_lag_mm = getattr(config, 'TRACE_MAX_LAG_MM', 10.0)
+        self.profile_margin = getattr(config, 'TRACE_PROFILE_MARGIN', 1.5)
+
+    def _ppm(self, axis):
+        if axis is None:
+            return min(self.motion.pulses_per_mm_x, self.motion.pulses_per_mm_y)
+        return self.motion.pulses_per_mm_x if axis == 'x' else self.motion.pulses_per_mm_y
+
+    def axis_velocity(self, speed_mm_s, margin=1.0, axis=None):
+        """
+        [mm/s] をプロファイル速度の設定値に換算する。
+        axis 省略時は両軸共通の値（どちらの軸も speed_mm_s × margin を超えない値）
+        """
+        return max(1, int(speed_mm_s * margin * self._ppm(axis) / profile_velocity_to_pulses(1)))
+
+    def axis_acceleration(self, accel_mm_s2, margin=1.0, axis=None):
+        """[mm/s^2] をプロファイル加速度の設定値に換算する（axis の扱いは axis_velocity と同じ）"""
+        return max(1, int(accel_mm_s2 * margin * self._ppm(axis) / profile_acceleration_to_pulses(1)))
+
+    def _axis_profiles(self, speed, accel):
+        """
+        各軸のプロファイル速度・加速度を、計画の速度・加速度 [mm/s, mm/s^2] に余裕を掛けた値にする
+        （サーボが目標位置の進みに遅れず追従でき、かつ目標を追い越すほどは速くならない）
+        """
+        return {config.DXL_IDS[axis]: (self.axis_velocity(speed, self.profile_margin, axis),
+                                       self.axis_acceleration(accel, self.profile_margin, axis))
+                for axis in ('x', 'y')}
+
+    def run(self, xy, speed_mm_s, accel_mm_s2, stop_event=None, pause_event=None, progress_callback=None):
+        """
+        経路 xy (N,2) [mm] をなぞる。1点目へは呼び出し側で移動しておくこと。
+        pause_event がクリアされている間は経路上で減速して止まり、セットされたら再開する。
+        progress_callback(s_mm, length_mm) は約 1 秒ごとに呼ぶ。
+        戻り値: 最後まで走れたら True（中断・遅れすぎで止めた場合は False）
+        """
+        motion = self.motion
+        dxl = motion.dxl
+        x_id, y_id = config.DXL_IDS['x'], config.DXL_IDS['y']
+
+        points, arc, length = resample_path(xy, self.spacing_mm)
+        if length == 0.0:
+            return True
+        goal_x = motion.mm_to_pulses_array(points[:, 0], 'x')
+        goal_y = motion.mm_to_pulses_array(points[:, 1], 'y')
+        corner_s, corner_v = corner_speed_limits(xy, speed_mm_s, self.corner_deg)
+
+        dxl.sync_write_profiles(self._axis_profiles(speed_mm_s, accel_mm_s2))
+        self.log(f"  経路トレース: 全長 {length:.1f}mm, {len(points)}点, "
+                 f"見積もり {length / speed_mm_s + speed_mm_s / accel_mm_s2:.1f}秒")
+
+        period = 1.0 / self.rate_hz
+        s = 0.0
+        v = 0.0
+        last_index = -1
+        completed = False
+        start = motion.clock.perf_counter()
+        last_tick = start
+        next_monitor = start + self.monitor_sec
+        next_progress = start + 1.0
+
+        while True:
+            if stop_event is not None and stop_event.is_set():
+                break
+
+            now = motion.clock.perf_counter()
+            dt = now - last_tick
+            last_tick = now
+
+            # --- 速度計画: 目標速度へ加減速しつつ、終点と次の角の手前では止まれる速度に抑える ---
+            paused = pause_event is not None and not pause_event.is_set()
+            v_limit = 0.0 if paused else speed_mm_s
+            v_limit = min(v_limit, math.sqrt(2.0 * accel_mm_s2 * max(length - s, 0.0)))
+            k = int(np.searchsorted(corner_s, s, side='right'))
+            for cs, cv in zip(corner_s[k:k + 4], corner_v[k:k + 4]):
+                v_limit = min(v_limit, math.sqrt(cv * cv + 2.0 * accel_mm_s2 * (cs - s)))
+            if v < v_limit:
+                v = min(v_limit, v + accel_mm_s2 * dt)
+            else:
+                v = max(v_limit, v - accel_mm_s2 * dt)
+            s = min(length, s + v * dt)
+
+            # --- 先読み窓の先の点を目標位置として書き込む（戻る方向には書かない・同じ点なら書かない） ---
+            lead = min(length, s + v * self.lookahead_sec)
+            index = max(last_index, min(len(points) - 1, int(np.searchsorted(arc, lead - 1e-9))))
+            if index != last_index:
+                dxl.sync_write_goal_positions({x_id: int(goal_x[index]), y_id: int(goal_y[index])})
+                last_index = index
+
+            if s >= length and last_index == len(points) - 1:
+                completed = True
+                break
+
+            # --- 安全確認: 低い頻度で現在位置を読み、計画位置〜目標位置の区間から離れすぎていれば止める ---
+            if now >= next_monitor:
+                next_monitor = now + self.monitor_sec
+                present = dxl.sync_read_present_positions((x_id, y_id))
+                if present[x_id] != -1 and present[y_id] != -1:
+                    cur_x = motion._pulses_to_mm(present[x_id], 'x')
+                    cur_y = motion._pulses_to_mm(present[y_id], 'y')
+                    window = points[min(int(np.searchsorted(arc, s, side='right')) - 1, last_index):last_index + 1]
+                    lag = float(np.min(np.hypot(window[:, 0] - cur_x, window[:, 1] - cur_y)))
+                    if lag > self.max_lag_mm:
+                        self.log(f"  警告: 経路トレースで計画位置から {lag:.1f}mm ずれています。停止します。")
+                        dxl.sync_write_goal_positions({x_id: present[x_id], y_id: present[y_id]})
+                        motion.current_pos['x'], motion.current_pos['y'] = cur_x, cur_y
+                        return False
+
+            if progress_callback is not None and now >= next_progress:
+                next_progress = now + 1.0
+                progress_callback(s, length)
+
+            # 次の周期まで眠る
+            sleep = period - (motion.clock.perf_counter() - now)
+            if sleep > 0:
+                motion.clock.sleep(sleep)
+
+        if not completed:
+            # 中断: 今いる位置で止める
+            present = dxl.sync_read_present_positions((x_id, y_id))
+            if present[x_id] != -1 and present[y_id] != -1:
+                dxl.sync_write_goal_positions({x_id: present[x_id], y_id: present[y_id]})
+                motion.current_pos['x'] = motion._pulses_to_mm(present[x_id], 'x')
+                motion.current_pos['y'] = motion._pulses_to_mm(present[y_id], 'y')
+            return False
+
+        # 終点で止まるのを待つ
+        if not motion.waiter.wait_until_idle((x_id, y_id), 0.0, 'xy_precise'):
+            self.log("  警告: 経路トレース終点での停止待ちがタイムアウトしました。")
+        motion.current_pos['x'], motion.current_pos['y'] = float(points[-1, 0]), float(points[-1, 1])
+        self.log(f"  経路トレース完了: {motion.clock.perf_counter() - start:.1f}秒")
+        return True
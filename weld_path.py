@@ -0,0 +1,180 @@
+# weld_path.py
+
+"""
+溶着点列を保持するコンテナ。
+従来の [{'x':..., 'y':...}, ...] の代わりに、連続した (N,2) の NumPy 配列で座標を持つ。
+平行移動・XY入替・座標変換は配列上でその場(in-place)で行い、
+p['x'] 形式でアクセスする既存コード向けに辞書互換のビューを返す。
+"""
+
+from collections.abc import Mapping
+
+import numpy as np
+
+_AXIS_INDEX = {'x': 0, 'y': 1}
+
+
+class WeldPoint(Mapping):
+    """WeldPath の1点を指す辞書互換ビュー。値の読み書きは元の配列に反映される。"""
+    __slots__ = ('_xy', '_index')
+
+    def __init__(self, xy, index):
+        self._xy = xy
+        self._index = index
+
+    def __getitem__(self, key):
+        try:
+            return float(self._xy[self._index, _AXIS_INDEX[key]])
+        except KeyError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        try:
+            self._xy[self._index, _AXIS_INDEX[key]] = float(value)
+        except KeyError:
+            raise KeyError(key) from None
+
+    def __iter__(self):
+        return iter(_AXIS_INDEX)
+
+    def __len__(self):
+        return len(_AXIS_INDEX)
+
+    def __repr__(self):
+        return f"{{'x': {self['x']!r}, 'y': {self['y']!r}}}"
+
+
+class WeldPath:
+    """
+    溶着点列 (mm)。内部は float64 の (N,2) 配列（通常は C 連続）。
+    - スライスは配列のビューを共有する（コピーしない）
+    - translate / swap_xy / transform はその場で配列を書き換え、self を返す
+    - 反復やインデックスアクセスでは WeldPoint（辞書互換）を返す
+    """
+    __slots__ = ('_xy',)
+
+    def __init__(self, xy=None):
+        if xy is None:
+            xy = np.empty((0, 2), dtype=np.float64)
+        xy = np.ascontiguousarray(xy, dtype=np.float64)
+        if xy.ndim != 2 or xy.shape[1] != 2:
+            raise ValueError(f"WeldPath には (N,2) の配列が必要です: shape={xy.shape}")
+        self._xy = xy
+
+    # --- 生成 ---
+    @classmethod
+    def from_dicts(cls, points):
+        """[{'x':..., 'y':...}, ...] 形式から生成する"""
+        if not points:
+            return cls()
+        return cls(np.array([[float(p['x']), float(p['y'])] for p in points], dtype=np.float64))
+
+    @classmethod
+    def coerce(cls, points):
+        """WeldPath・(N,2) 配列・辞書リストのいずれかを WeldPath にする（WeldPath はそのまま返す）"""
+        if isinstance(points, cls):
+            return points
+        if points is None:
+            return cls()
+        if isinstance(points, np.ndarray):
+            return cls(points)
+        return cls.from_dicts(points)
+
+    # --- 配列アクセス ---
+    @property
+    def xy(self):
+        """(N,2) 配列そのもの（ビュー）"""
+        return self._xy
+
+    @property
+    def x(self):
+        return self._xy[:, 0]
+
+    @property
+    def y(self):
+        return self._xy[:, 1]
+
+    def bounds(self):
+        """(min_x, max_x, min_y, max_y) を返す。点がなければ None"""
+        if len(self._xy) == 0:
+            return None
+        mins = self._xy.min(axis=0)
+        maxs = self._xy.max(axis=0)
+        return float(mins[0]), float(maxs[0]), float(mins[1]), float(maxs[1])
+
+    # --- シーケンス互換 ---
+    def __len__(self):
+        return len(self._xy)
+
+    def __bool__(self):
+        return len(self._xy) > 0
+
+    def __iter__(self):
+        xy = self._xy
+        for i in range(len(xy)):
+            yield WeldPoint(xy, i)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return WeldPath._view(self._xy[index])
+        if index < 0:
+            index += len(self._xy)
+        if not 0 <= index < len(self._xy):
+            raise IndexError("WeldPath index out of range")
+        return WeldPoint(self._xy, index)
+
+    def __repr__(self):
+        return f"WeldPath({len(self._xy)} points)"
+
+    @classmethod
+    def _view(cls, xy):
+        # スライス結果（配列ビュー）をコピーせずに包む
+        obj = cls.__new__(cls)
+        obj._xy = xy
+        return obj
+
+    def append(self, point):
+        """点を末尾に追加（編集画面用。配列を作り直すので多用しないこと）"""
+        if isinstance(point, Mapping):
+            row = (float(point['x']), float(point['y']))
+        else:
+            row = (float(point[0]), float(point[1]))
+        self._xy = np.vstack((self._xy, np.array([row], dtype=np.float64)))
+
+    def pop(self, index=-1):
+        """点を削除して辞書で返す（編集画面用）"""
+        removed = {'x': self[index]['x'], 'y': self[index]['y']}
+        self._xy = np.delete(self._xy, index, axis=0)
+        return removed
+
+    def copy(self):
+        return WeldPath(self._xy.copy())
+
+    def to_dicts(self):
+        return [{'x': x, 'y': y} for x, y in self._xy.tolist()]
+
+    # --- その場変換 ---
+    def translate(self, dx, dy):
+        self._xy += (dx, dy)
+        return self
+
+    def swap_xy(self):
+        self._xy[:, [0, 1]] = self._xy[:, [1, 0]]
+        return self
+
+    def transform(self, matrix, offset=(0.0, 0.0)):
+        """p' = matrix @ p + offset を全点に適用する（matrix は 2x2）"""
+        matrix = np.asarray(matrix, dtype=np.float64)
+        self._xy[:] = self._xy @ matrix.T + offset
+        return self
+
+
+def as_xy_array(points):
+    """WeldPath・配列・辞書リストのどれでも (N,2) 配列として返す（描画・範囲計算用）"""
+    if isinstance(points, WeldPath):
+        return points.xy
+    if isinstance(points, np.ndarray):
+        return points
+    if not points:
+        return np.empty((0, 2), dtype=np.float64)
+    return np.array([[float(p['x']), float(p['y'])] for p in points], dtype=np.float64)
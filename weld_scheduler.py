@@ -0,0 +1,180 @@
+# weld_scheduler.py
+
+"""
+熱を考慮した溶着順序のスケジューラ。
+隣り合う点を続けて溶着するとホーンとシートが局所的に熱を持つため、従来は
+N点ごとに一時停止して冷ましていた。ここでは溶着順を並べ替えて
+  - 連続する2点の間隔を THERMAL_MIN_SEPARATION_MM 以上にする
+  - 同じ領域（THERMAL_REGION_MM 角のセル）を THERMAL_MIN_REVISIT_SEC 以上あけて再訪する
+  - 領域ごとの熱量（溶着ごとに加算し、時定数 THERMAL_TIME_CONSTANT_SEC で減衰）が
+    THERMAL_MAX_HEAT を超えた領域は冷えるまで溶着しない
+を満たしつつ、空走距離が短くなる点を優先して選ぶ。
+どの点も条件を満たせない場合だけ、最短で条件を満たせる点を選んで冷却待ちを入れる。
+
+熱モデル ThermalModel はスケジューリング（見積もり時刻）と実行時（実時刻）の両方で使い、
+実行時は溶着直前に必要な冷却待ち時間を実時刻で計算し直す。
+"""
+
+import numpy as np
+
+import config
+
+
+def _thermal_params():
+    return {
+        'min_separation': getattr(config, 'THERMAL_MIN_SEPARATION_MM', 10.0),
+        'region': getattr(config, 'THERMAL_REGION_MM', 10.0),
+        'min_revisit': getattr(config, 'THERMAL_MIN_REVISIT_SEC', 5.0),
+        'max_heat': getattr(config, 'THERMAL_MAX_HEAT', 2.0),
+        'time_constant': getattr(config, 'THERMAL_TIME_CONSTANT_SEC', 20.0),
+        'neighbor_heat': getattr(config, 'THERMAL_NEIGHBOR_HEAT', 0.5),
+        'overhead': getattr(config, 'THERMAL_CYCLE_OVERHEAD_SEC', 1.5),
+        'travel_speed': getattr(config, 'THERMAL_TRAVEL_SPEED_MM_S', 50.0),
+        'heat_weight': getattr(config, 'THERMAL_HEAT_WEIGHT', 1.0),
+    }
+
+
+class ThermalModel:
+    """
+    領域（正方セル）ごとの熱量モデル。
+    溶着した点のセルに 1.0、周囲8セルに neighbor_heat を加え、熱量は exp(-経過時間/time_constant) で減衰する。
+    """
+
+    def __init__(self, xy, params=None):
+        self.params = params or _thermal_params()
+        xy = np.asarray(xy, dtype=float).reshape(-1, 2)
+        region = self.params['region']
+        keys = np.floor(xy / region).astype(np.int64) if len(xy) else np.empty((0, 2), dtype=np.int64)
+        unique_keys, self.cell_of_point = np.unique(keys, axis=0, return_inverse=True)
+        self.cell_of_point = self.cell_of_point.reshape(-1)
+
+        n_cells = len(unique_keys)
+        self.heat = np.zeros(n_cells)
+        self.heat_time = np.zeros(n_cells)
+        self.last_weld = np.full(n_cells, -np.inf)
+
+        # 各セルの周囲8セル（点を含むセルだけ）
+        index = {tuple(k): c for c, k in enumerate(unique_keys.tolist())}
+        self.neighbors = []
+        for kx, ky in unique_keys.tolist():
+            cells = [index[(kx + dx, ky + dy)] for dx in (-1, 0, 1) for dy in (-1, 0, 1)
+                     if (dx or dy) and (kx + dx, ky + dy) in index]
+            self.neighbors.append(np.array(cells, dtype=np.int64))
+
+    def heat_at(self, point_indices, t):
+        """時刻 t における点（のセル）の熱量"""
+        cells = self.cell_of_point[point_indices]
+        return self.heat[cells] * np.exp(-(t - self.heat_time[cells]) / self.params['time_constant'])
+
+    def required_wait(self, point_indices, t):
+        """点を時刻 t に溶着するために必要な冷却待ち時間 [s]（0 なら今すぐ可能）"""
+        p = self.params
+        cells = self.cell_of_point[point_indices]
+        revisit_wait = self.last_weld[cells] + p['min_revisit'] - t
+        heat = self.heat_at(point_indices, t)
+        with np.errstate(divide='ignore'):
+            heat_wait = np.where(heat > p['max_heat'],
+                                 p['time_constant'] * np.log(heat / p['max_heat']), 0.0)
+        return np.maximum(np.maximum(revisit_wait, heat_wait), 0.0)
+
+    def wait_for(self, point_index, t):
+        """1点分の required_wait（実行時に実時刻で使う）"""
+        return float(self.required_wait(np.array([point_index]), t)[0])
+
+    def deposit(self, point_index, t):
+        """点を時刻 t に溶着したものとして熱を加える"""
+        cell = self.cell_of_point[point_index]
+        self._add(np.array([cell]), 1.0, t)
+        if len(self.neighbors[cell]) and self.params['neighbor_heat'] > 0:
+            self._add(self.neighbors[cell], self.params['neighbor_heat'], t)
+        self.last_weld[cell] = t
+
+    def _add(self, cells, amount, t):
+        decay = np.exp(-(t - self.heat_time[cells]) / self.params['time_constant'])
+        self.heat[cells] = self.heat[cells] * decay + amount
+        self.heat_time[cells] = t
+
+
+class ThermalSchedule:
+    """スケジュール結果: 並べ替えた順序と、各点の前に入れる（見積もり上の）冷却待ち時間"""
+    __slots__ = ('order', 'waits', 'report')
+
+    def __init__(self, order, waits, report):
+        self.order = order
+        self.waits = waits
+        self.report = report
+
+
+def _travel(xy, start_xy):
+    if len(xy) == 0:
+        return 0.0
+    steps = np.diff(np.vstack((np.asarray(start_xy, dtype=float)[None, :], xy)), axis=0)
+    return float(np.hypot(steps[:, 0], steps[:, 1]).sum())
+
+
+def schedule_welds(xy, weld_time, start_xy=(0.0, 0.0), params=None):
+    """
+    溶着点 (N,2) [mm] を熱の条件を満たす順に並べ替える。
+    weld_time: 1点あたりの発振時間 [s]（見積もり時刻の計算に使う）
+    戻り値: ThermalSchedule（order は元のインデックスの配列）
+    """
+    params = params or _thermal_params()
+    xy = np.asarray(xy, dtype=float).reshape(-1, 2)
+    n = len(xy)
+    model = ThermalModel(xy, params)
+
+    remaining = np.ones(n, dtype=bool)
+    order = np.empty(n, dtype=np.int64)
+    waits = np.zeros(n)
+    t = 0.0
+    current = np.asarray(start_xy, dtype=float)
+    min_sep = params['min_separation']
+
+    for k in range(n):
+        idx = np.flatnonzero(remaining)
+        dist = np.hypot(xy[idx, 0] - current[0], xy[idx, 1] - current[1])
+        arrival = t + dist / params['travel_speed']
+        wait = model.required_wait(idx, arrival)
+
+        feasible = (wait <= 0.0) & (dist >= min_sep)
+        if k == 0:
+            feasible = wait <= 0.0  # 1点目は間隔の条件なし
+        if feasible.any():
+            # 空走距離 + 熱量（多少冷えている領域を優先）で選ぶ
+            cost = dist + params['heat_weight'] * params['region'] * model.heat_at(idx, arrival)
+            cost[~feasible] = np.inf
+            pick = int(np.argmin(cost))
+            pick_wait = 0.0
+        else:
+            # 条件を満たす点がない: 間隔の条件を守れる点の中で冷却待ちが最短のもの
+            # （残りが全部近くにある場合は、間隔を守れない点も候補にする）
+            far = dist >= min_sep
+            candidates = far if far.any() else np.ones(len(idx), dtype=bool)
+            score = np.where(candidates, wait + dist / params['travel_speed'], np.inf)
+            pick = int(np.argmin(score))
+            pick_wait = float(wait[pick])
+
+        point = int(idx[pick])
+        order[k] = point
+        waits[k] = pick_wait
+        remaining[point] = False
+        t = float(arrival[pick]) + pick_wait
+        model.deposit(point, t)
+        t += weld_time + params['overhead']
+        current = xy[point]
+
+    report = {
+        'travel_before': _travel(xy, start_xy),
+        'travel_after': _travel(xy[order], start_xy),
+        'cooling_wait': float(waits.sum()),
+        'cooling_stops': int(np.count_nonzero(waits > 0)),
+        'estimated_time': t,
+    }
+    return ThermalSchedule(order, waits, report)
+
+
+def format_report(report):
+    return (f"空走 {report['travel_before']:.0f}mm -> {report['travel_after']:.0f}mm, "
+            f"冷却待ち {report['cooling_stops']}回 (計{report['cooling_wait']:.1f}秒), "
+            f"見積もり所要時間 {report['estimated_time'] / 60.0:.1f}分")
+
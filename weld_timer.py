@@ -0,0 +1,172 @@
+# weld_timer.py
+
+"""
+溶着パルス（溶着機 ON の時間）の計時。
+従来は execute_welding_press のスレッドで welder.turn_on(); time.sleep(weld_time); welder.turn_off() としていたため、
+Tk の再描画・ログ出力と GIL を取り合い、OFF が数十 ms 遅れることがあった（0.4 秒のプリセットでは無視できない）。
+ここでは専用スレッドで
+  - perf_counter の締め切り時刻まで粗く眠り、最後の WELD_TIMER_SPIN_SEC だけは空回りで待つ
+  - パルスの間だけ GIL の切り替え間隔を短くする（他のスレッドが GIL を握ったまま締め切りを過ぎないように）
+  - Linux では任意でリアルタイム優先度 (SCHED_FIFO) に上げる
+を行い、実際の ON 時間（ON の書き込み完了から OFF の書き込み完了まで）を毎回記録する。
+停止要求 (stop_event) があればその場で OFF にする。
+"""
+
+import math
+import os
+import queue
+import sys
+import threading
+
+import config
+from clock import SYSTEM_CLOCK
+
+
+class _PulseRequest:
+    __slots__ = ('welder', 'duration', 'stop_event', 'done', 'record', 'error')
+
+    def __init__(self, welder, duration, stop_event):
+        self.welder = welder
+        self.duration = duration
+        self.stop_event = stop_event
+        self.done = threading.Event()
+        self.record = None
+        self.error = None
+
+
+class WeldPulseTimer:
+    def __init__(self, log_callback=print, clock=None):
+        self.log = log_callback
+        self.clock = clock or SYSTEM_CLOCK
+        self.spin_sec = getattr(config, 'WELD_TIMER_SPIN_SEC', 0.02)
+        self.switch_interval = getattr(config, 'WELD_TIMER_SWITCH_INTERVAL', 0.0005)
+        self.rt_priority = getattr(config, 'WELD_TIMER_RT_PRIORITY', 0)
+
+        self._requests = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.records = []  # パルスごとの記録 dict（reset でジョブごとに捨てる）
+
+    # --- スレッド管理 ---
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="weld-timer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=1.0):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._requests.put(None)
+            thread.join(timeout)
+
+    def _elevate_priority(self):
+        """Linux でリアルタイム優先度に上げる（権限がなければそのまま）"""
+        if self.rt_priority <= 0:
+            return
+        if not hasattr(os, 'sched_setscheduler'):
+            self.log("  [HW] 溶着タイマー: この OS ではスケジューリング優先度を変更できません。")
+            return
+        try:
+            # pid 0 は呼び出したスレッド自身
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(self.rt_priority))
+            self.log(f"  [HW] 溶着タイマー: SCHED_FIFO 優先度 {self.rt_priority} で実行します。")
+        except (OSError, PermissionError) as e:
+            self.log(f"  [HW] 溶着タイマー: 優先度を上げられませんでした ({e})。通常の優先度で実行します。")
+
+    def _run(self):
+        self._elevate_priority()
+        while True:
+            request = self._requests.get()
+            if request is None:
+                break
+            try:
+                request.record = self._execute(request)
+            except Exception as e:
+                request.error = e
+            finally:
+                request.done.set()
+
+    # --- 計時 ---
+    def pulse(self, welder, duration, stop_event=None):
+        """
+        溶着機を duration 秒 ON にする（専用スレッドで計時し、終わるまで待つ）。
+        戻り値: 記録 dict {'target', 'actual', 'error', 'aborted'} [s]
+          aborted=True は stop_event による途中 OFF
+        """
+        self.start()
+        request = _PulseRequest(welder, duration, stop_event)
+        self._requests.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.record
+
+    def _execute(self, request):
+        welder = request.welder
+        stop_event = request.stop_event
+        previous_interval = sys.getswitchinterval()
+        sys.setswitchinterval(self.switch_interval)
+        try:
+            welder.turn_on(log=False)
+            t_on = self.clock.perf_counter()
+            deadline = t_on + request.duration
+            aborted = False
+            try:
+                # 締め切りの少し手前までは眠る（停止要求で起きる）
+                while True:
+                    remaining = deadline - self.clock.perf_counter() - self.spin_sec
+                    if remaining <= 0:
+                        break
+                    if stop_event is not None:
+                        if self.clock.wait(stop_event, remaining):
+                            aborted = True
+                            break
+                    else:
+                        self.clock.sleep(remaining)
+                # 残りは空回りで待つ
+                if not aborted:
+                    while self.clock.perf_counter() < deadline:
+                        pass
+            finally:
+                welder.turn_off(log=False)
+                t_off = self.clock.perf_counter()
+        finally:
+            sys.setswitchinterval(previous_interval)
+
+        actual = t_off - t_on
+        record = {'target': request.duration, 'actual': actual,
+                  'error': actual - request.duration, 'aborted': aborted}
+        if not aborted:
+            with self._lock:
+                self.records.append(record)
+        return record
+
+    # --- 統計 ---
+    def reset(self):
+        """ジョブ開始時に記録を捨てる"""
+        with self._lock:
+            self.records = []
+
+    def stats(self):
+        """
+        記録したパルスの ON 時間の誤差（実測 - 目標）の統計 [s]。
+        {'count', 'mean', 'std', 'min', 'max', 'max_abs'}（記録がなければ count=0 のみ）
+        """
+        with self._lock:
+            errors = [r['error'] for r in self.records]
+        if not errors:
+            return {'count': 0}
+        mean = sum(errors) / len(errors)
+        std = math.sqrt(sum((e - mean) ** 2 for e in errors) / len(errors))
+        return {'count': len(errors), 'mean': mean, 'std': std, 'min': min(errors), 'max': max(errors),
+                'max_abs': max(abs(e) for e in errors)}
+
+    @staticmethod
+    def format_stats(stats):
+        if not stats.get('count'):
+            return "記録なし"
+        return (f"{stats['count']}回, 誤差 平均 {stats['mean'] * 1000:+.2f}ms, "
+                f"標準偏差 {stats['std'] * 1000:.2f}ms, 最大 {stats['max_abs'] * 1000:.2f}ms")